@@ -0,0 +1,1082 @@
+import logging
+import threading
+import weakref
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from correlations import CoMoments
+from kernels import (
+    CubeAccumulator,
+    cell_count,
+    dense_cube,
+    dense_to_frame,
+    dimension_codes,
+    dimension_labels,
+    flat_keys,
+    merge_dense,
+    row_measures,
+    scan_cubes,
+)
+from sketches import QuantileSketch, add_grouped
+
+logger = logging.getLogger(__name__)
+
+# Dimensions of the base cube; every per-dimension / cross-dimension table is rolled up from it
+CUBE_DIMENSIONS = ("Year", "Model", "Region", "Engine_Size_L")
+
+# Additive measures stored in the base cube (all of them can be summed across cells)
+CUBE_MEASURES = ("Rows", "Sales_Volume", "Revenue_USD", "Price_Sum", "Price_Count")
+
+# Rows processed per block when building the base cube; bounds the temporaries
+# (Revenue_USD, measure frame) to a fixed size regardless of the frame length
+CUBE_BLOCK_ROWS = 65_536
+
+# Dimensions of the OLAP cube served by cube.py, scanned in the same pass as the base cube
+OLAP_DIMENSIONS = ("Year", "Region", "Model", "Fuel_Type", "Transmission")
+
+# Frames up to this many rows get exact quantiles (describe(), histograms, distributions) with one
+# partial sort per column; larger frames, and frame-less aggregates, read them from the mergeable
+# QuantileSketches (one pass, memory independent of the row count, sketches.DEFAULT_RELATIVE_ACCURACY)
+EXACT_QUANTILE_MAX_ROWS = 1_000_000
+
+# Per-group distributions kept as sketches (and merged across chunks/shards/appends): column -> dimensions
+DISTRIBUTION_GROUPS = {"Price_USD": ("Model", "Region")}
+
+# Percentiles reported by SalesAggregates.distribution()
+DISTRIBUTION_PERCENTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Numeric columns whose exact correlation matrix is kept as mergeable co-moments
+CORRELATION_COLUMNS = ("Year", "Engine_Size_L", "Mileage_KM", "Price_USD", "Sales_Volume")
+
+# Per-segment least-squares fits kept as grouped co-moments: (y, x) -> dimensions
+SEGMENT_REGRESSIONS = {("Price_USD", "Mileage_KM"): ("Model", "Region")}
+
+# Memo families of SalesAggregates with a lock each (co-moments, per-group sketches, per-column
+# moments and sketches, labels/cubes/tables), in the order they may be nested: a co-moment pass
+# reads the row counts of the base cube, never the other way round
+MEMO_LOCKS = ("comoments", "group_sketches", "moments", "cubes")
+
+# Largest dense cube (label combinations) built by the NumPy kernel; beyond that (e.g. a
+# high-cardinality dimension) the base cube falls back to blockwise pandas groupbys
+KERNEL_MAX_CELLS = 4_000_000
+
+
+def _widen(series: pd.Series) -> pd.Series:
+    """
+    Widen compact numeric dtypes (int16/int32/float32 from the load schema) to 64 bits
+    before arithmetic, so that products and sums cannot overflow.
+    """
+    if pd.api.types.is_integer_dtype(series.dtype) and series.dtype.itemsize < 8:
+        return series.astype("int64")
+    if pd.api.types.is_float_dtype(series.dtype) and series.dtype.itemsize < 8:
+        return series.astype("float64")
+    return series
+
+
+def _plain_keys(series: pd.Series) -> pd.Series:
+    """
+    Convert a key column of a rolled-up table back to plain values: categorical keys to their
+    category values (so that unused categories do not leak into charts), float32 keys to the
+    float64 value they display as (1.6 rather than 1.600000023841858).
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(series.cat.categories.dtype)
+    if pd.api.types.is_float_dtype(series.dtype) and series.dtype.itemsize < 8:
+        return series.astype(str).astype("float64")
+    return series
+
+
+def describe_values(values: np.ndarray, name: str) -> pd.Series:
+    """
+    Same output as Series.describe() for a numeric column, computed on a float64 array that the
+    caller owns: quantiles use an in-place np.partition instead of a sorted copy, so no extra
+    row-sized buffer is allocated.
+    """
+    values = values[~np.isnan(values)] if np.isnan(values).any() else values
+    count = len(values)
+    if count == 0:
+        stats = [0.0] + [np.nan] * 7
+    else:
+        mean = values.mean()
+        # Sum of squared deviations block by block (values.std() would allocate a row-sized temporary)
+        squares = sum(
+            float(np.square(values[start:start + CUBE_BLOCK_ROWS] - mean).sum())
+            for start in range(0, count, CUBE_BLOCK_ROWS)
+        )
+        std = np.sqrt(squares / (count - 1)) if count > 1 else np.nan
+        positions = [q * (count - 1) for q in (0.25, 0.5, 0.75)]
+        kth = sorted({int(np.floor(p)) for p in positions} | {int(np.ceil(p)) for p in positions})
+        values.partition(kth)
+        quantiles = [
+            values[int(np.floor(p))] + (values[int(np.ceil(p))] - values[int(np.floor(p))]) * (p - np.floor(p))
+            for p in positions
+        ]
+        stats = [count, mean, std, values.min(), *quantiles, values.max()]
+    return pd.Series(
+        stats,
+        index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"],
+        name=name,
+        dtype="float64",
+    )
+
+
+class Moments:
+    """
+    Mergeable count / mean / sum of squared deviations / min / max of a numeric column.
+
+    Partials computed on separate chunks are combined with the pairwise update of Chan et al.,
+    so mean and std of a column can be reported without ever holding all of its rows.
+    """
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0,
+                 min: float = np.nan, max: float = np.nan):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+
+    @classmethod
+    def from_values(cls, values: np.ndarray) -> "Moments":
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return cls()
+        mean = float(values.mean())
+        m2 = float(np.square(values - mean).sum())
+        return cls(len(values), mean, m2, float(values.min()), float(values.max()))
+
+    def merge(self, other: "Moments") -> "Moments":
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            return other
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        return Moments(
+            count,
+            self.mean + delta * other.count / count,
+            self.m2 + other.m2 + delta * delta * self.count * other.count / count,
+            min(self.min, other.min),
+            max(self.max, other.max),
+        )
+
+    def describe(self, name: str, quartiles: Optional[Sequence[float]] = None) -> pd.Series:
+        """
+        describe()-shaped output. Quartiles need the rows themselves (or a sketch of them): pass
+        them in, otherwise they are reported as NaN.
+        """
+        if self.count == 0:
+            stats = [0.0] + [np.nan] * 7
+        else:
+            std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+            q1, q2, q3 = quartiles if quartiles is not None else (np.nan, np.nan, np.nan)
+            stats = [self.count, self.mean, std, self.min, q1, q2, q3, self.max]
+        return pd.Series(
+            stats,
+            index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"],
+            name=name,
+            dtype="float64",
+        )
+
+    def to_state(self) -> list:
+        return [self.count, self.mean, self.m2, self.min, self.max]
+
+    @classmethod
+    def from_state(cls, state: list) -> "Moments":
+        count, mean, m2, low, high = state
+        return cls(int(count), mean, m2, np.nan if low is None else low, np.nan if high is None else high)
+
+
+def merge_cubes(parts: Sequence[pd.DataFrame], dimensions: Sequence[str]) -> pd.DataFrame:
+    """
+    Merge partial cubes (same dimensions, additive measures) into one cube.
+    """
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return pd.DataFrame(columns=list(dimensions) + list(CUBE_MEASURES))
+    if len(parts) == 1:
+        return parts[0]
+
+    combined = pd.concat(parts, ignore_index=True)
+    if not dimensions:
+        return combined.sum().to_frame().T
+    return (
+        combined.groupby(list(dimensions), sort=True, dropna=False, observed=True)
+        .sum()
+        .reset_index()
+    )
+
+
+class SalesAggregates:
+    """
+    Shared aggregation engine for one loaded sales frame.
+
+    Revenue_USD (Price_USD × Sales_Volume) is computed once per row while the base cube over
+    CUBE_DIMENSIONS is built in a single scan of the frame, and every grouped table requested by
+    analyzer, visualizer and the AI summary is rolled up from that cube and memoized for the run.
+
+    Memory: the frame is only ever read (never copied or extended with derived columns). Derived
+    values such as Revenue_USD are computed per block of CUBE_BLOCK_ROWS rows, or as a transient
+    standalone float64 array (row_revenue) that is dropped as soon as it has been described.
+
+    Quantiles: describe(), histogram() and distribution() are exact up to EXACT_QUANTILE_MAX_ROWS
+    rows and come from mergeable QuantileSketches above that (or without a frame).
+
+    Relationships: correlation() and regression() are exact over all rows at any size, from
+    co-moments (correlations.CoMoments) collected in one blockwise pass and merged like Moments.
+
+    Streaming: detach() turns the aggregates of one chunk into a frame-less partial (base cubes
+    plus per-column Moments and QuantileSketches) and merge() combines two partials, see
+    aggregate_chunks() and shards.py. Partials built with the same `labels` also carry their
+    dense kernel cubes, which then merge by plain addition. Frame-less aggregates serve table()
+    and row_count() exactly; describe() then takes its quartiles from the sketches (within their
+    relative accuracy). to_state() / from_state() persist a frame-less partial as
+    JSON-serializable data (see incremental.py).
+
+    Threads: the methods that fill the memos hold the instance's lock of that memo family
+    (MEMO_LOCKS), so that the pipeline's task threads can share one instance. Each memo is built
+    once; a second caller waits for it instead of racing, while other families proceed.
+    """
+
+    def __init__(
+        self,
+        df: Optional[pd.DataFrame] = None,
+        columns: Optional[Iterable[str]] = None,
+        labels: Optional[dict] = None,
+    ):
+        if df is None and columns is None:
+            raise ValueError("Either a frame or the column names of the streamed data are required")
+        self._df_ref = weakref.ref(df) if df is not None else None
+        self.columns = set(df.columns) if df is not None else set(columns)
+        self.dimensions = [d for d in CUBE_DIMENSIONS if d in self.columns]
+        self.has_volume = "Sales_Volume" in self.columns
+        self.has_price = "Price_USD" in self.columns
+        self._cubes: dict = {}
+        self._tables: dict = {}
+        self._moments: dict = {}
+        self._sketches: dict = {}
+        self._group_sketches: dict = {}
+        self._comoments: dict = {}
+        self._dense: Optional[dict] = None
+        self._labels: dict = dict(labels) if labels else {}
+        # One lock per family of memos above, so that e.g. the cube scan and the co-moment pass of
+        # two pipeline threads still run side by side (see class docstring)
+        self._locks = {name: threading.RLock() for name in MEMO_LOCKS}
+
+    def __getstate__(self) -> dict:
+        # Detached partials travel back from the shard worker processes; locks do not pickle
+        state = self.__dict__.copy()
+        del state["_locks"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._locks = {name: threading.RLock() for name in MEMO_LOCKS}
+
+    @property
+    def has_frame(self) -> bool:
+        return self._df_ref is not None
+
+    @property
+    def df(self) -> pd.DataFrame:
+        if self._df_ref is None:
+            raise RuntimeError("These aggregates were built from streamed chunks and hold no row-level frame")
+        df = self._df_ref()
+        if df is None:
+            raise RuntimeError("The frame behind these aggregates has been released")
+        return df
+
+    def row_revenue(self, valid_only: bool = False) -> np.ndarray:
+        """
+        Row-level Revenue_USD as a standalone float64 array (never added to the frame).
+        Filled block by block and not retained, callers should drop it once consumed.
+        """
+        if not (self.has_volume and self.has_price):
+            raise KeyError("Revenue_USD requires Price_USD and Sales_Volume columns")
+        price = self.column("Price_USD", valid_only)
+        volume = self.column("Sales_Volume", valid_only)
+        revenue = np.empty(len(price), dtype="float64")
+        for start in range(0, len(price), CUBE_BLOCK_ROWS):
+            stop = start + CUBE_BLOCK_ROWS
+            np.multiply(
+                price.iloc[start:stop].to_numpy(dtype="float64"),
+                volume.iloc[start:stop].to_numpy(dtype="float64"),
+                out=revenue[start:stop],
+            )
+        return revenue
+
+    def _values(self, name: str, valid_only: bool = False) -> np.ndarray:
+        """
+        A numeric column (or the derived Revenue_USD) as a standalone float64 array.
+        """
+        if name == "Revenue_USD":
+            return self.row_revenue(valid_only)
+        return self.column(name, valid_only).to_numpy(dtype="float64", copy=True)
+
+    def _value_blocks(self, name: str, valid_only: bool = False):
+        """
+        Float64 values of a numeric column (or of Revenue_USD) in blocks of CUBE_BLOCK_ROWS rows.
+        """
+        df = self.df
+        for start in range(0, len(df), CUBE_BLOCK_ROWS):
+            block = df.iloc[start:start + CUBE_BLOCK_ROWS]
+            if valid_only and self.has_volume:
+                block = block[block["Sales_Volume"] > 0]
+            if name == "Revenue_USD":
+                yield block["Price_USD"].to_numpy(dtype="float64") * block["Sales_Volume"].to_numpy(dtype="float64")
+            else:
+                yield block[name].to_numpy(dtype="float64")
+
+    def _exact_quantiles(self, valid_only: bool = False) -> bool:
+        return self.has_frame and self.row_count(valid_only) <= EXACT_QUANTILE_MAX_ROWS
+
+    def describe(self, name: str, valid_only: bool = False) -> pd.Series:
+        """
+        describe() of a numeric column (or of the derived Revenue_USD). Exact, with a single
+        row-sized float64 buffer, for frames up to EXACT_QUANTILE_MAX_ROWS rows; otherwise built
+        in one pass from the Moments and the quartiles of the QuantileSketch (for frame-less
+        aggregates from the merged ones).
+        """
+        if self._exact_quantiles(valid_only):
+            return describe_values(self._values(name, valid_only), name)
+        try:
+            quartiles = self.sketch(name, valid_only).quantiles([0.25, 0.5, 0.75])
+        except KeyError:
+            quartiles = None
+        return self.moments(name, valid_only).describe(name, quartiles)
+
+    def describe_all(self) -> pd.DataFrame:
+        """
+        df.describe(include="all") of the frame. Above EXACT_QUANTILE_MAX_ROWS rows numeric
+        columns are described as in describe() and the other columns from their value counts,
+        so that no column is sorted.
+        """
+        df = self.df
+        if self._exact_quantiles():
+            return df.describe(include="all")
+        parts = []
+        for name in df.columns:
+            series = df[name]
+            if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+                parts.append(self.describe(name))
+                continue
+            counts = series.value_counts(dropna=True)
+            parts.append(pd.Series(
+                [int(counts.sum()), int((counts > 0).sum()),
+                 counts.index[0] if len(counts) else np.nan, int(counts.iloc[0]) if len(counts) else np.nan],
+                index=["count", "unique", "top", "freq"],
+                name=name,
+                dtype="object",
+            ))
+        names = list(dict.fromkeys(stat for part in parts for stat in part.index))
+        return pd.concat(parts, axis=1).reindex(names)
+
+    def _collect(self, name: str, valid_only: bool, with_sketch: bool) -> None:
+        # One blockwise pass filling the Moments (and the QuantileSketch) of a column
+        moments = Moments()
+        sketch = QuantileSketch() if with_sketch else None
+        for values in self._value_blocks(name, valid_only):
+            moments = moments.merge(Moments.from_values(values))
+            if sketch is not None:
+                sketch.add(values)
+        self._moments.setdefault((name, valid_only), moments)
+        if sketch is not None:
+            self._sketches[(name, valid_only)] = sketch
+
+    def moments(self, name: str, valid_only: bool = False) -> Moments:
+        """
+        Mergeable Moments of a numeric column (or of the derived Revenue_USD).
+        """
+        with self._locks["moments"]:
+            valid_only = valid_only and self.has_volume
+            key = (name, valid_only)
+            if key not in self._moments:
+                if not self.has_frame:
+                    raise KeyError(f"No moments were collected for {name!r}")
+                self._collect(name, valid_only, with_sketch=False)
+            return self._moments[key]
+
+    def sketch(self, name: str, valid_only: bool = False) -> QuantileSketch:
+        """
+        Mergeable QuantileSketch of a numeric column (or of the derived Revenue_USD).
+        """
+        with self._locks["moments"]:
+            valid_only = valid_only and self.has_volume
+            key = (name, valid_only)
+            if key not in self._sketches:
+                if not self.has_frame:
+                    raise KeyError(f"No sketch was collected for {name!r}")
+                self._collect(name, valid_only, with_sketch=True)
+            return self._sketches[key]
+
+    def histogram(self, name: str, bins: int = 40, valid_only: bool = False) -> pd.DataFrame:
+        """
+        Equal-width histogram of a numeric column between its min and max (bin_left, bin_right,
+        Count): np.histogram up to EXACT_QUANTILE_MAX_ROWS rows, from the sketch above.
+        """
+        if self._exact_quantiles(valid_only):
+            values = self._values(name, valid_only)
+            counts, edges = np.histogram(values[~np.isnan(values)], bins=bins)
+        else:
+            counts, edges = self.sketch(name, valid_only).histogram(bins)
+        return pd.DataFrame({"bin_left": edges[:-1], "bin_right": edges[1:], "Count": counts})
+
+    def _distribution_keys(self) -> list:
+        return [
+            (name, by)
+            for name, dims in DISTRIBUTION_GROUPS.items()
+            if name in self.columns
+            for by in dims
+            if by in self.columns
+        ]
+
+    def group_sketches(self, name: str, by: str, valid_only: bool = False) -> dict:
+        """
+        One QuantileSketch of `name` per observed label of `by`, filled in one blockwise pass.
+        """
+        with self._locks["group_sketches"]:
+            valid_only = valid_only and self.has_volume
+            key = (name, by, valid_only)
+            if key not in self._group_sketches:
+                if not self.has_frame:
+                    raise KeyError(f"No distribution of {name!r} by {by!r} was collected")
+                df = self.df
+                if by not in self._labels:
+                    self._labels[by] = dimension_labels(df[by])
+                labels = self._labels[by]
+                sketches = [QuantileSketch() for _ in labels]
+                for start in range(0, len(df), CUBE_BLOCK_ROWS):
+                    block = df.iloc[start:start + CUBE_BLOCK_ROWS]
+                    if valid_only:
+                        block = block[block["Sales_Volume"] > 0]
+                    add_grouped(sketches, block[name].to_numpy(dtype="float64"), dimension_codes(block[by], labels))
+                plain = _plain_keys(pd.Series(labels)).tolist()
+                self._group_sketches[key] = {label: sk for label, sk in zip(plain, sketches) if sk.count}
+            return self._group_sketches[key]
+
+    def distribution(
+        self,
+        name: str,
+        by: str,
+        valid_only: bool = False,
+        percentiles: Sequence[float] = DISTRIBUTION_PERCENTILES,
+    ) -> pd.DataFrame:
+        """
+        Distribution of `name` per label of `by`: count, min, the percentiles and max. Exact up to
+        EXACT_QUANTILE_MAX_ROWS rows, from the per-group sketches (group_sketches) above.
+        """
+        percentiles = list(percentiles)
+        columns = [f"{q * 100:g}%" for q in percentiles]
+        if self._exact_quantiles(valid_only):
+            values = self.column(name, valid_only)
+            grouped = values.groupby(self.column(by, valid_only), observed=True, sort=True)
+            out = grouped.agg(["count", "min", "max"])
+            quantiles = grouped.quantile(percentiles).unstack()
+            quantiles.columns = columns
+            out = pd.concat([out[["count", "min"]], quantiles, out[["max"]]], axis=1).reset_index()
+            out[by] = _plain_keys(out[by])
+            return out
+        rows = []
+        for label, sketch in self.group_sketches(name, by, valid_only).items():
+            rows.append([label, sketch.count, sketch.min, *sketch.quantiles(percentiles), sketch.max])
+        return pd.DataFrame(rows, columns=[by, "count", "min", *columns, "max"])
+
+    def _comoment_keys(self) -> list:
+        # (columns, by) of the co-moments collected per pass: the correlation matrix, then the
+        # (x, y) pairs of SEGMENT_REGRESSIONS per dimension
+        keys = []
+        columns = tuple(c for c in CORRELATION_COLUMNS if c in self.columns)
+        if len(columns) >= 2:
+            keys.append((columns, None))
+        for (y, x), dims in SEGMENT_REGRESSIONS.items():
+            if {x, y}.issubset(self.columns):
+                keys.extend(((x, y), by) for by in dims if by in self.columns)
+        return keys
+
+    def _collect_comoments(self, valid_only: bool) -> None:
+        """
+        One blockwise pass filling every co-moment of _comoment_keys(): each block's columns are
+        converted to float64 and each grouping dimension coded once, then shared by all of them.
+        """
+        if valid_only and self.row_count(True) == self.row_count(False):
+            # No rows are filtered out, the co-moments of all rows can be shared
+            for (columns, by), comoments in self._comoment_items(False):
+                self._comoments[(columns, by, True)] = comoments
+            return
+        df = self.df
+        keys = self._comoment_keys()
+        used = list(dict.fromkeys(c for columns, _ in keys for c in columns))
+        labels = {}
+        for _, by in keys:
+            if by is not None:
+                if by not in self._labels:
+                    self._labels[by] = dimension_labels(df[by])
+                labels[by] = self._labels[by]
+        comoments = {
+            (columns, by): CoMoments(columns, _plain_keys(pd.Series(labels[by])).tolist() if by else None)
+            for columns, by in keys
+        }
+        for start in range(0, len(df), CUBE_BLOCK_ROWS):
+            block = df.iloc[start:start + CUBE_BLOCK_ROWS]
+            if valid_only:
+                block = block[block["Sales_Volume"] > 0]
+            values = np.stack([block[c].to_numpy(dtype="float64") for c in used])
+            codes = {by: dimension_codes(block[by], labels[by]) for by in labels}
+            for (columns, by), acc in comoments.items():
+                rows = [used.index(c) for c in columns]
+                acc.add(values if rows == list(range(len(used))) else values[rows], codes.get(by))
+        for (columns, by), acc in comoments.items():
+            self._comoments[(columns, by, valid_only)] = acc
+
+    def _comoment_items(self, valid_only: bool) -> list:
+        return [((columns, by), self.comoments(columns, by, valid_only)) for columns, by in self._comoment_keys()]
+
+    def comoments(self, columns: Sequence[str], by: Optional[str] = None, valid_only: bool = False) -> CoMoments:
+        """
+        Mergeable co-moments of `columns` (per label of `by`), one of _comoment_keys().
+        """
+        with self._locks["comoments"]:
+            valid_only = valid_only and self.has_volume
+            key = (tuple(columns), by, valid_only)
+            if key not in self._comoments:
+                if not self.has_frame:
+                    raise KeyError(f"No co-moments of {list(columns)} by {by!r} were collected")
+                if (tuple(columns), by) not in self._comoment_keys():
+                    raise KeyError(f"Co-moments of {list(columns)} by {by!r} are not collected")
+                self._collect_comoments(valid_only)
+            return self._comoments[key]
+
+    def correlation(self, valid_only: bool = False) -> pd.DataFrame:
+        """
+        Exact Pearson correlation matrix of the CORRELATION_COLUMNS over all rows.
+        """
+        columns = tuple(c for c in CORRELATION_COLUMNS if c in self.columns)
+        return self.comoments(columns, None, valid_only).correlation()
+
+    def regression(self, y: str, x: str, by: str, valid_only: bool = False, per: float = 1.0) -> pd.DataFrame:
+        """
+        Exact least-squares fit of `y` on `x` per label of `by` (a pair and dimension of
+        SEGMENT_REGRESSIONS): by, Rows, Slope (change of y per `per` units of x), Intercept,
+        Correlation and R2.
+        """
+        comoments = self.comoments((x, y), by, valid_only)
+        fit = comoments.ols(y, x, per)
+        fit.insert(0, by, comoments.labels)
+        return fit[fit["Rows"] > 0].reset_index(drop=True)
+
+    def row_count(self, valid_only: bool = False) -> int:
+        """
+        Number of rows (with positive Sales_Volume if valid_only), read from the base cube.
+        """
+        cube = self._cube(valid_only)
+        return int(cube["Rows"].sum()) if len(cube) else 0
+
+    def valid_mask(self) -> pd.Series:
+        """
+        Rows with positive Sales_Volume (used by the revenue analysis).
+        """
+        return self.df["Sales_Volume"] > 0
+
+    def column(self, name: str, valid_only: bool = False) -> pd.Series:
+        """
+        A column of the frame, restricted to valid rows if requested.
+        When every row is valid the original column is returned without copying.
+        """
+        series = self.df[name]
+        if valid_only and self.has_volume:
+            mask = self.valid_mask()
+            if not mask.all():
+                series = series[mask]
+        return series
+
+    def _block_cube(self, block: pd.DataFrame, valid_only: bool) -> pd.DataFrame:
+        """
+        Partial cube for one block of rows. Only block-sized temporaries are allocated.
+        """
+        if valid_only:
+            block = block[block["Sales_Volume"] > 0]
+
+        columns = {d: block[d] for d in self.dimensions}
+        columns["Rows"] = pd.Series(1, index=block.index, dtype="int64")
+        if self.has_volume:
+            columns["Sales_Volume"] = _widen(block["Sales_Volume"])
+        if self.has_volume and self.has_price:
+            columns["Revenue_USD"] = _widen(block["Price_USD"]) * _widen(block["Sales_Volume"])
+        if self.has_price:
+            columns["Price_Sum"] = _widen(block["Price_USD"])
+            columns["Price_Count"] = block["Price_USD"].notna().astype("int64")
+        frame = pd.DataFrame(columns)
+
+        measures = [m for m in CUBE_MEASURES if m in frame.columns]
+        if not self.dimensions:
+            return frame[measures].sum().to_frame().T
+        return (
+            frame.groupby(self.dimensions, sort=True, dropna=False, observed=True)[measures]
+            .sum()
+            .reset_index()
+        )
+
+    def labels(self) -> dict:
+        """
+        Sorted labels of every cube dimension (see kernels.dimension_labels). Labels passed to the
+        constructor are kept as they are, e.g. those of the whole frame for one of its shards.
+        """
+        with self._locks["cubes"]:
+            for d in set(self.dimensions) | {d for d in OLAP_DIMENSIONS if d in self.columns}:
+                if d not in self._labels:
+                    self._labels[d] = dimension_labels(self.df[d])
+            return self._labels
+
+    def _scan(self) -> dict:
+        """
+        Single pass of the NumPy kernel over the frame: the base cube (CUBE_DIMENSIONS) and the
+        OLAP cube (OLAP_DIMENSIONS) as dense arrays, for all rows and for valid rows.
+        The base cube is left out when it would exceed KERNEL_MAX_CELLS.
+        """
+        with self._locks["cubes"]:
+            if self._dense is None:
+                df = self.df
+                olap_dimensions = [d for d in OLAP_DIMENSIONS if d in self.columns]
+                labels = self.labels()
+                cubes = {"olap": olap_dimensions}
+                if cell_count(labels, self.dimensions) <= KERNEL_MAX_CELLS:
+                    cubes["base"] = self.dimensions
+                else:
+                    logger.info(
+                        f"Base cube over {self.dimensions} has {cell_count(labels, self.dimensions)} cells, "
+                        f"using blockwise groupbys instead of the dense kernel"
+                    )
+                logger.debug(f"Scanning {len(df)} rows into cubes {cubes}...")
+                self._dense = scan_cubes(df, cubes, labels, CUBE_BLOCK_ROWS)
+            return self._dense
+
+    def dense_cube(self, name: str) -> dict:
+        """
+        Dense kernel cube ("base" or "olap", see kernels.scan_cubes) of the frame, or the merged
+        one of frame-less partials that carry it.
+        """
+        dense = self._scan() if self.has_frame else (self._dense or {})
+        if name not in dense:
+            raise KeyError(f"Dense cube {name!r} was not built")
+        return dense[name]
+
+    def _cube(self, valid_only: bool = False) -> pd.DataFrame:
+        """
+        Base cube: additive measures for every observed combination of the available dimensions.
+
+        Taken from the one-pass kernel scan; only when the dense cube would be too large it is
+        built with pandas block by block (CUBE_BLOCK_ROWS rows at a time) and merged. Either way
+        the frame is never copied and Revenue_USD only ever exists for one block.
+        """
+        with self._locks["cubes"]:
+            valid_only = valid_only and self.has_volume
+            if valid_only in self._cubes:
+                return self._cubes[valid_only]
+            if not self.has_frame:
+                raise KeyError(f"No base cube was collected (valid_only={valid_only})")
+
+            dense = self._scan()
+            if "base" in dense:
+                cube = dense_to_frame(dense["base"], valid_only)
+                self._cubes[valid_only] = cube
+                return cube
+
+            if valid_only and self.valid_mask().all():
+                # No rows are filtered out, the full cube can be shared
+                self._cubes[True] = self._cube(False)
+                return self._cubes[True]
+
+            df = self.df
+            logger.debug(f"Building base cube over {self.dimensions} (valid_only={valid_only})...")
+            cube = None
+            n_blocks = 0
+            for start in range(0, max(len(df), 1), CUBE_BLOCK_ROWS):
+                part = self._block_cube(df.iloc[start:start + CUBE_BLOCK_ROWS], valid_only)
+                # Fold each block into the running cube so that only one partial is alive at a time
+                cube = part if cube is None else merge_cubes([cube, part], self.dimensions)
+                n_blocks += 1
+            logger.debug(f"Base cube built: {len(cube)} cells from {len(df)} rows in {n_blocks} block(s)")
+
+            self._cubes[valid_only] = cube
+            return cube
+
+    def table(self, dims: Sequence[str], valid_only: bool = False) -> pd.DataFrame:
+        """
+        Grouped table over `dims` with the standard metrics:
+        Total_Sales_Volume, Total_Revenue_USD, Avg_Price_USD, Weighted_ASP_USD
+        (only those that the available columns allow).
+
+        Returns a fresh copy, callers may add or rename columns freely.
+        """
+        with self._locks["cubes"]:
+            dims = list(dims)
+            missing = [d for d in dims if d not in self.dimensions]
+            if missing:
+                raise KeyError(f"Dimensions not available in the base cube: {missing}")
+
+            key = (tuple(dims), valid_only)
+            if key not in self._tables:
+                cube = self._cube(valid_only)
+                measures = [m for m in CUBE_MEASURES if m in cube.columns]
+                rolled = cube.groupby(dims, sort=True, observed=True)[measures].sum().reset_index()
+
+                out = pd.DataFrame({d: _plain_keys(rolled[d]) for d in dims})
+                if "Sales_Volume" in rolled:
+                    out["Total_Sales_Volume"] = rolled["Sales_Volume"]
+                if "Revenue_USD" in rolled:
+                    out["Total_Revenue_USD"] = rolled["Revenue_USD"]
+                if "Price_Sum" in rolled:
+                    out["Avg_Price_USD"] = rolled["Price_Sum"] / rolled["Price_Count"]
+                if "Revenue_USD" in rolled:
+                    out["Weighted_ASP_USD"] = (
+                        out["Total_Revenue_USD"] / out["Total_Sales_Volume"].clip(lower=1)
+                    )
+                self._tables[key] = out
+            return self._tables[key].copy()
+
+    def numeric_columns(self) -> list:
+        """
+        Numeric columns of the frame plus the derived Revenue_USD (if available).
+        """
+        df = self.df
+        names = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c].dtype)]
+        if self.has_volume and self.has_price:
+            names.append("Revenue_USD")
+        return names
+
+    def detach(self, with_sketches: bool = True) -> "SalesAggregates":
+        """
+        Frame-less partial of these aggregates: base cubes (all rows and valid rows, with plain
+        key values so that partials of different chunks line up), the dense kernel cubes, the
+        Moments of every numeric column, the co-moments behind correlation() and regression() and,
+        unless with_sketches=False, the QuantileSketch of every numeric column and the per-group
+        sketches of DISTRIBUTION_GROUPS.
+        The frame may be released afterwards.
+        """
+        part = SalesAggregates(columns=self.columns, labels=self._labels)
+        for valid_only in ((False, True) if self.has_volume else (False,)):
+            cube = self._cube(valid_only).copy()
+            for d in self.dimensions:
+                cube[d] = _plain_keys(cube[d])
+            part._cubes[valid_only] = cube
+            for name in self.numeric_columns():
+                if with_sketches:
+                    part._sketches[(name, valid_only)] = self.sketch(name, valid_only)
+                part._moments[(name, valid_only)] = self.moments(name, valid_only)
+            if with_sketches:
+                for name, by in self._distribution_keys():
+                    part._group_sketches[(name, by, valid_only)] = self.group_sketches(name, by, valid_only)
+            for (columns, by), comoments in self._comoment_items(valid_only):
+                part._comoments[(columns, by, valid_only)] = comoments
+        part._dense = self._dense
+        return part
+
+    def merge(self, other: "SalesAggregates") -> "SalesAggregates":
+        """
+        Combine two frame-less partials (e.g. of consecutive chunks) into a new one.
+        """
+        if self.has_frame or other.has_frame:
+            raise ValueError("Only detached aggregates can be merged, call detach() first")
+        if self.columns != other.columns:
+            raise ValueError(
+                f"Cannot merge aggregates over different columns: {sorted(self.columns ^ other.columns)}"
+            )
+        merged = SalesAggregates(columns=self.columns, labels=self._labels)
+        if self._dense is not None and other._dense is not None:
+            # None when the partials were scanned with different labels
+            merged._dense = merge_dense(self._dense, other._dense)
+        for key, cube in self._cubes.items():
+            merged._cubes[key] = merge_cubes([cube, other._cubes[key]], self.dimensions)
+        for key, moments in self._moments.items():
+            merged._moments[key] = moments.merge(other._moments.get(key, Moments()))
+        for key, sketch in self._sketches.items():
+            if key in other._sketches:
+                merged._sketches[key] = sketch.merge(other._sketches[key])
+        for key, groups in self._group_sketches.items():
+            if key in other._group_sketches:
+                combined = dict(groups)
+                for label, sketch in other._group_sketches[key].items():
+                    combined[label] = combined[label].merge(sketch) if label in combined else sketch
+                merged._group_sketches[key] = dict(sorted(combined.items()))
+        for key, comoments in self._comoments.items():
+            if key in other._comoments:
+                merged._comoments[key] = comoments.merge(other._comoments[key])
+        return merged
+
+    def seed(self, partial: "SalesAggregates") -> "SalesAggregates":
+        """
+        Take over the cubes, Moments and co-moments of a frame-less partial computed elsewhere from exactly
+        the rows of this frame (e.g. by shards.aggregate_sharded), so that they are not recomputed.
+        Returns self.
+        """
+        with self._locks["comoments"], self._locks["group_sketches"], self._locks["moments"], self._locks["cubes"]:
+            if not self.has_frame or partial.has_frame:
+                raise ValueError("Only a detached partial can seed frame-backed aggregates")
+            if partial.columns != self.columns:
+                raise ValueError(f"Partial covers other columns: {sorted(self.columns ^ partial.columns)}")
+            if partial._dense is not None:
+                self._dense = partial._dense
+                self._labels = dict(partial._labels)
+            self._cubes.update(partial._cubes)
+            self._tables.clear()
+            self._moments.update(partial._moments)
+            self._sketches.update(partial._sketches)
+            self._group_sketches.update(partial._group_sketches)
+            self._comoments.update(partial._comoments)
+            return self
+
+    def to_state(self) -> dict:
+        """
+        JSON-serializable state of a frame-less partial (see from_state).
+        """
+        if self.has_frame:
+            raise ValueError("Only detached aggregates can be serialized, call detach() first")
+        return {
+            "columns": sorted(self.columns),
+            "cubes": {
+                str(valid_only): cube.to_dict(orient="split", index=False)
+                for valid_only, cube in self._cubes.items()
+            },
+            "moments": [[name, valid_only, m.to_state()] for (name, valid_only), m in self._moments.items()],
+            "sketches": [[name, valid_only, s.to_state()] for (name, valid_only), s in self._sketches.items()],
+            "group_sketches": [
+                [name, by, valid_only, [[label, s.to_state()] for label, s in groups.items()]]
+                for (name, by, valid_only), groups in self._group_sketches.items()
+            ],
+            "comoments": [
+                [by, valid_only, c.to_state()] for (_, by, valid_only), c in self._comoments.items()
+            ],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "SalesAggregates":
+        agg = cls(columns=state["columns"])
+        for key, cube in state["cubes"].items():
+            agg._cubes[key == "True"] = pd.DataFrame(cube["data"], columns=cube["columns"])
+        for name, valid_only, moments in state["moments"]:
+            agg._moments[(name, valid_only)] = Moments.from_state(moments)
+        for name, valid_only, sketch in state["sketches"]:
+            agg._sketches[(name, valid_only)] = QuantileSketch.from_state(sketch)
+        for name, by, valid_only, groups in state["group_sketches"]:
+            agg._group_sketches[(name, by, valid_only)] = {
+                label: QuantileSketch.from_state(sketch) for label, sketch in groups
+            }
+        for by, valid_only, comoments in state["comoments"]:
+            comoments = CoMoments.from_state(comoments)
+            agg._comoments[(tuple(comoments.columns), by, valid_only)] = comoments
+        return agg
+
+
+def aggregate_chunks(chunks: Iterable[pd.DataFrame]) -> SalesAggregates:
+    """
+    Fold an iterable of frames (e.g. chunks of a large workbook) into one frame-less
+    SalesAggregates. Only one chunk and the running partial are alive at any time.
+    """
+    result = None
+    n_chunks = 0
+    for chunk in chunks:
+        part = SalesAggregates(chunk).detach()
+        result = part if result is None else result.merge(part)
+        n_chunks += 1
+        logger.debug(f"Aggregated chunk {n_chunks} ({len(chunk)} rows)")
+    if result is None:
+        raise ValueError("No chunks to aggregate")
+    logger.info(f"Aggregated {result.row_count()} rows from {n_chunks} chunk(s)")
+    return result
+
+
+class _SelectionAccumulator:
+    """
+    Running state of the frame-less partial of one row subset (see aggregate_selections): the
+    dense kernel cubes, Moments and QuantileSketches of every numeric column, the per-group
+    sketches and the co-moments, i.e. everything detach() carries.
+    """
+
+    def __init__(self, template: SalesAggregates, cubes: dict, labels: dict, flags: tuple):
+        self.template = template
+        self.cubes = cubes
+        self.labels = labels
+        self.flags = flags
+        self.rows = 0
+        self.accumulators = {
+            (name, valid_only): CubeAccumulator(cell_count(labels, dims))
+            for name, dims in cubes.items()
+            for valid_only in flags
+        }
+        self.moments = {(name, v): Moments() for name in template.numeric_columns() for v in flags}
+        self.sketches = {(name, v): QuantileSketch() for name in template.numeric_columns() for v in flags}
+        self.group_sketches = {
+            (name, by, v): [QuantileSketch() for _ in labels[by]]
+            for name, by in template._distribution_keys()
+            for v in flags
+        }
+        self.comoments = {
+            (columns, by, v): CoMoments(columns, _plain_keys(pd.Series(labels[by])).tolist() if by else None)
+            for columns, by in template._comoment_keys()
+            for v in flags
+        }
+
+    def add(self, rows: np.ndarray, valid_only: bool, block: dict) -> None:
+        # `rows`: positions of the subset's rows in the block, whose shared arrays are in `block`
+        measures = {m: w[rows] for m, w in block["measures"].items()}
+        for name in self.cubes:
+            self.accumulators[(name, valid_only)].add(block["keys"][name][rows], measures)
+        for name, values in block["values"].items():
+            values = values[rows]
+            self.moments[(name, valid_only)] = self.moments[(name, valid_only)].merge(Moments.from_values(values))
+            self.sketches[(name, valid_only)].add(values)
+        for (name, by, v), sketches in self.group_sketches.items():
+            if v == valid_only:
+                add_grouped(sketches, block["values"][name][rows], block["codes"][by][rows])
+        for (columns, by, v), acc in self.comoments.items():
+            if v == valid_only:
+                values = block["comoment_values"][[block["comoment_columns"].index(c) for c in columns]]
+                acc.add(values[:, rows], block["codes"][by][rows] if by else None)
+        if not valid_only:
+            self.rows += len(rows)
+
+    def partial(self) -> SalesAggregates:
+        part = SalesAggregates(columns=self.template.columns, labels=self.labels)
+        part._dense = {
+            name: dense_cube(dims, self.labels, {v: self.accumulators[(name, v)] for v in self.flags})
+            for name, dims in self.cubes.items()
+        }
+        for valid_only in self.flags:
+            cube = dense_to_frame(part._dense["base"], valid_only)
+            for d in part.dimensions:
+                cube[d] = _plain_keys(cube[d])
+            part._cubes[valid_only] = cube
+        part._moments.update(self.moments)
+        part._sketches.update(self.sketches)
+        for (name, by, valid_only), sketches in self.group_sketches.items():
+            plain = _plain_keys(pd.Series(self.labels[by])).tolist()
+            part._group_sketches[(name, by, valid_only)] = {
+                label: sk for label, sk in zip(plain, sketches) if sk.count
+            }
+        part._comoments.update(self.comoments)
+        return part
+
+
+def aggregate_selections(
+    df: pd.DataFrame,
+    selections: dict,
+    labels: Optional[dict] = None,
+    block_rows: int = CUBE_BLOCK_ROWS,
+) -> dict:
+    """
+    Frame-less partials (as detach() returns them) of several row subsets of `df`, by name, in
+    one blockwise pass. selections: {name: {dimension: selected label positions}}, e.g. from
+    SalesCube.selection; a row belongs to a subset when each of its dimensions is selected.
+
+    Per block, every dimension is coded once and the row measures, the float64 values of the
+    numeric columns and the valid rows are computed once; each subset then only picks its rows
+    from these arrays. All partials use `labels` (default: those of the whole frame), so they
+    line up with each other and with get_aggregates(df). Subsets without rows are left out.
+    """
+    agg = get_aggregates(df)
+    labels = dict(labels) if labels else agg.labels()
+    if cell_count(labels, agg.dimensions) > KERNEL_MAX_CELLS:
+        return _aggregate_selections_blockwise(df, selections, labels, block_rows)
+
+    cubes = {"olap": [d for d in OLAP_DIMENSIONS if d in agg.columns], "base": agg.dimensions}
+    shapes = {name: tuple(len(labels[d]) for d in dims) for name, dims in cubes.items()}
+    flags = (False, True) if agg.has_volume else (False,)
+    comoment_columns = list(dict.fromkeys(c for columns, _ in agg._comoment_keys() for c in columns))
+    used = sorted(
+        {d for dims in cubes.values() for d in dims}
+        | {by for _, by in agg._distribution_keys()}
+        | {by for _, by in agg._comoment_keys() if by}
+        | {d for selection in selections.values() for d in selection}
+    )
+    # Per subset and dimension, a lookup of the selected label positions
+    selected = {}
+    for name, selection in selections.items():
+        selected[name] = {}
+        for dim, positions in selection.items():
+            lookup = np.zeros(len(labels[dim]), dtype=bool)
+            lookup[positions] = True
+            selected[name][dim] = lookup
+    accumulators = {name: _SelectionAccumulator(agg, cubes, labels, flags) for name in selections}
+
+    for start in range(0, len(df), block_rows):
+        frame = df.iloc[start:start + block_rows]
+        codes = {d: dimension_codes(frame[d], labels[d]) for d in used}
+        measures = row_measures(frame, agg.has_volume, agg.has_price)
+        values = {}
+        for name in agg.numeric_columns():
+            if name == "Revenue_USD":
+                values[name] = values["Price_USD"] * frame["Sales_Volume"].to_numpy(dtype="float64")
+            else:
+                values[name] = frame[name].to_numpy(dtype="float64")
+        block = {
+            "codes": codes,
+            "measures": measures,
+            "keys": {name: flat_keys(codes, dims, shapes[name], len(frame)) for name, dims in cubes.items()},
+            "values": values,
+            "comoment_columns": comoment_columns,
+            "comoment_values": np.stack([values[c] for c in comoment_columns]) if comoment_columns else None,
+        }
+        valid = measures["Sales_Volume"] > 0 if agg.has_volume else None
+        for name, lookups in selected.items():
+            mask = np.ones(len(frame), dtype=bool)
+            for dim, lookup in lookups.items():
+                mask &= lookup[codes[dim]]
+            if not mask.any():
+                continue
+            accumulators[name].add(np.flatnonzero(mask), False, block)
+            if valid is not None:
+                accumulators[name].add(np.flatnonzero(mask & valid), True, block)
+
+    partials = {name: acc.partial() for name, acc in accumulators.items() if acc.rows}
+    logger.debug(f"Aggregated {len(partials)} row subsets in one pass over {len(df)} rows")
+    return partials
+
+
+def _aggregate_selections_blockwise(df: pd.DataFrame, selections: dict, labels: dict, block_rows: int) -> dict:
+    # Base cube too large for the dense kernel: one detached partial per subset and block, merged
+    partials: dict = {}
+    for start in range(0, len(df), block_rows):
+        frame = df.iloc[start:start + block_rows]
+        codes = {}
+        for name, selection in selections.items():
+            mask = np.ones(len(frame), dtype=bool)
+            for dim, positions in selection.items():
+                if dim not in codes:
+                    codes[dim] = dimension_codes(frame[dim], labels[dim])
+                mask &= np.isin(codes[dim], positions)
+            if not mask.any():
+                continue
+            rows = frame[mask]
+            part = SalesAggregates(rows, labels=labels).detach()
+            partials[name] = partials[name].merge(part) if name in partials else part
+    return partials
+
+
+# Aggregates memoized per frame object for the lifetime of that frame
+_AGGREGATES_BY_FRAME: dict[int, SalesAggregates] = {}
+_AGGREGATES_LOCK = threading.Lock()
+
+
+def get_aggregates(data) -> SalesAggregates:
+    """
+    Return the shared SalesAggregates for a frame, building it on first use.
+    Passing a SalesAggregates instance returns it unchanged.
+    """
+    if isinstance(data, SalesAggregates):
+        return data
+
+    key = id(data)
+    with _AGGREGATES_LOCK:
+        agg = _AGGREGATES_BY_FRAME.get(key)
+        if agg is not None and agg.has_frame and agg._df_ref() is data:
+            return agg
+
+        agg = SalesAggregates(data)
+        _AGGREGATES_BY_FRAME[key] = agg
+        weakref.finalize(data, _AGGREGATES_BY_FRAME.pop, key, None)
+    return agg
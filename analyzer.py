@@ -1,8 +1,36 @@
 import logging
 import pandas as pd
 
+from aggregations import get_aggregates
+from cube import get_cube
+
 logger = logging.getLogger(__name__)
 
+# Typed sub-documents of the AI summary (_build_summary_for_ai), by key:
+# - kind: "table" (records with the same columns), "mapping" (label -> number, `columns` names
+#   both sides) or "value" (a single number)
+# - trim: how a prompt over its token budget shortens the document: "head" keeps the first rows
+#   (rankings), "even" keeps evenly spaced rows including the first and last (series), "ends"
+#   keeps the first and last rows (both extremes of a sorted mapping)
+# Report sections (llm_client.REPORT_SECTIONS) declare which of these keys they are sent.
+SUMMARY_DOCUMENTS = {
+    "yearly_sales": {"kind": "table", "trim": "even", "title": "Annual sales volume and YoY growth (%)"},
+    "region_summary": {"kind": "table", "trim": "head", "title": "Volume, revenue and prices by region, largest first"},
+    "model_top_by_volume": {"kind": "table", "trim": "head", "title": "Top 10 models by sales volume"},
+    "model_bottom_by_volume": {"kind": "table", "trim": "head", "title": "Bottom 5 models by sales volume"},
+    "model_top_by_revenue": {"kind": "table", "trim": "head", "title": "Top 10 models by revenue"},
+    "engine_size_vs_price": {"kind": "table", "trim": "even", "title": "Average price (USD) by engine size (L)"},
+    "corr_price_mileage": {"kind": "value", "title": "Pearson correlation of price and mileage over all rows"},
+    "price_change_per_10k_km_by_model": {
+        "kind": "mapping", "trim": "ends", "columns": ("Model", "USD_per_10k_km"),
+        "title": "Least-squares price change per 10,000 km of mileage, by model, steepest decline first",
+    },
+    "price_change_per_10k_km_by_region": {
+        "kind": "mapping", "trim": "ends", "columns": ("Region", "USD_per_10k_km"),
+        "title": "Least-squares price change per 10,000 km of mileage, by region, steepest decline first",
+    },
+}
+
 
 def analyze_basic(df: pd.DataFrame) -> None:
     """
@@ -28,7 +56,7 @@ def analyze_basic(df: pd.DataFrame) -> None:
     print("\nMissing values statistics:")
     print(missing_values)
     print("\nDescriptive statistics:")
-    print(df.describe(include="all"))
+    print(get_aggregates(df).describe_all())
     
     logger.info("Basic analysis completed")
 
@@ -38,18 +66,13 @@ def analyze_trend(df: pd.DataFrame) -> None:
     Annual sales and price trend analysis (using actual columns: Year, Price_USD, Sales_Volume).
     """
     logger.info("Starting trend analysis...")
-    cols = set(df.columns)
+    cube = get_cube(df)
+    cols = cube.columns
 
     print("\n=== Annual Sales Trend (Sales_Volume) ===")
     if {"Year", "Sales_Volume"}.issubset(cols):
         logger.debug("Performing annual sales aggregation...")
-        yearly_vol = (
-            df.groupby("Year")["Sales_Volume"]
-            .sum()
-            .reset_index()
-            .sort_values("Year")
-        )
-        yearly_vol.rename(columns={"Sales_Volume": "Total_Sales_Volume"}, inplace=True)
+        yearly_vol = cube.query(by=["Year"])[["Year", "Total_Sales_Volume"]]
         # Calculate year-over-year growth rate
         yearly_vol["YoY_growth_%"] = (
             yearly_vol["Total_Sales_Volume"].pct_change() * 100
@@ -63,22 +86,8 @@ def analyze_trend(df: pd.DataFrame) -> None:
     print("\n=== Annual Average Price & Revenue Trend (if columns exist) ===")
     if {"Year", "Sales_Volume", "Price_USD"}.issubset(cols):
         logger.debug("Performing annual price and revenue analysis...")
-        df_rev = df.copy()
-        df_rev["Revenue_USD"] = df_rev["Price_USD"] * df_rev["Sales_Volume"]
-        yearly_price_rev = (
-            df_rev.groupby("Year")
-            .agg(
-                Total_Sales_Volume=("Sales_Volume", "sum"),
-                Total_Revenue_USD=("Revenue_USD", "sum"),
-                Avg_Price_USD=("Price_USD", "mean"),
-            )
-            .reset_index()
-            .sort_values("Year")
-        )
-        yearly_price_rev["Weighted_ASP_USD"] = (
-            yearly_price_rev["Total_Revenue_USD"]
-            / yearly_price_rev["Total_Sales_Volume"].clip(lower=1)
-        ).round(2)
+        yearly_price_rev = cube.query(by=["Year"])
+        yearly_price_rev["Weighted_ASP_USD"] = yearly_price_rev["Weighted_ASP_USD"].round(2)
         print(yearly_price_rev)
         logger.info(f"Annual price and revenue analysis completed")
     else:
@@ -94,15 +103,15 @@ def analyze_mix(df: pd.DataFrame) -> None:
     Based on actual columns: Model, Region, Sales_Volume, Price_USD.
     """
     logger.info("Starting structural analysis...")
-    cols = set(df.columns)
+    cube = get_cube(df)
+    cols = cube.columns
 
     print("\n=== Model Sales Structure (Sales_Volume) ===")
     if {"Model", "Sales_Volume"}.issubset(cols):
         logger.debug("Performing model sales structure analysis...")
         model_units = (
-            df.groupby("Model")["Sales_Volume"]
-            .sum()
-            .reset_index()
+            cube.query(by=["Model"])[["Model", "Total_Sales_Volume"]]
+            .rename(columns={"Total_Sales_Volume": "Sales_Volume"})
             .sort_values("Sales_Volume", ascending=False)
         )
         model_units["share_%"] = (
@@ -118,9 +127,8 @@ def analyze_mix(df: pd.DataFrame) -> None:
     if {"Region", "Sales_Volume"}.issubset(cols):
         logger.debug("Performing regional sales structure analysis...")
         region_units = (
-            df.groupby("Region")["Sales_Volume"]
-            .sum()
-            .reset_index()
+            cube.query(by=["Region"])[["Region", "Total_Sales_Volume"]]
+            .rename(columns={"Total_Sales_Volume": "Sales_Volume"})
             .sort_values("Sales_Volume", ascending=False)
         )
         region_units["share_%"] = (
@@ -142,7 +150,9 @@ def analyze_revenue(df: pd.DataFrame) -> None:
     Based on actual columns: Price_USD (per-vehicle price), Sales_Volume (sales volume).
     """
     logger.info("Starting revenue and price analysis...")
-    cols = set(df.columns)
+    cube = get_cube(df)
+    agg = get_aggregates(df)
+    cols = cube.columns
 
     print("\n=== Revenue/Price Analysis ===")
     if not {"Price_USD", "Sales_Volume"}.issubset(cols):
@@ -150,54 +160,45 @@ def analyze_revenue(df: pd.DataFrame) -> None:
         print("Missing Price_USD / Sales_Volume columns, cannot perform revenue and per-vehicle price analysis.")
         return
 
-    df_valid = df[df["Sales_Volume"] > 0].copy()
-    logger.debug(f"Valid data rows after filtering: {len(df_valid)}")
-    df_valid["Revenue_USD"] = df_valid["Price_USD"] * df_valid["Sales_Volume"]
+    logger.debug(f"Valid data rows after filtering: {cube.total(valid_only=True)['Row_Count']}")
 
     print("\nOverall per-vehicle price (Price_USD) distribution:")
-    print(df_valid["Price_USD"].describe())
+    print(agg.describe("Price_USD", valid_only=True))
 
     print("\nOverall revenue (Revenue_USD) situation:")
     print(
-        df_valid["Revenue_USD"].describe()
+        agg.describe("Revenue_USD", valid_only=True)
     )  # Overall order revenue distribution (each row is a combination: model/region/configuration)
 
+    for dim in ("Model", "Region"):
+        if dim in cols:
+            print(f"\nPer-vehicle price distribution by {dim.lower()}:")
+            print(agg.distribution("Price_USD", dim, valid_only=True).round(2))
+
+    if "Mileage_KM" in cols:
+        print("\nCorrelation matrix of numeric columns (all rows):")
+        print(agg.correlation(valid_only=True).round(3))
+        for dim in ("Model", "Region"):
+            if dim in cols:
+                print(f"\nPrice change per 10k km by {dim.lower()} (least squares over all rows):")
+                print(agg.regression("Price_USD", "Mileage_KM", dim, valid_only=True, per=10_000).round(3))
+
     if "Model" in cols:
         logger.debug("Performing revenue analysis by model...")
-        model_rev = (
-            df_valid.groupby("Model")
-            .agg(
-                Total_Sales_Volume=("Sales_Volume", "sum"),
-                Total_Revenue_USD=("Revenue_USD", "sum"),
-                Avg_Price_USD=("Price_USD", "mean"),
-            )
-            .reset_index()
-            .sort_values("Total_Revenue_USD", ascending=False)
+        model_rev = cube.query(by=["Model"], valid_only=True).sort_values(
+            "Total_Revenue_USD", ascending=False
         )
-        model_rev["Weighted_ASP_USD"] = (
-            model_rev["Total_Revenue_USD"]
-            / model_rev["Total_Sales_Volume"].clip(lower=1)
-        ).round(2)
+        model_rev["Weighted_ASP_USD"] = model_rev["Weighted_ASP_USD"].round(2)
         print("\nSales volume, revenue and weighted ASP by model:")
         print(model_rev.head(20))
         logger.info(f"Revenue analysis by model completed, total {len(model_rev)} models")
 
     if "Region" in cols:
         logger.debug("Performing revenue analysis by region...")
-        region_rev = (
-            df_valid.groupby("Region")
-            .agg(
-                Total_Sales_Volume=("Sales_Volume", "sum"),
-                Total_Revenue_USD=("Revenue_USD", "sum"),
-                Avg_Price_USD=("Price_USD", "mean"),
-            )
-            .reset_index()
-            .sort_values("Total_Revenue_USD", ascending=False)
+        region_rev = cube.query(by=["Region"], valid_only=True).sort_values(
+            "Total_Revenue_USD", ascending=False
         )
-        region_rev["Weighted_ASP_USD"] = (
-            region_rev["Total_Revenue_USD"]
-            / region_rev["Total_Sales_Volume"].clip(lower=1)
-        ).round(2)
+        region_rev["Weighted_ASP_USD"] = region_rev["Weighted_ASP_USD"].round(2)
         print("\nSales volume, revenue and weighted ASP by region:")
         print(region_rev)
         logger.info(f"Revenue analysis by region completed, total {len(region_rev)} regions")
@@ -206,10 +207,8 @@ def analyze_revenue(df: pd.DataFrame) -> None:
         logger.debug("Performing price analysis by engine size...")
         print("\nAverage price by engine size range:")
         engine_price = (
-            df_valid.groupby("Engine_Size_L")["Price_USD"]
-            .mean()
-            .reset_index()
-            .sort_values("Engine_Size_L")
+            agg.table(["Engine_Size_L"], valid_only=True)[["Engine_Size_L", "Avg_Price_USD"]]
+            .rename(columns={"Avg_Price_USD": "Price_USD"})
         )
         print(engine_price)
         logger.info(f"Price analysis by engine size completed")
@@ -221,58 +220,30 @@ def _build_summary_for_ai(df: pd.DataFrame) -> dict:
     """
     Pre-aggregate key metrics into a compact JSON for GPT interpretation.
     Only pass structured numbers, not details, to reduce token cost.
+    Every key is one of the SUMMARY_DOCUMENTS; keys whose columns are missing are left out.
     """
     logger.info("Starting to build AI report data summary...")
     summary: dict = {}
-    cols = set(df.columns)
+    agg = get_aggregates(df)
+    cols = agg.columns
 
     # Annual trends
     if {"Year", "Sales_Volume"}.issubset(cols):
         yearly = (
-            df.groupby("Year")["Sales_Volume"]
-            .sum()
-            .reset_index()
-            .sort_values("Year")
+            agg.table(["Year"])[["Year", "Total_Sales_Volume"]]
+            .rename(columns={"Total_Sales_Volume": "Sales_Volume"})
         )
         yearly["YoY_growth_%"] = yearly["Sales_Volume"].pct_change() * 100
         summary["yearly_sales"] = yearly.round(2).to_dict(orient="records")
 
     # Regional performance
     if {"Region", "Sales_Volume", "Price_USD"}.issubset(cols):
-        tmp = df.copy()
-        tmp["Revenue_USD"] = tmp["Price_USD"] * tmp["Sales_Volume"]
-        region_agg = (
-            tmp.groupby("Region")
-            .agg(
-                Total_Sales_Volume=("Sales_Volume", "sum"),
-                Total_Revenue_USD=("Revenue_USD", "sum"),
-                Avg_Price_USD=("Price_USD", "mean"),
-            )
-            .reset_index()
-        )
-        region_agg["Weighted_ASP_USD"] = (
-            region_agg["Total_Revenue_USD"]
-            / region_agg["Total_Sales_Volume"].clip(lower=1)
-        )
+        region_agg = agg.table(["Region"]).sort_values("Total_Sales_Volume", ascending=False)
         summary["region_summary"] = region_agg.round(2).to_dict(orient="records")
 
     # Model performance
     if {"Model", "Sales_Volume", "Price_USD"}.issubset(cols):
-        tmp = df.copy()
-        tmp["Revenue_USD"] = tmp["Price_USD"] * tmp["Sales_Volume"]
-        model_agg = (
-            tmp.groupby("Model")
-            .agg(
-                Total_Sales_Volume=("Sales_Volume", "sum"),
-                Total_Revenue_USD=("Revenue_USD", "sum"),
-                Avg_Price_USD=("Price_USD", "mean"),
-            )
-            .reset_index()
-        )
-        model_agg["Weighted_ASP_USD"] = (
-            model_agg["Total_Revenue_USD"]
-            / model_agg["Total_Sales_Volume"].clip(lower=1)
-        )
+        model_agg = agg.table(["Model"])
         # Only keep top and bottom few by sales and revenue to avoid too many models causing excessive tokens
         summary["model_top_by_volume"] = (
             model_agg.sort_values("Total_Sales_Volume", ascending=False)
@@ -294,32 +265,25 @@ def _build_summary_for_ai(df: pd.DataFrame) -> dict:
         )
 
     # Relationship between price and engine size, mileage (high-level correlation, not strict causality)
-    extra_insights: dict = {}
     if {"Price_USD", "Engine_Size_L"}.issubset(cols):
         engine_price = (
-            df.groupby("Engine_Size_L")["Price_USD"]
-            .mean()
-            .reset_index()
-            .sort_values("Engine_Size_L")
+            agg.table(["Engine_Size_L"])[["Engine_Size_L", "Avg_Price_USD"]]
+            .rename(columns={"Avg_Price_USD": "Price_USD"})
         )
-        extra_insights["engine_size_vs_price"] = (
+        summary["engine_size_vs_price"] = (
             engine_price.round(2).to_dict(orient="records")
         )
     if {"Price_USD", "Mileage_KM"}.issubset(cols):
-        # Use sample correlation coefficient to prevent extreme value impact
-        sample_df = df[["Price_USD", "Mileage_KM"]].dropna().sample(
-            min(len(df), 5000), random_state=42
-        )
-        extra_insights["corr_price_mileage"] = (
-            float(sample_df["Price_USD"].corr(sample_df["Mileage_KM"]))
-            if len(sample_df) > 1
-            else None
-        )
-
-    if extra_insights:
-        summary["extra_numeric_insights"] = extra_insights
-
-    logger.info(f"AI report data summary construction completed, containing {len(summary)} main dimensions")
+        # Exact over all rows (mergeable co-moments), also for streamed / sharded aggregates
+        summary["corr_price_mileage"] = round(float(agg.correlation().loc["Price_USD", "Mileage_KM"]), 4)
+        for dim in ("Model", "Region"):
+            if dim in cols:
+                fit = agg.regression("Price_USD", "Mileage_KM", dim, per=10_000).sort_values("Slope")
+                summary[f"price_change_per_10k_km_by_{dim.lower()}"] = dict(
+                    zip(fit[dim].astype(str), fit["Slope"].round(2).tolist())
+                )
+
+    logger.info(f"AI report data summary construction completed, containing {len(summary)} documents")
     return summary
 
 
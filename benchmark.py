@@ -0,0 +1,336 @@
+"""
+Benchmark suite for the analysis pipeline on synthetic, BMW-shaped data.
+
+Generates frames with the same columns, dtypes and cardinalities as the sample workbook
+(10k rows up to 50M rows). The per-stage benchmarks of load_data, each analyze_* function,
+_build_summary_for_ai and each chart run under pytest-benchmark (tests/test_benchmarks.py)
+and fail on regressions against a saved run:
+
+    python -m pytest tests/test_benchmarks.py --benchmark-autosave
+    python -m pytest tests/test_benchmarks.py --benchmark-compare --benchmark-compare-fail=min:25%
+
+This script runs the comparative studies:
+
+    python benchmark.py --kernel                         # one-pass kernel vs. pandas groupby chain
+    python benchmark.py --scaling --rows 10000000        # sharded aggregation speedup by core count
+    python benchmark.py --correlation                    # exact co-moments vs. sample-then-correlate
+    python benchmark.py --startup                        # CLI startup times against STARTUP_BUDGETS
+
+Timings are machine dependent: save the baseline on the machine that runs the comparison.
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+import aggregations
+import data_loader
+import sampling
+import shards
+from profiler import measure
+
+logger = logging.getLogger("benchmark")
+
+# Row counts benchmarked by default; larger presets (10M, 50M) are opt-in via --rows
+DEFAULT_ROWS = (10_000, 100_000, 1_000_000)
+
+# Startup budget (seconds, fresh process) of the lightweight main.py commands: --help and status
+# import neither pandas nor matplotlib nor the OpenAI SDK, query only pandas/NumPy for the cube
+STARTUP_BUDGETS = {
+    "--help": 0.3,
+    "status": 0.3,
+    "query --by Year": 1.0,
+}
+
+# Values and ranges of the sample workbook (all columns are uniformly distributed there)
+SYNTHETIC_CATEGORIES = {
+    "Model": ["3 Series", "5 Series", "7 Series", "M3", "M5", "X1", "X3", "X5", "X6", "i3", "i8"],
+    "Region": ["Africa", "Asia", "Europe", "Middle East", "North America", "South America"],
+    "Color": ["Black", "Blue", "Grey", "Red", "Silver", "White"],
+    "Fuel_Type": ["Diesel", "Electric", "Hybrid", "Petrol"],
+    "Transmission": ["Automatic", "Manual"],
+}
+SYNTHETIC_INT_RANGES = {
+    "Year": (2020, 2024),
+    "Mileage_KM": (0, 200_000),
+    "Price_USD": (30_000, 120_000),
+    "Sales_Volume": (100, 10_000),
+}
+# Engine sizes 1.5 L to 5.0 L in 0.1 L steps (36 values)
+SYNTHETIC_ENGINE_TENTHS = (15, 50)
+
+# Column order of the sample workbook
+SYNTHETIC_COLUMNS = (
+    "Model", "Year", "Region", "Color", "Fuel_Type", "Transmission",
+    "Engine_Size_L", "Mileage_KM", "Price_USD", "Sales_Volume",
+)
+
+# Rows generated per block, bounds the int64 temporaries of the random generator
+GENERATE_BLOCK_ROWS = 1_000_000
+
+
+def make_synthetic_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """
+    BMW-shaped frame of `rows` rows in the declared COLUMN_SCHEMA dtypes (as returned by load_data).
+    Every column is filled block by block directly into its final compact dtype.
+    """
+    rng = np.random.default_rng(seed)
+
+    def fill(dtype: str, low: int, high: int) -> np.ndarray:
+        out = np.empty(rows, dtype=dtype)
+        for start in range(0, rows, GENERATE_BLOCK_ROWS):
+            stop = min(start + GENERATE_BLOCK_ROWS, rows)
+            out[start:stop] = rng.integers(low, high + 1, size=stop - start)
+        return out
+
+    columns = {}
+    for col in SYNTHETIC_COLUMNS:
+        if col in SYNTHETIC_CATEGORIES:
+            values = SYNTHETIC_CATEGORIES[col]
+            codes = fill("int8", 0, len(values) - 1)
+            columns[col] = pd.Categorical.from_codes(codes, categories=values)
+        elif col == "Engine_Size_L":
+            tenths = fill("int8", *SYNTHETIC_ENGINE_TENTHS)
+            columns[col] = (tenths / np.float32(10)).astype("float32")
+        else:
+            columns[col] = fill(data_loader.COLUMN_SCHEMA[col], *SYNTHETIC_INT_RANGES[col])
+    return pd.DataFrame(columns)
+
+
+def _timed(stage: str, timings: dict, func, *args, **kwargs):
+    """
+    Run func with its console output suppressed and keep the fastest wall time seen for the stage.
+    """
+    with contextlib.redirect_stdout(io.StringIO()), measure() as metrics:
+        result = func(*args, **kwargs)
+    timings[stage] = min(timings.get(stage, float("inf")), metrics["wall_seconds"])
+    return result
+
+
+# Tables the analyses need: (dimensions, rows with positive Sales_Volume only)
+KERNEL_TABLES = (
+    (["Year"], False),
+    (["Model"], False),
+    (["Region"], False),
+    (["Year", "Region"], False),
+    (["Engine_Size_L"], False),
+    (["Model"], True),
+    (["Region"], True),
+    (["Engine_Size_L"], True),
+)
+
+
+def _groupby_tables(df: pd.DataFrame) -> list:
+    """
+    Reference: the per-table pandas groupby chain the analyses used before the kernel (one scan
+    of the frame per table, with a frame-sized revenue column).
+    """
+    frame = df.assign(Revenue_USD=df["Price_USD"].astype("int64") * df["Sales_Volume"].astype("int64"))
+    valid = frame[frame["Sales_Volume"] > 0]
+    tables = []
+    for dims, valid_only in KERNEL_TABLES:
+        source = valid if valid_only else frame
+        tables.append(
+            source.groupby(dims, observed=True)
+            .agg(
+                Total_Sales_Volume=("Sales_Volume", "sum"),
+                Total_Revenue_USD=("Revenue_USD", "sum"),
+                Avg_Price_USD=("Price_USD", "mean"),
+            )
+            .reset_index()
+        )
+    return tables
+
+
+def _kernel_tables(df: pd.DataFrame) -> list:
+    agg = aggregations.SalesAggregates(df)
+    return [agg.table(dims, valid_only=valid_only) for dims, valid_only in KERNEL_TABLES]
+
+
+def run_kernel_benchmark(rows_list, rounds: int = 3, seed: int = 42) -> dict:
+    """
+    Time the one-pass NumPy kernel (every table rolled up from a single scan) against the
+    pandas groupby chain for the same tables. Returns {rows: {stage: seconds}}.
+    """
+    results: dict = {}
+    for rows in rows_list:
+        logger.info(f"Generating synthetic frame with {rows} rows...")
+        df = make_synthetic_frame(rows, seed=seed)
+        timings: dict = {}
+        for _ in range(rounds):
+            _timed("tables[groupby]", timings, _groupby_tables, df)
+            _timed("tables[kernel]", timings, _kernel_tables, df)
+        speedup = timings["tables[groupby]"] / max(timings["tables[kernel]"], 1e-9)
+        logger.info(
+            f"{rows} rows: groupby chain {timings['tables[groupby]']:.4f} s, "
+            f"kernel {timings['tables[kernel]']:.4f} s ({speedup:.1f}x)"
+        )
+        results[str(rows)] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+        del df
+    return results
+
+
+def _worker_counts(limit: Optional[int] = None) -> list:
+    limit = limit or os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= limit:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != limit:
+        counts.append(limit)
+    return counts
+
+
+def _serial_partial(df: pd.DataFrame) -> aggregations.SalesAggregates:
+    return aggregations.SalesAggregates(df).detach(with_sketches=False)
+
+
+def run_scaling_benchmark(rows_list, worker_counts=None, rounds: int = 3, seed: int = 42) -> dict:
+    """
+    Time the sharded aggregation (shards.aggregate_sharded, shared-memory hand-off included) for
+    1, 2, 4, ... workers against the single-process aggregation of the same partials.
+    Returns {rows: {stage: seconds}}.
+    """
+    worker_counts = worker_counts or _worker_counts()
+    results: dict = {}
+    for rows in rows_list:
+        logger.info(f"Generating synthetic frame with {rows} rows...")
+        df = make_synthetic_frame(rows, seed=seed)
+        timings: dict = {}
+        for _ in range(rounds):
+            _timed("aggregate[serial]", timings, _serial_partial, df)
+            for workers in worker_counts:
+                aggregations._AGGREGATES_BY_FRAME.clear()
+                _timed(f"aggregate[{workers} workers]", timings, shards.aggregate_sharded, df, workers=workers)
+        serial = timings["aggregate[serial]"]
+        logger.info(f"{rows} rows: serial {serial:.4f} s")
+        for workers in worker_counts:
+            seconds = timings[f"aggregate[{workers} workers]"]
+            speedup = serial / max(seconds, 1e-9)
+            logger.info(
+                f"  {workers:>3} workers {seconds:10.4f} s  speedup {speedup:5.2f}x  "
+                f"efficiency {speedup / workers:6.1%}"
+            )
+        results[str(rows)] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+        del df
+        aggregations._AGGREGATES_BY_FRAME.clear()
+    return results
+
+
+def _sample_correlation(df: pd.DataFrame) -> dict:
+    """
+    Reference: the summary correlation as estimated before the co-moment engine (the shared
+    stratified sample, then a weighted correlation).
+    """
+    aggregations._AGGREGATES_BY_FRAME.clear()
+    sampling._SAMPLES_BY_FRAME.clear()
+    return sampling.sample_correlation(sampling.get_sample(df), "Price_USD", "Mileage_KM")
+
+
+def _exact_correlation(df: pd.DataFrame) -> tuple:
+    agg = aggregations.SalesAggregates(df)
+    return agg.correlation(), [agg.regression("Price_USD", "Mileage_KM", by) for by in ("Model", "Region")]
+
+
+def run_correlation_benchmark(rows_list, rounds: int = 3, seed: int = 42) -> dict:
+    """
+    Time the exact correlation matrix plus the per-Model and per-Region regressions (one
+    co-moment pass over all rows) against the sample-then-correlate estimate of one coefficient.
+    Returns {rows: {stage: seconds}}.
+    """
+    results: dict = {}
+    for rows in rows_list:
+        logger.info(f"Generating synthetic frame with {rows} rows...")
+        df = make_synthetic_frame(rows, seed=seed)
+        timings: dict = {}
+        for _ in range(rounds):
+            estimate = _timed("correlation[sample]", timings, _sample_correlation, df)
+            exact, _ = _timed("correlation[exact]", timings, _exact_correlation, df)
+        logger.info(
+            f"{rows} rows: sample {timings['correlation[sample]']:.4f} s (r={estimate['r']:.4f}), "
+            f"exact {timings['correlation[exact]']:.4f} s (r={exact.loc['Price_USD', 'Mileage_KM']:.4f})"
+        )
+        results[str(rows)] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+        del df
+        aggregations._AGGREGATES_BY_FRAME.clear()
+        sampling._SAMPLES_BY_FRAME.clear()
+    return results
+
+
+def run_startup_benchmark(rounds: int = 3) -> dict:
+    """
+    Time fresh `main.py` processes (interpreter start, imports, command) for the lightweight
+    commands, keeping the fastest of `rounds` runs. `query` is timed against a warm cube cache.
+    Returns {command: seconds}.
+    """
+    script = str(Path(__file__).with_name("main.py"))
+    # Warm-up: refresh the columnar and cube caches so that query does not load the workbook
+    subprocess.run([sys.executable, script, "load"], check=True, capture_output=True)
+    results = {}
+    for command in STARTUP_BUDGETS:
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, script, *command.split()], check=True, capture_output=True)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[command] = round(best, 4)
+    return results
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the BMW analysis pipeline on synthetic data")
+    parser.add_argument("--rows", type=int, nargs="+", default=list(DEFAULT_ROWS),
+                        help="Row counts to benchmark (default: %(default)s, up to 50000000)")
+    parser.add_argument("--rounds", type=int, default=3, help="Runs per measurement, the fastest is kept")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed of the synthetic data")
+    # The per-stage regression benchmarks live in tests/test_benchmarks.py (pytest-benchmark)
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--kernel", action="store_true",
+                      help="Compare the one-pass aggregation kernel with the pandas groupby chain")
+    mode.add_argument("--scaling", action="store_true",
+                      help="Measure the speedup of the sharded aggregation by worker count")
+    mode.add_argument("--correlation", action="store_true",
+                      help="Compare the exact co-moment correlations with the sample-based estimate")
+    mode.add_argument("--startup", action="store_true",
+                      help="Time the main.py startup of --help, status and query against STARTUP_BUDGETS")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="Worker counts for --scaling (default: 1, 2, 4, ... up to the CPU count)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger.setLevel(logging.INFO)
+
+    if args.kernel:
+        run_kernel_benchmark(args.rows, rounds=args.rounds, seed=args.seed)
+        return 0
+    if args.scaling:
+        run_scaling_benchmark(args.rows, worker_counts=args.workers, rounds=args.rounds, seed=args.seed)
+        return 0
+    if args.correlation:
+        run_correlation_benchmark(args.rows, rounds=args.rounds, seed=args.seed)
+        return 0
+    over = []
+    for command, seconds in run_startup_benchmark(rounds=args.rounds).items():
+        budget = STARTUP_BUDGETS[command]
+        marker = "  OVER BUDGET" if seconds > budget else ""
+        logger.info(f"  main.py {command:<16} {seconds:8.3f} s  (budget {budget:.2f} s){marker}")
+        if seconds > budget:
+            over.append(command)
+    if over:
+        logger.error(f"{len(over)} command(s) over their startup budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import logging
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class CoMoments:
+    """
+    Mergeable count / mean vector / co-moment matrix (sums of products of deviations) of a set of
+    numeric columns, optionally per group (e.g. per Model).
+
+    Each block of rows is centred on its own (group) means and folded in with the pairwise
+    update of Chan et al., the multivariate form of the Moments merge, so partials of chunks,
+    shards or incremental appends combine into the exact statistics of all their rows.
+    From them: the Pearson correlation matrix and the OLS fit of one column on another
+    (slope = cov(x, y) / var(x)) of every group.
+    """
+
+    def __init__(self, columns: Sequence[str], labels: Optional[Sequence] = None):
+        self.columns = list(columns)
+        # Group labels; a single unnamed group when ungrouped
+        self.labels = list(labels) if labels is not None else [None]
+        k = len(self.columns)
+        g = len(self.labels)
+        self.count = np.zeros(g, dtype="int64")
+        self.mean = np.zeros((g, k))
+        self.m2 = np.zeros((g, k, k))
+
+    @property
+    def grouped(self) -> bool:
+        return self.labels != [None]
+
+    def add(self, values: np.ndarray, codes: Optional[np.ndarray] = None) -> "CoMoments":
+        """
+        Fold in a block of rows: `values` holds one float64 array per column, in column order
+        (shape (k, n), so that every column stays contiguous), `codes` the group position of every
+        row (in self.labels). Rows with a NaN in any column are skipped. Returns self.
+        """
+        values = np.asarray(values, dtype="float64")
+        if codes is not None:
+            codes = np.asarray(codes, dtype="int64")
+        if np.isnan(values).any():
+            complete = ~np.isnan(values).any(axis=0)
+            values = values[:, complete]
+            codes = codes[complete] if codes is not None else None
+        n = values.shape[1]
+        if n == 0:
+            return self
+
+        g, k = len(self.labels), len(self.columns)
+        # Centre on the block means first: the products below then stay small and exact enough
+        shift = values.mean(axis=1)
+        deviations = values - shift[:, None]
+        if codes is None:
+            self._combine(np.array([n]), shift[None, :], (deviations @ deviations.T)[None, :, :])
+            return self
+
+        count = np.bincount(codes, minlength=g)
+        sums = np.stack([np.bincount(codes, weights=deviations[i], minlength=g) for i in range(k)], axis=1)
+        m2 = np.zeros((g, k, k))
+        for i in range(k):
+            for j in range(i, k):
+                m2[:, i, j] = m2[:, j, i] = np.bincount(codes, weights=deviations[i] * deviations[j], minlength=g)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            offset = np.where(count[:, None] > 0, sums / np.maximum(count, 1)[:, None], 0.0)
+        # Sums of products around the group means from those around the block means
+        m2 -= np.einsum("gi,gj->gij", offset, sums)
+        self._combine(count, shift + offset, m2)
+        return self
+
+    def _combine(self, count: np.ndarray, mean: np.ndarray, m2: np.ndarray) -> None:
+        total = self.count + count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            share = np.where(total > 0, count / np.maximum(total, 1), 0.0)
+            cross = np.where(total > 0, self.count * count / np.maximum(total, 1), 0.0)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * share[:, None]
+        self.m2 = self.m2 + m2 + np.einsum("gi,gj->gij", delta, delta) * cross[:, None, None]
+        self.count = total
+
+    def merge(self, other: "CoMoments") -> "CoMoments":
+        """
+        New CoMoments of the rows of both (same columns; groups are aligned by label).
+        """
+        if other.columns != self.columns:
+            raise ValueError(f"Cannot merge co-moments over different columns: {self.columns} vs {other.columns}")
+        if other.labels == self.labels:
+            labels = self.labels
+        else:
+            labels = sorted(set(self.labels) | set(other.labels), key=lambda label: (label is None, label))
+        merged = CoMoments(self.columns, labels if labels != [None] else None)
+        for part in (self, other):
+            positions = [labels.index(label) for label in part.labels]
+            count = np.zeros(len(labels), dtype="int64")
+            mean = np.zeros_like(merged.mean)
+            m2 = np.zeros_like(merged.m2)
+            count[positions], mean[positions], m2[positions] = part.count, part.mean, part.m2
+            merged._combine(count, mean, m2)
+        return merged
+
+    def correlation(self, group: int = 0) -> pd.DataFrame:
+        """
+        Pearson correlation matrix of one group (NaN for constant columns).
+        """
+        m2 = self.m2[group]
+        scale = np.sqrt(np.diag(m2))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = m2 / np.outer(scale, scale)
+        np.fill_diagonal(corr, np.where(scale > 0, 1.0, np.nan))
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def ols(self, y: str, x: str, per: float = 1.0) -> pd.DataFrame:
+        """
+        Least-squares fit y = Intercept + Slope × x per group: Rows, Slope (per `per` units of x),
+        Intercept, Correlation and R2.
+        """
+        i, j = self.columns.index(x), self.columns.index(y)
+        sxx, syy, sxy = self.m2[:, i, i], self.m2[:, j, j], self.m2[:, i, j]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = np.where(sxx > 0, sxy / sxx, np.nan)
+            corr = np.where((sxx > 0) & (syy > 0), sxy / np.sqrt(sxx * syy), np.nan)
+        return pd.DataFrame({
+            "Rows": self.count,
+            "Slope": slope * per,
+            "Intercept": self.mean[:, j] - slope * self.mean[:, i],
+            "Correlation": corr,
+            "R2": corr ** 2,
+        })
+
+    def to_state(self) -> dict:
+        return {
+            "columns": self.columns,
+            "labels": self.labels if self.grouped else None,
+            "count": self.count.tolist(),
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "CoMoments":
+        comoments = cls(state["columns"], state["labels"])
+        comoments.count = np.array(state["count"], dtype="int64")
+        comoments.mean = np.array(state["mean"], dtype="float64").reshape(comoments.mean.shape)
+        comoments.m2 = np.array(state["m2"], dtype="float64").reshape(comoments.m2.shape)
+        return comoments
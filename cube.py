@@ -0,0 +1,380 @@
+import json
+import logging
+import os
+import threading
+import weakref
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from aggregations import CUBE_MEASURES, OLAP_DIMENSIONS, SalesAggregates, get_aggregates
+from kernels import CubeAccumulator, dimension_codes, dimension_labels
+from paths import CUBE_CACHE_FILE, CUBE_CACHE_META_FILE
+
+logger = logging.getLogger(__name__)
+
+# Bump when the persisted cube layout changes so that old cube caches are rebuilt
+# (2: label dtypes, so that nullable integer labels stay integral)
+CUBE_CACHE_VERSION = 2
+
+
+class SalesCube:
+    """
+    Dense OLAP cube: the additive CUBE_MEASURES (row count, units, revenue, price sum/count) for
+    every combination of the OLAP_DIMENSIONS labels, held as one NumPy array per row filter
+    (all rows / rows with positive Sales_Volume).
+
+    For a loaded frame it comes from the same one-pass kernel scan (kernels.scan_cubes) that
+    builds the base cube of SalesAggregates; afterwards
+    every slice, roll-up or drill-down is answered from the array alone, without touching the rows:
+
+        cube = get_cube(df)
+        cube.total(Model="X5", Region="Asia", Year=(2022, 2023))["Weighted_ASP_USD"]
+        cube.query(by=["Year"], Model="X5")                     # drill down into years
+        cube.query(by=["Region", "Fuel_Type"], valid_only=True)  # cross table
+
+    Filters: a scalar selects one label, a list/set selects several, a (low, high) tuple selects an
+    inclusive range (None leaves a side open).
+    """
+
+    def __init__(self, dimensions: Sequence[str], labels: dict, values: dict, measures: Sequence[str], columns: set):
+        self.dimensions = list(dimensions)
+        self.labels = labels
+        self.values = values
+        # Plain NumPy label arrays and label -> position maps keep queries off the pandas Index paths
+        self._label_values = {d: np.asarray(labels[d].to_numpy()) for d in self.dimensions}
+        self._positions = {d: {v: i for i, v in enumerate(self._label_values[d])} for d in self.dimensions}
+        self.measures = list(measures)
+        self.columns = columns
+        self.has_volume = "Sales_Volume" in columns
+        self.has_price = "Price_USD" in columns
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(len(self.labels[d]) for d in self.dimensions)
+
+    @classmethod
+    def from_dense(cls, dense: dict, columns: set) -> "SalesCube":
+        return cls(dense["dimensions"], dense["labels"], dense["values"], dense["measures"], columns)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "SalesCube":
+        """
+        Cube of the loaded frame, taken from the shared one-pass kernel scan (see SalesAggregates).
+        """
+        agg = get_aggregates(df)
+        return cls.from_dense(agg.dense_cube("olap"), agg.columns)
+
+    @classmethod
+    def from_aggregates(cls, agg: SalesAggregates) -> "SalesCube":
+        """
+        Build the cube from the base cube cells of (e.g. streamed) aggregates, over the
+        dimensions those cells carry. Sharded partials of one frame keep their full OLAP cube.
+        """
+        try:
+            return cls.from_dense(agg.dense_cube("olap"), agg.columns)
+        except KeyError:
+            pass
+        dimensions = [d for d in OLAP_DIMENSIONS if d in agg.dimensions]
+        cells = {False: agg._cube(False)}
+        if agg.has_volume:
+            cells[True] = agg._cube(True)
+        labels = {d: dimension_labels(cells[False][d]) for d in dimensions}
+        shape = tuple(len(labels[d]) for d in dimensions)
+
+        values = {}
+        measures = []
+        for valid_only, frame in cells.items():
+            acc = CubeAccumulator(int(np.prod(shape)))
+            measures = [m for m in CUBE_MEASURES if m in frame.columns]
+            if dimensions:
+                keys = np.ravel_multi_index([dimension_codes(frame[d], labels[d]) for d in dimensions], shape)
+            else:
+                keys = np.zeros(len(frame), dtype="int64")
+            acc.add(keys, {m: frame[m].to_numpy() for m in measures})
+            values[valid_only] = acc.array(shape)
+        return cls(dimensions, labels, values, measures, agg.columns)
+
+    def label_values(self, dim: str) -> np.ndarray:
+        """
+        Labels of one dimension as a plain NumPy array, in cube (label position) order.
+        """
+        if dim not in self.labels:
+            raise KeyError(f"Unknown cube dimension: {dim!r} (available: {self.dimensions})")
+        return self._label_values[dim]
+
+    def selection(self, dim: str, value) -> np.ndarray:
+        """
+        Label positions selected by one filter value (scalar, list/set or (low, high) range), e.g.
+        to select the matching rows of a frame by their dimension codes (see slices.py).
+        """
+        if dim not in self.labels:
+            raise KeyError(f"Unknown cube dimension: {dim!r} (available: {self.dimensions})")
+        positions = self._positions[dim]
+        if isinstance(value, tuple):
+            low, high = value
+            values = self._label_values[dim]
+            mask = np.ones(len(values), dtype=bool)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+            return np.flatnonzero(mask)
+        if isinstance(value, (list, set, frozenset, np.ndarray, pd.Index, pd.Series)):
+            return np.array(sorted(positions[v] for v in set(value) if v in positions), dtype="int64")
+        return np.array([positions[value]] if value in positions else [], dtype="int64")
+
+    def _subarray(self, filters: dict, valid_only: bool) -> tuple:
+        """
+        Measure array restricted to the filters (one fancy-indexing step) and, per dimension,
+        the positions of the labels that remain.
+        """
+        valid_only = valid_only and self.has_volume
+        array = self.values[valid_only]
+        positions = {d: np.arange(len(self.labels[d])) for d in self.dimensions}
+        if not filters:
+            return array, positions
+        for dim, value in filters.items():
+            positions[dim] = self.selection(dim, value)
+        return array[np.ix_(*[positions[d] for d in self.dimensions])], positions
+
+    def slice(self, **filters) -> "SalesCube":
+        """
+        Sub-cube restricted to the filtered labels (dimensions are kept, see class docstring).
+        """
+        values = {}
+        positions = {}
+        for valid_only in self.values:
+            values[valid_only], positions = self._subarray(filters, valid_only)
+        labels = {d: self.labels[d].take(positions[d]) for d in self.dimensions}
+        return SalesCube(self.dimensions, labels, values, self.measures, self.columns)
+
+    def _sums(self, array: np.ndarray, by: Sequence[str]) -> np.ndarray:
+        axes = tuple(i for i, d in enumerate(self.dimensions) if d not in by)
+        summed = array.sum(axis=axes) if axes else array
+        # Remaining axes are in cube order; reorder them to the requested `by` order
+        kept = [d for d in self.dimensions if d in by]
+        order = [kept.index(d) for d in by]
+        return np.transpose(summed, order + [len(order)])
+
+    def _metrics(self, sums: dict) -> dict:
+        """
+        Standard metrics from measure sums (same definitions as SalesAggregates.table).
+        """
+        metrics = {}
+        if self.has_volume:
+            metrics["Total_Sales_Volume"] = sums["Sales_Volume"]
+        if self.has_volume and self.has_price:
+            metrics["Total_Revenue_USD"] = sums["Revenue_USD"]
+        # Cells without any price keep a NaN average, like the pandas tables
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if self.has_price:
+                metrics["Avg_Price_USD"] = sums["Price_Sum"] / sums["Price_Count"]
+            if self.has_volume and self.has_price:
+                metrics["Weighted_ASP_USD"] = sums["Revenue_USD"] / np.maximum(sums["Sales_Volume"], 1)
+        return metrics
+
+    def rollup(
+        self, by: Sequence[str] = (), valid_only: bool = False, with_rows: bool = False, dropna: bool = True
+    ) -> pd.DataFrame:
+        """
+        Roll the cube up to the `by` dimensions: one row per observed label combination (sorted
+        like a groupby on `by`), with Total_Sales_Volume, Total_Revenue_USD, Avg_Price_USD and
+        Weighted_ASP_USD (and Row_Count if with_rows).
+        """
+        return self.query(by, valid_only=valid_only, with_rows=with_rows, dropna=dropna)
+
+    def query(
+        self,
+        by: Sequence[str] = (),
+        valid_only: bool = False,
+        with_rows: bool = False,
+        dropna: bool = True,
+        **filters,
+    ) -> pd.DataFrame:
+        """
+        Slice by `filters`, then roll up to `by`. Adding a dimension to `by` drills down,
+        removing one rolls up. Like a groupby (and SalesAggregates.table), rows whose `by` label
+        is the missing-value label are left out unless dropna=False; they still count in total().
+        """
+        by = list(by)
+        for dim in by:
+            if dim not in self.labels:
+                raise KeyError(f"Unknown cube dimension: {dim!r} (available: {self.dimensions})")
+        array, positions = self._subarray(filters, valid_only)
+        sums = self._sums(array, by).reshape(-1, len(self.measures))
+        observed = np.flatnonzero(sums[:, self.measures.index("Rows")] > 0)
+
+        out = {}
+        if by:
+            grids = np.meshgrid(*[positions[d] for d in by], indexing="ij")
+            keys = {dim: self.labels[dim].take(grid.ravel()[observed]) for dim, grid in zip(by, grids)}
+            if dropna:
+                present = np.logical_and.reduce([~pd.isna(keys[dim]) for dim in by])
+                observed = observed[present]
+                keys = {dim: labels[present] for dim, labels in keys.items()}
+            out.update(keys)
+        columns = {m: sums[observed, i] for i, m in enumerate(self.measures)}
+        out.update(self._metrics(columns))
+        if with_rows:
+            out["Row_Count"] = columns["Rows"]
+        return pd.DataFrame(out)
+
+    def total(self, valid_only: bool = False, **filters) -> dict:
+        """
+        Metrics of a single slice as a dict (including Row_Count), e.g.
+        total(Model="X5", Region="Asia", Year=(2022, 2023)).
+        """
+        array, _ = self._subarray(filters, valid_only)
+        sums = self._sums(array, [])
+        columns = {m: sums[i].item() for i, m in enumerate(self.measures)}
+        metrics = {}
+        if columns["Rows"]:
+            for name, value in self._metrics(columns).items():
+                metrics[name] = value.item() if isinstance(value, np.generic) else value
+        metrics["Row_Count"] = columns["Rows"]
+        return metrics
+
+
+# Cubes memoized per source object (frame or frame-less aggregates) for its lifetime
+_CUBES_BY_SOURCE: dict[int, tuple] = {}
+_CUBES_LOCK = threading.Lock()
+
+
+def get_cube(data) -> SalesCube:
+    """
+    Return the shared SalesCube for a frame (or for SalesAggregates), building it on first use.
+    Passing a SalesCube returns it unchanged.
+    """
+    if isinstance(data, SalesCube):
+        return data
+
+    source = data
+    if isinstance(data, SalesAggregates) and data.has_frame:
+        source = data.df
+
+    key = id(source)
+    with _CUBES_LOCK:
+        entry: Optional[tuple] = _CUBES_BY_SOURCE.get(key)
+        if entry is not None and entry[0]() is source:
+            return entry[1]
+
+        if isinstance(source, SalesAggregates):
+            cube = SalesCube.from_aggregates(source)
+        else:
+            cube = SalesCube.from_frame(source)
+        _CUBES_BY_SOURCE[key] = (weakref.ref(source), cube)
+        weakref.finalize(source, _CUBES_BY_SOURCE.pop, key, None)
+    return cube
+
+
+def _source_stamp(source: Optional[Path]) -> Optional[dict]:
+    if source is None:
+        return None
+    try:
+        stat = Path(source).stat()
+    except OSError:
+        return None
+    return {"name": Path(source).name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def save_cube(
+    cube: SalesCube,
+    source: Optional[Path] = None,
+    path: Path = CUBE_CACHE_FILE,
+    meta_path: Path = CUBE_CACHE_META_FILE,
+) -> None:
+    """
+    Persist the cube for queries without the rows: the arrays as .npz, dimensions, labels and the
+    size/mtime of the `source` data file as a sidecar JSON. Both are written to temporary paths
+    first and then atomically replaced.
+    """
+    meta = {
+        "version": CUBE_CACHE_VERSION,
+        "source": _source_stamp(source),
+        "dimensions": cube.dimensions,
+        # Missing labels as null; the dtypes restore them (e.g. Int16 years with <NA>) on load
+        "labels": {d: [None if pd.isna(v) else v for v in cube.labels[d].tolist()] for d in cube.dimensions},
+        "label_dtypes": {d: str(cube.labels[d].dtype) for d in cube.dimensions},
+        "measures": cube.measures,
+        "columns": sorted(cube.columns),
+        "valid_only": [bool(k) for k in cube.values],
+    }
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **{f"values_{int(k)}": v for k, v in cube.values.items()})
+    os.replace(tmp_path, path)
+    tmp_meta = meta_path.with_name(meta_path.name + ".tmp")
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_meta, meta_path)
+    logger.info(f"Cube cache written: {path.name}")
+
+
+def load_cube(
+    source: Optional[Path] = None,
+    path: Path = CUBE_CACHE_FILE,
+    meta_path: Path = CUBE_CACHE_META_FILE,
+) -> Optional[SalesCube]:
+    """
+    The cube persisted by save_cube, or None when there is none, it has another layout version
+    or (if `source` is given) that data file changed since.
+    """
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != CUBE_CACHE_VERSION:
+            return None
+        if source is not None and meta.get("source") != _source_stamp(source):
+            logger.info("Data file changed since the cube cache was written, cube will be rebuilt")
+            return None
+        labels = {d: pd.Index(meta["labels"][d], dtype=meta["label_dtypes"][d]) for d in meta["dimensions"]}
+        with np.load(path, allow_pickle=False) as arrays:
+            values = {valid_only: arrays[f"values_{int(valid_only)}"] for valid_only in meta["valid_only"]}
+    except (OSError, ValueError, KeyError) as e:
+        logger.debug(f"No usable cube cache: {e}")
+        return None
+    shape = tuple(len(labels[d]) for d in meta["dimensions"]) + (len(meta["measures"]),)
+    if any(array.shape != shape for array in values.values()):
+        return None
+    return SalesCube(meta["dimensions"], labels, values, meta["measures"], set(meta["columns"]))
+
+
+def parse_filters(cube: SalesCube, expressions: Iterable[str]) -> dict:
+    """
+    Turn command line filters into query() keyword arguments: "Model=X5" (one label),
+    "Region=Asia,Europe" (several labels), "Year=2022..2023" / "Year=2023.." (inclusive range).
+    Values are matched against the cube labels as text (as they print, e.g. 2022 for a nullable
+    integer Year), so numeric labels need no casting.
+    """
+    filters = {}
+    for expression in expressions:
+        dim, sep, text = expression.partition("=")
+        dim = dim.strip()
+        if not sep or dim not in cube.labels:
+            raise ValueError(f"Invalid filter {expression!r}, expected DIMENSION=VALUE with one of {cube.dimensions}")
+        by_text = {str(label): label for label in cube.labels[dim]}
+
+        def label(value: str):
+            value = value.strip()
+            if value in by_text:
+                return by_text[value]
+            labels = cube.label_values(dim)
+            if labels.dtype.kind in "iuf":
+                # Numeric bounds need not be labels themselves (e.g. Year=..2022)
+                try:
+                    return labels.dtype.type(value)
+                except ValueError:
+                    pass
+            raise ValueError(f"Unknown {dim} {value!r}, available: {sorted(by_text)}")
+
+        if ".." in text:
+            low, high = text.split("..", 1)
+            filters[dim] = (label(low) if low.strip() else None, label(high) if high.strip() else None)
+        elif "," in text:
+            filters[dim] = [label(value) for value in text.split(",")]
+        else:
+            filters[dim] = label(text)
+    return filters
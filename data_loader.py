@@ -1,12 +1,30 @@
+import hashlib
+import json
 import logging
+import os
 from pathlib import Path
+from typing import Iterator, Optional
 
 import pandas as pd
 
+from aggregations import SalesAggregates, aggregate_chunks
+from paths import CACHE_FILE, CACHE_META_FILE, DATA_FILE
+
 logger = logging.getLogger(__name__)
 
-# Raw Excel data file path
-DATA_FILE = Path(__file__).with_name("BMW sales data (2020-2024).xlsx")
+try:
+    # Optional: `pip install pyarrow` enables the columnar cache in front of the Excel file
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# Bump when the cached layout changes so that old caches are rebuilt
+# (3: rows with schema violations are kept, see _apply_schema;
+#  4: integer columns with violations use nullable integer dtypes)
+CACHE_FORMAT_VERSION = 4
+
+# Rows per chunk for the streaming loader (iter_data_chunks / load_aggregates_streaming)
+DEFAULT_CHUNK_ROWS = 100_000
 
 
 # If you need to map "original column names -> standard column names", maintain the mapping here
@@ -14,47 +32,383 @@ DATA_FILE = Path(__file__).with_name("BMW sales data (2020-2024).xlsx")
 COLUMN_RENAME_MAP: dict[str, str] = {}
 
 
+# Declared dtype schema of the loaded sales frame (applied after column name normalization).
+# Low-cardinality strings become `category` (groupbys then run on integer codes), numeric
+# columns use the narrowest type that safely holds their valid range below.
+COLUMN_SCHEMA: dict[str, str] = {
+    "Model": "category",
+    "Region": "category",
+    "Color": "category",
+    "Fuel_Type": "category",
+    "Transmission": "category",
+    "Sales_Classification": "category",
+    "Year": "int16",
+    "Engine_Size_L": "float32",
+    "Mileage_KM": "int32",
+    "Price_USD": "int32",
+    "Sales_Volume": "int32",
+}
+
+# Inclusive valid range per numeric column; values outside it (or missing / non-numeric /
+# non-integral for integer columns) are schema violations
+COLUMN_RANGES: dict[str, tuple] = {
+    "Year": (1900, 2100),
+    "Engine_Size_L": (0.0, 10.0),
+    "Mileage_KM": (0, 2**31 - 1),
+    "Price_USD": (0, 2**31 - 1),
+    "Sales_Volume": (0, 2**31 - 1),
+}
+
+# Nullable dtype of an integer column whose violations are all missing, non-numeric or
+# out-of-range values: the valid values stay integral and the others become <NA>
+NULLABLE_INT_DTYPES = {"int16": "Int16", "int32": "Int32"}
+
+# Dtype of an integer column that has non-integral values: it keeps every row, with those
+# values as they are (float64 holds every int32 value exactly) and the other violations as NaN
+SCHEMA_FALLBACK_DTYPE = "float64"
+
+
 def _normalize_column_names(df: pd.DataFrame) -> pd.DataFrame:
     """
     Basic column name cleaning and optional mapping:
     - Remove leading and trailing spaces
     - Apply mapping defined in COLUMN_RENAME_MAP (if any)
+
+    Only the column labels are replaced (in place), the data itself is never copied.
     """
     logger.debug(f"Starting to normalize column names, original columns: {list(df.columns)}")
-    cleaned = df.copy()
-    cleaned.columns = [str(c).strip() for c in cleaned.columns]
+    columns = [str(c).strip() for c in df.columns]
 
     if COLUMN_RENAME_MAP:
         logger.info(f"Applying column name mapping: {COLUMN_RENAME_MAP}")
-        cleaned = cleaned.rename(columns=COLUMN_RENAME_MAP)
-    
-    logger.debug(f"Normalized column names: {list(cleaned.columns)}")
-    return cleaned
+        columns = [COLUMN_RENAME_MAP.get(c, c) for c in columns]
+
+    df.columns = columns
+    logger.debug(f"Normalized column names: {list(df.columns)}")
+    return df
+
+
+def _apply_schema(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Cast the frame to COLUMN_SCHEMA.
+
+    No rows are dropped. Numeric values that are missing, non-numeric or outside COLUMN_RANGES
+    become NaN. An integer column with such violations is cast to the nullable counterpart of
+    its declared dtype (NULLABLE_INT_DTYPES), with those values as <NA>; one that also has
+    non-integral values is cast to SCHEMA_FALLBACK_DTYPE instead. The violations are returned as
+    a table (row, column, value, issue) so that the caller can report them.
+    Columns not covered by the schema are left unchanged.
+    """
+    numeric: dict[str, pd.Series] = {}
+    dtypes = dict(COLUMN_SCHEMA)
+    violations = []
+
+    for col, dtype in COLUMN_SCHEMA.items():
+        if col not in df.columns or dtype == "category":
+            continue
+        coerced = pd.to_numeric(df[col], errors="coerce")
+        values = coerced
+        issues = pd.Series(None, index=df.index, dtype="object")
+        if pd.api.types.is_integer_dtype(dtype):
+            issues[values.notna() & (values != values.round())] = "non-integral"
+        if col in COLUMN_RANGES:
+            low, high = COLUMN_RANGES[col]
+            out_of_range = (values < low) | (values > high)
+            issues[out_of_range] = "out of range"
+            values = values.mask(out_of_range)
+        issues[df[col].isna()] = "missing"
+        issues[df[col].notna() & coerced.isna()] = "non-numeric"
+        bad = issues.notna()
+        if bad.any():
+            violations.append(pd.DataFrame({
+                "row": df.index[bad], "column": col, "value": df.loc[bad, col].to_numpy(), "issue": issues[bad].to_numpy(),
+            }))
+            if pd.api.types.is_integer_dtype(dtype):
+                if (issues == "non-integral").any():
+                    dtypes[col] = SCHEMA_FALLBACK_DTYPE
+                else:
+                    dtypes[col] = NULLABLE_INT_DTYPES[dtype]
+                logger.warning(f"Column {col} has schema violations, stored as {dtypes[col]} instead of {dtype}")
+        numeric[col] = values
+
+    columns = {}
+    for col in df.columns:
+        series = numeric.get(col, df[col])
+        if col in dtypes:
+            series = series.astype(dtypes[col])
+        columns[col] = series
+    df = pd.DataFrame(columns)
+
+    if violations:
+        violations_df = pd.concat(violations, ignore_index=True)
+    else:
+        violations_df = pd.DataFrame(columns=["row", "column", "value", "issue"])
+    return df, violations_df
+
+
+def _report_schema_violations(violations: pd.DataFrame) -> None:
+    """
+    Log schema violations: number of affected rows (all kept), count per column and issue, and
+    a few examples.
+    """
+    if violations.empty:
+        logger.debug("All rows conform to the declared schema")
+        return
+    rows = violations["row"].nunique()
+    per_column = {
+        f"{column} ({issue})": count for (column, issue), count in violations.groupby(["column", "issue"]).size().items()
+    }
+    logger.warning(f"{rows} rows violate the declared schema and were kept, per column: {per_column}")
+    for record in violations.head(10).to_dict(orient="records"):
+        logger.warning(
+            f"Schema violation: row {record['row']}, column {record['column']}, value {record['value']!r} ({record['issue']})"
+        )
+
+
+def _file_sha256(path: Path) -> str:
+    """
+    Compute the SHA-256 of a file in 1 MB blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_cache_meta() -> dict:
+    """
+    Read the cache sidecar metadata, returns an empty dict if missing or unreadable.
+    """
+    try:
+        with open(CACHE_META_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache_meta(meta: dict) -> None:
+    tmp_path = CACHE_META_FILE.with_name(CACHE_META_FILE.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, CACHE_META_FILE)
+
+
+def _cache_is_fresh(meta: dict, stat: os.stat_result) -> bool:
+    """
+    Decide whether the columnar cache still matches the workbook:
+    - Format version and column mapping must match
+    - Same size and mtime -> fresh without reading the workbook
+    - Same size but different mtime (e.g. file copied/touched) -> compare content hash
+    """
+    if not meta or not CACHE_FILE.exists():
+        return False
+    if meta.get("version") != CACHE_FORMAT_VERSION:
+        logger.info("Cache format version changed, cache will be rebuilt")
+        return False
+    if meta.get("column_rename_map") != COLUMN_RENAME_MAP:
+        logger.info("COLUMN_RENAME_MAP changed, cache will be rebuilt")
+        return False
+    if meta.get("column_schema") != COLUMN_SCHEMA or meta.get("column_ranges") != _ranges_for_meta():
+        logger.info("Column schema changed, cache will be rebuilt")
+        return False
+    if meta.get("size") != stat.st_size:
+        return False
+    if meta.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+
+    logger.debug("Workbook mtime changed, comparing content hash...")
+    if meta.get("sha256") != _file_sha256(DATA_FILE):
+        return False
+
+    # Content unchanged: remember the new mtime so that the next run skips hashing
+    meta["mtime_ns"] = stat.st_mtime_ns
+    try:
+        _write_cache_meta(meta)
+    except OSError as e:
+        logger.debug(f"Could not update cache metadata: {e}")
+    return True
+
+
+def _ranges_for_meta() -> dict:
+    # JSON round-trips tuples as lists
+    return {col: list(bounds) for col, bounds in COLUMN_RANGES.items()}
+
+
+def _load_cache() -> pd.DataFrame:
+    """
+    Load the cached columns from the Arrow IPC file. The file is read through a memory map (no
+    read buffer, no decompression), then to_pandas() materializes the columns as a pandas frame,
+    which copies them, so the frame does not depend on the file afterwards.
+    """
+    table = feather.read_table(CACHE_FILE, memory_map=True)
+    return table.to_pandas()
 
 
-def load_data() -> pd.DataFrame:
+def _write_cache(df: pd.DataFrame, stat: os.stat_result) -> None:
     """
-    Load BMW 2020–2024 sales data from local Excel file and perform basic column name cleaning/mapping.
+    Write the normalized frame to the columnar cache (uncompressed so it can be memory-mapped).
+    The cache file is written to a temporary path first and then atomically replaced.
+    """
+    tmp_path = CACHE_FILE.with_name(CACHE_FILE.name + ".tmp")
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, CACHE_FILE)
+    _write_cache_meta(
+        {
+            "version": CACHE_FORMAT_VERSION,
+            "source": DATA_FILE.name,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": _file_sha256(DATA_FILE),
+            "column_rename_map": COLUMN_RENAME_MAP,
+            "column_schema": COLUMN_SCHEMA,
+            "column_ranges": _ranges_for_meta(),
+            "shape": list(df.shape),
+        }
+    )
+    logger.info(f"Columnar cache written: {CACHE_FILE.name}")
+
+
+def load_data(use_cache: bool = True) -> pd.DataFrame:
+    """
+    Load BMW 2020–2024 sales data from local Excel file, perform basic column name cleaning/mapping
+    and cast the columns to the declared COLUMN_SCHEMA (violations are reported, see _apply_schema).
+
+    When pyarrow is installed and use_cache is True, the normalized frame is cached as an Arrow IPC
+    file next to the workbook. The cache is rebuilt only when the workbook's size/mtime/content hash
+    changes; otherwise the cached columns are read from it (see _load_cache) instead of re-parsing the
+    Excel file.
     """
     logger.info(f"Starting to load data file: {DATA_FILE}")
-    
+
     if not DATA_FILE.exists():
         logger.error(f"Data file does not exist: {DATA_FILE}")
         raise FileNotFoundError(f"Data file not found: {DATA_FILE}")
 
+    use_cache = use_cache and feather is not None
+    if feather is None:
+        logger.debug("pyarrow not installed, columnar cache disabled")
+
     try:
+        stat = DATA_FILE.stat()
+        if use_cache and _cache_is_fresh(_read_cache_meta(), stat):
+            try:
+                df = _load_cache()
+                logger.info(f"Data loaded from columnar cache ({CACHE_FILE.name}), data shape: {df.shape}")
+                return df
+            except Exception as e:
+                logger.warning(f"Failed to read columnar cache, falling back to Excel: {e}")
+
         # Read the first worksheet by default, modify sheet_name if you need to specify
         logger.debug("Reading Excel file...")
         df = pd.read_excel(DATA_FILE)
         logger.info(f"Successfully read Excel file, original data shape: {df.shape}")
-        
+
         df = _normalize_column_names(df)
+
+        raw_bytes = df.memory_usage(deep=True).sum()
+        df, violations = _apply_schema(df)
+        _report_schema_violations(violations)
+        logger.info(
+            f"Applied column schema, memory usage {raw_bytes / 1e6:.1f} MB -> "
+            f"{df.memory_usage(deep=True).sum() / 1e6:.1f} MB"
+        )
+
+        if use_cache:
+            try:
+                _write_cache(df, stat)
+            except Exception as e:
+                logger.warning(f"Failed to write columnar cache: {e}")
+
         logger.info(f"Data loading completed, final data shape: {df.shape}")
         return df
-        
+
     except Exception as e:
         logger.error(f"Error occurred while loading data file: {e}", exc_info=True)
         raise
 
 
+def _iter_excel_rows(path: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Read the first worksheet in openpyxl read-only mode, chunk_size rows at a time.
+    The first row is the header; fully empty rows are skipped.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        buffer = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame.from_records(buffer, columns=header)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame.from_records(buffer, columns=header)
+    finally:
+        workbook.close()
+
+
+def _iter_raw_chunks(path: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Chunked reader chosen by file extension: xlsx/xlsm (openpyxl read-only), csv (pandas
+    chunksize), parquet (pyarrow row batches), arrow/feather (memory-mapped record batches).
+    """
+    suffix = path.suffix.lower()
+    if suffix in (".xlsx", ".xlsm"):
+        yield from _iter_excel_rows(path, chunk_size)
+    elif suffix == ".csv":
+        with pd.read_csv(path, chunksize=chunk_size) as reader:
+            yield from reader
+    elif suffix == ".parquet":
+        import pyarrow.parquet as pq
 
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif suffix in (".arrow", ".feather"):
+        if feather is None:
+            raise ImportError("pyarrow is required to stream Arrow/Feather files")
+        table = feather.read_table(path, memory_map=True)
+        for batch in table.to_batches(max_chunksize=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported file type for streaming: {path.suffix}")
+
+
+def iter_data_chunks(path: Optional[Path] = None, chunk_size: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Stream a sales data file in chunks of at most chunk_size rows, each with normalized column
+    names and cast to COLUMN_SCHEMA (violations are reported per chunk, see _apply_schema).
+    Row numbers in the violation report are positions in the whole file.
+    """
+    path = Path(path) if path is not None else DATA_FILE
+    if not path.exists():
+        logger.error(f"Data file does not exist: {path}")
+        raise FileNotFoundError(f"Data file not found: {path}")
+
+    logger.info(f"Streaming data file in chunks of {chunk_size} rows: {path}")
+    offset = 0
+    for chunk in _iter_raw_chunks(path, chunk_size):
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        chunk = _normalize_column_names(chunk)
+        chunk, violations = _apply_schema(chunk)
+        _report_schema_violations(violations)
+        yield chunk
+    logger.info(f"Streaming completed, {offset} rows read")
+
+
+def load_aggregates_streaming(path: Optional[Path] = None, chunk_size: int = DEFAULT_CHUNK_ROWS) -> SalesAggregates:
+    """
+    Build the shared aggregates of a data file without loading it whole: every chunk from
+    iter_data_chunks is folded into mergeable partial aggregates (cube sums and counts, Weighted ASP
+    numerators/denominators, column moments) and then released, so memory stays bounded by
+    chunk_size. The result can be passed to analyze_trend, analyze_mix and analyze_revenue.
+    """
+    return aggregate_chunks(iter_data_chunks(path, chunk_size))
@@ -2,10 +2,23 @@
 Preserved compatibility entry script.
 
 Core logic has been split into the following modules:
+- paths.py: File locations of the data, caches and persisted state (standard library only)
 - data_loader.py: Handles data loading and cleaning (column name normalization and optional mapping)
+- aggregations.py: Shared aggregation engine (Revenue_USD and grouped cubes computed once per run)
+- kernels.py: NumPy bincount kernel building every aggregation cube in one pass over the frame
+- sketches.py: Mergeable quantile / histogram sketches for large, streamed, sharded and incremental runs
+- incremental.py: Persisted aggregation state for incremental appends (main.py --append)
+- shards.py: Multi-core aggregation over row shards with shared-memory hand-off (main.py --workers)
+- sampling.py: Shared stratified / weighted / reservoir samples with correlation error estimates
+- correlations.py: Mergeable co-moments for exact correlation matrices and per-segment regressions
+- cube.py: OLAP cube over Year × Region × Model × Fuel_Type × Transmission with slice/roll-up queries
+- slices.py: Data slices of batch reports (per Region, per Model, filters), aggregated in one pass
 - analyzer.py: Handles statistical metric calculations (YoY, ASP, etc.)
 - visualizer.py: Generates matplotlib / seaborn charts
 - llm_client.py: Encapsulates OpenAI interaction logic and generates Markdown reports
+- profiler.py: Optional per-stage timing and memory profiler (main.py --profile)
+- benchmark.py: Synthetic BMW-shaped data and comparative benchmarks (kernel, scaling, correlation, startup)
+- pipeline.py: Task graph of the workflow; computes only what the requested outputs need
 - main.py: Orchestrates the entire workflow
 
 Recommended to run main.py directly:
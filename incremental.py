@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from aggregations import SalesAggregates, aggregate_chunks
+from data_loader import COLUMN_SCHEMA, DEFAULT_CHUNK_ROWS, _file_sha256, iter_data_chunks
+from paths import STATE_FILE
+
+logger = logging.getLogger(__name__)
+
+# Bump when the state layout (SalesAggregates.to_state) changes. A bump invalidates every persisted
+# state (STATE_FILE, --state): load_state refuses it, and it has to be deleted and rebuilt by appending
+# all source files again, since the new statistics cannot be recovered from the old sums.
+#   2: per-Model/per-Region price sketches (group_sketches)
+#   3: co-moments (correlations.CoMoments) of the correlation matrix and the per-Model/per-Region
+#      price/mileage regressions, for all rows and valid rows; without them an appended state
+#      could not serve correlation() or regression()
+STATE_FORMAT_VERSION = 3
+
+
+def load_state(state_path: Path = STATE_FILE) -> tuple:
+    """
+    Load the persisted state. Returns (aggregates, metadata); aggregates is None when no state
+    exists yet. Raises ValueError when the state was written by another format version or
+    column schema (its sums could not be merged with newly loaded rows).
+    """
+    state_path = Path(state_path)
+    if not state_path.exists():
+        logger.info(f"No aggregation state at {state_path}, starting a new one")
+        return None, {"sources": [], "rows": 0}
+
+    with open(state_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("version") != STATE_FORMAT_VERSION:
+        raise ValueError(
+            f"Aggregation state {state_path} has format version {state.get('version')}, "
+            f"expected {STATE_FORMAT_VERSION}; rebuild it from the source files"
+        )
+    if state.get("column_schema") != COLUMN_SCHEMA:
+        raise ValueError(f"Aggregation state {state_path} was built with another column schema; rebuild it")
+
+    agg = SalesAggregates.from_state(state["aggregates"])
+    meta = {"sources": state.get("sources", []), "rows": state.get("rows", 0)}
+    logger.info(f"Aggregation state loaded: {meta['rows']} rows from {len(meta['sources'])} source(s)")
+    return agg, meta
+
+
+def save_state(agg: SalesAggregates, meta: dict, state_path: Path = STATE_FILE) -> None:
+    """
+    Write the state to a temporary file first and then atomically replace the previous one.
+    """
+    state_path = Path(state_path)
+    state = {
+        "version": STATE_FORMAT_VERSION,
+        "column_schema": COLUMN_SCHEMA,
+        "rows": meta["rows"],
+        "sources": meta["sources"],
+        "aggregates": agg.to_state(),
+    }
+    tmp_path = state_path.with_name(state_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+    logger.info(f"Aggregation state saved: {state_path} ({meta['rows']} rows)")
+
+
+def _fold(agg: Optional[SalesAggregates], meta: dict, delta: SalesAggregates, source: dict, state_path: Path) -> SalesAggregates:
+    merged = delta if agg is None else agg.merge(delta)
+    meta["rows"] += source["rows"]
+    meta["sources"].append(source)
+    save_state(merged, meta, state_path)
+    return merged
+
+
+def append_frame(df: pd.DataFrame, source: str = "frame", state_path: Path = STATE_FILE) -> SalesAggregates:
+    """
+    Fold newly arrived rows (already loaded and cast to COLUMN_SCHEMA) into the persisted state
+    and return the merged aggregates. Only the new rows are scanned.
+    """
+    logger.info(f"Appending {len(df)} rows ({source}) to the aggregation state")
+    agg, meta = load_state(state_path)
+    delta = SalesAggregates(df).detach()
+    record = {"source": source, "sha256": None, "rows": len(df), "appended_at": datetime.now().isoformat(timespec="seconds")}
+    return _fold(agg, meta, delta, record, Path(state_path))
+
+
+def append_file(
+    path: Path,
+    state_path: Path = STATE_FILE,
+    chunk_size: int = DEFAULT_CHUNK_ROWS,
+) -> Optional[SalesAggregates]:
+    """
+    Stream a new data file (xlsx/csv/parquet/arrow) into the persisted state and return the merged
+    aggregates. A file whose content hash is already recorded in the state is skipped, so that
+    re-running an append does not count its rows twice.
+    """
+    path = Path(path)
+    sha256 = _file_sha256(path)
+    agg, meta = load_state(state_path)
+    if any(s.get("sha256") == sha256 for s in meta["sources"]):
+        logger.warning(f"{path.name} was already appended to the aggregation state, skipped")
+        return agg
+
+    delta = aggregate_chunks(iter_data_chunks(path, chunk_size))
+    record = {
+        "source": str(path),
+        "sha256": sha256,
+        "rows": delta.row_count(),
+        "appended_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    return _fold(agg, meta, delta, record, Path(state_path))
@@ -0,0 +1,234 @@
+import logging
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def is_nullable_integer(series: pd.Series) -> bool:
+    """
+    Whether a column has a pandas nullable integer dtype (Int16, Int32, ...), as data_loader uses
+    for integer columns with schema violations.
+    """
+    return pd.api.types.is_extension_array_dtype(series.dtype) and pd.api.types.is_integer_dtype(series.dtype)
+
+
+def measure_values(series: pd.Series) -> np.ndarray:
+    """
+    NumPy values of a measure column. A nullable integer column keeps its integer dtype, with
+    missing values as 0, so that its sums stay exact; use series.isna() to tell them apart.
+    """
+    if is_nullable_integer(series):
+        return series.to_numpy(dtype=series.dtype.numpy_dtype, na_value=0)
+    return series.to_numpy()
+
+
+def dimension_labels(series: pd.Series) -> pd.Index:
+    """
+    Sorted labels of one dimension: the categories of a categorical column, the sorted distinct
+    values otherwise. A trailing NaN label is added when the column has missing values; labels of
+    a nullable integer column keep its dtype, with <NA> as that label, so they stay integral.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        labels = pd.Index(series.cat.categories)
+        has_missing = bool((series.cat.codes.to_numpy() == -1).any())
+    elif is_nullable_integer(series):
+        labels = pd.Index(series.dropna().unique(), dtype=series.dtype).sort_values()
+        has_missing = bool(series.isna().any())
+    else:
+        labels = pd.Index(np.sort(pd.unique(series.dropna())))
+        has_missing = bool(series.isna().any())
+    if has_missing:
+        labels = labels.append(pd.Index([pd.NA if is_nullable_integer(series) else np.nan], dtype=labels.dtype))
+    return labels
+
+
+def dimension_codes(series: pd.Series, labels: pd.Index) -> np.ndarray:
+    """
+    Positions of the values of `series` in `labels` (missing values map to the trailing NaN label).
+    """
+    categories = series.cat.categories if isinstance(series.dtype, pd.CategoricalDtype) else None
+    if categories is not None and categories.equals(labels[: len(categories)]):
+        codes = series.cat.codes.to_numpy().astype("int64")
+    else:
+        codes = labels.get_indexer(series.to_numpy())
+    if (codes == -1).any():
+        codes = np.where(codes == -1, len(labels) - 1, codes)
+    return codes
+
+
+def cell_count(labels: dict, dimensions: Sequence[str]) -> int:
+    return int(np.prod([len(labels[d]) for d in dimensions]))
+
+
+def row_measures(block: pd.DataFrame, has_volume: bool, has_price: bool) -> dict:
+    """
+    Per-row contributions to the additive measures (Rows, Sales_Volume, Revenue_USD, Price_Sum,
+    Price_Count), as NumPy arrays; integer inputs stay integer so that their sums are exact.
+    """
+    measures = {"Rows": np.ones(len(block), dtype="int64")}
+    volume = measure_values(block["Sales_Volume"]) if has_volume else None
+    price = measure_values(block["Price_USD"]) if has_price else None
+    if has_volume:
+        # Missing volumes (NaN or <NA>, see data_loader._apply_schema) add nothing, like a pandas sum
+        measures["Sales_Volume"] = np.nan_to_num(volume) if volume.dtype.kind == "f" else volume
+    if has_volume and has_price:
+        if price.dtype.kind in "iu" and volume.dtype.kind in "iu":
+            measures["Revenue_USD"] = price.astype("int64") * volume
+        else:
+            measures["Revenue_USD"] = np.nan_to_num(price.astype("float64") * volume)
+    if has_price:
+        present = block["Price_USD"].notna().to_numpy()
+        measures["Price_Sum"] = np.where(present, price, 0)
+        measures["Price_Count"] = present.astype("int64")
+    return measures
+
+
+# Integers up to this magnitude are exact in float64 (53-bit significand)
+FLOAT64_EXACT_MAX = 2 ** 53
+
+
+class CubeAccumulator:
+    """
+    Running measure sums per flat cube cell. Integer measures are accumulated in int64, so the
+    running totals never pass through float. Within a block, np.bincount sums in float64, which is
+    exact only while no cell's block sum can reach FLOAT64_EXACT_MAX (2^53): with the default
+    blocks of 65,536 rows that holds for values up to about 1.4e11 (e.g. the sample workbook's
+    revenue of at most 1.2e9 per row). Blocks whose rows × largest value could pass it are summed
+    with int64 np.add.at instead, so integer sums stay exact (up to the int64 range) at any row count.
+    """
+
+    def __init__(self, n_cells: int):
+        self.n_cells = n_cells
+        self.sums: dict = {}
+
+    def add(self, keys: np.ndarray, measures: dict) -> None:
+        for m, weights in measures.items():
+            if m not in self.sums:
+                dtype = "int64" if weights.dtype.kind in "iub" else "float64"
+                self.sums[m] = np.zeros(self.n_cells, dtype=dtype)
+            if self.sums[m].dtype.kind == "i" and len(weights):
+                peak = max(int(weights.max()), -int(weights.min()))
+                if peak * len(weights) >= FLOAT64_EXACT_MAX:
+                    np.add.at(self.sums[m], keys, weights.astype("int64"))
+                    continue
+            block_sums = np.bincount(keys, weights=weights, minlength=self.n_cells)
+            if self.sums[m].dtype.kind == "i":
+                self.sums[m] += np.rint(block_sums).astype("int64")
+            else:
+                self.sums[m] += block_sums
+
+    def measures(self) -> list:
+        return list(self.sums)
+
+    def array(self, shape: tuple) -> np.ndarray:
+        """
+        Sums as one dense array of shape `shape` + (number of measures,).
+        """
+        stacked = np.stack([self.sums[m] for m in self.sums], axis=-1)
+        return stacked.reshape(tuple(shape) + (stacked.shape[-1],))
+
+
+def flat_keys(codes: dict, dimensions: Sequence[str], shape: tuple, n_rows: int) -> np.ndarray:
+    """
+    Flat cell index of every row in a cube of `shape` over `dimensions`, from the rows' codes.
+    """
+    if not dimensions:
+        return np.zeros(n_rows, dtype="int64")
+    return np.ravel_multi_index([codes[d] for d in dimensions], shape)
+
+
+def scan_cubes(df: pd.DataFrame, cubes: dict, labels: dict, block_rows: int) -> dict:
+    """
+    Build several dense cubes in one blockwise pass over `df`.
+
+    cubes: {name: dimensions}; labels: {dimension: dimension_labels(...)} for every dimension used.
+    Per block, each dimension is coded once and the row measures are computed once, then every
+    cube accumulates them with np.bincount, for all rows and for rows with positive Sales_Volume.
+
+    Returns {name: {"dimensions", "labels", "measures", "values": {valid_only: ndarray}}}, where
+    values have the shape (label count per dimension..., number of measures).
+    """
+    has_volume = "Sales_Volume" in df.columns
+    has_price = "Price_USD" in df.columns
+    shapes = {name: tuple(len(labels[d]) for d in dims) for name, dims in cubes.items()}
+    accumulators = {
+        (name, valid_only): CubeAccumulator(int(np.prod(shapes[name])))
+        for name in cubes
+        for valid_only in ((False, True) if has_volume else (False,))
+    }
+    used = sorted({d for dims in cubes.values() for d in dims})
+
+    for start in range(0, max(len(df), 1), block_rows):
+        block = df.iloc[start:start + block_rows]
+        codes = {d: dimension_codes(block[d], labels[d]) for d in used}
+        measures = row_measures(block, has_volume, has_price)
+        valid = measures["Sales_Volume"] > 0 if has_volume else None
+        valid_measures = {m: w[valid] for m, w in measures.items()} if has_volume else None
+        for name, dims in cubes.items():
+            keys = flat_keys(codes, dims, shapes[name], len(block))
+            accumulators[(name, False)].add(keys, measures)
+            if has_volume:
+                accumulators[(name, True)].add(keys[valid], valid_measures)
+
+    result = {
+        name: dense_cube(dims, labels, {
+            valid_only: acc for (cube_name, valid_only), acc in accumulators.items() if cube_name == name
+        })
+        for name, dims in cubes.items()
+    }
+    logger.debug(f"Scanned {len(df)} rows into {len(cubes)} cube(s): {shapes}")
+    return result
+
+
+def dense_cube(dimensions: Sequence[str], labels: dict, accumulators: dict) -> dict:
+    """
+    One cube of a scan_cubes result from its accumulators ({valid_only: CubeAccumulator}).
+    """
+    shape = tuple(len(labels[d]) for d in dimensions)
+    return {
+        "dimensions": list(dimensions),
+        "labels": {d: labels[d] for d in dimensions},
+        "measures": accumulators[False].measures(),
+        "values": {valid_only: acc.array(shape) for valid_only, acc in accumulators.items()},
+    }
+
+
+def dense_to_frame(dense: dict, valid_only: bool = False) -> pd.DataFrame:
+    """
+    Long form of a dense cube: one row per observed cell (Rows > 0), keys in label order
+    (the same order as a sorted groupby over the dimensions), one column per measure.
+    """
+    dims = dense["dimensions"]
+    values = dense["values"][valid_only]
+    flat = values.reshape(-1, values.shape[-1])
+    observed = np.flatnonzero(flat[:, dense["measures"].index("Rows")] > 0)
+
+    columns = {}
+    if dims:
+        positions = np.unravel_index(observed, values.shape[:-1])
+        for d, pos in zip(dims, positions):
+            columns[d] = dense["labels"][d].take(pos)
+    for i, m in enumerate(dense["measures"]):
+        columns[m] = flat[observed, i]
+    return pd.DataFrame(columns)
+
+
+def merge_dense(left: dict, right: dict) -> Optional[dict]:
+    """
+    Sum two scan_cubes results over the same rows' schema. Returns None when a cube is missing on
+    one side or its labels differ (e.g. partials of chunks scanned with their own labels).
+    """
+    merged = {}
+    for name, cube in left.items():
+        other = right.get(name)
+        if other is None or other["dimensions"] != cube["dimensions"] or other["measures"] != cube["measures"]:
+            return None
+        if any(not cube["labels"][d].equals(other["labels"][d]) for d in cube["dimensions"]):
+            return None
+        if set(other["values"]) != set(cube["values"]):
+            return None
+        merged[name] = dict(cube, values={k: v + other["values"][k] for k, v in cube["values"].items()})
+    return merged
@@ -1,41 +1,846 @@
 import base64
+import email.utils
+import functools
+import hashlib
+import io
 import json
 import logging
+import math
 import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, Optional
 
 import pandas as pd
 
-from analyzer import _build_summary_for_ai
+from analyzer import SUMMARY_DOCUMENTS, _build_summary_for_ai
+from paths import LLM_CACHE_DIR
+from profiler import profile_stage
 
 logger = logging.getLogger(__name__)
 
 try:
-    # First run `pip install openai` and set OPENAI_API_KEY in environment variables
-    from openai import OpenAI
+    # Exact prompt token counts (pip install tiktoken); otherwise they are estimated from the length
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    # Downscaling and re-encoding of the chart images sent to the vision API (pip install pillow);
+    # without it the PNG files are sent as they are
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Created on first use by _get_llm_client, so that importing this module stays cheap
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+# Sections are independent (they only share the summary JSON), so they are requested in parallel.
+# At most DEFAULT_MAX_CONCURRENCY requests are in flight; each one is bounded by DEFAULT_REQUEST_TIMEOUT.
+# To run against a local stub server instead of OpenAI, set OPENAI_BASE_URL (e.g. http://127.0.0.1:8000/v1).
+DEFAULT_MAX_CONCURRENCY = 5
+DEFAULT_REQUEST_TIMEOUT = 120.0  # seconds
+
+# Resilience of the shared client (LLMClient): requests are paced by a token bucket shared by all
+# concurrent sections; transient failures (connection errors, timeouts, RETRY_STATUS_CODES, 5xx)
+# are retried with exponential backoff and full jitter, or after the server's Retry-After; after
+# CIRCUIT_FAILURE_THRESHOLD consecutive server-side failures calls fail fast for CIRCUIT_COOLDOWN.
+DEFAULT_REQUESTS_PER_MINUTE = 60
+RATE_LIMIT_BURST = DEFAULT_MAX_CONCURRENCY
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 1.0  # seconds, doubled per attempt
+RETRY_MAX_DELAY = 30.0  # seconds, also caps Retry-After
+RETRY_STATUS_CODES = (408, 409, 429)
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN = 60.0  # seconds
+
+# Sections are streamed: their text is written to the report file while it arrives, at most
+# every REPORT_WRITE_INTERVAL seconds (and whenever a section completes)
+DEFAULT_STREAM = True
+REPORT_WRITE_INTERVAL = 0.5  # seconds
+
+MODEL_NAME = "gpt-5.1"
+
+# Persistent, content-addressed cache of generated section text. The key covers everything that
+# determines the answer (model, system prompt, section prompt incl. summary JSON, input image bytes),
+# so unchanged sections are served from disk (LLM_CACHE_DIR) instead of being regenerated.
+LLM_CACHE_TTL = 7 * 24 * 3600  # seconds
+LLM_CACHE_MAX_BYTES = 20 * 1024 * 1024
+
+
+# Chart images sent as vision input are downscaled to at most IMAGE_MAX_DIMENSION pixels on their
+# longest side and re-encoded as IMAGE_FORMAT (lossy WebP is a fraction of the size of the
+# scatter plot PNGs). Prepared data URLs are kept in memory by content hash and settings.
+IMAGE_MAX_DIMENSION = 768
+IMAGE_FORMAT = "WEBP"
+IMAGE_QUALITY = 80
+IMAGE_CACHE_MAX_ENTRIES = 32
+
+SYSTEM_PROMPT = (
+    "You are a senior business analyst in the global automotive industry. "
+    "You are excellent at turning complex quantitative data into concise, executive-ready insights. "
+    "Write in clear, structured, business-oriented English suitable for non-technical senior leaders. "
+    "Format all output as GitHub-Flavored Markdown with appropriate headings, bullet points, and tables."
+)
+
+# Heading of the report file; reports over one slice of the data append the slice name
+REPORT_TITLE = "BMW Sales Analysis Report (2020–2024)"
+
+# Opening of every section prompt, followed by the section's summary documents and instructions
+SECTION_PROMPT_PREFIX = (
+    "\nBelow are the parts of a summary of BMW 2020–2024 sales data relevant to this section. "
+    "Each block starts with its [key] and a description; tables follow as a header row and "
+    "rows of \"|\"-separated columns (an empty cell means not available).\n\n"
+)
+
+# Added after SECTION_PROMPT_PREFIX in the prompts of a report over one slice of the data
+# (generate_ai_reports); scope is the slice name, e.g. "Region=Asia"
+SLICE_PROMPT_SCOPE = (
+    "All figures cover only the {scope} slice of the data, so rankings and shares are within that slice.\n\n"
+)
+
+# Each section is sent only the summary documents it declares ("summary_keys", most important
+# first), compacted to this many tokens: long tables are shortened first, then the last
+# documents are dropped. "Before" in the log is the full summary JSON every section used to get.
+DEFAULT_SUMMARY_TOKEN_BUDGET = 800
+# Tables and mappings are never shortened below this many rows
+MIN_DOCUMENT_ROWS = 3
+# Tokenizer of the exact counts, and characters per token of the estimate without tiktoken
+# (numeric tables tokenize denser than prose)
+TOKEN_ENCODING = "o200k_base"
+CHARS_PER_TOKEN = 3.0
+
+# Report sections in output order: the instructions that follow the summary documents in the
+# prompt, the summary documents (analyzer.SUMMARY_DOCUMENTS) it needs, the charts inserted after
+# the generated text and the charts sent to the model as image input
+REPORT_SECTIONS = [
+    {
+        "name": "Executive Summary",
+        "instructions": """Write an **Executive Summary** section with 3–6 bullet points that capture the overall performance and key messages.
+Include at least one Markdown-formatted table or chart from the JSON data.
+Use the heading "## 1. Executive Summary" and format as Markdown.
+""",
+        "summary_keys": [
+            "yearly_sales", "region_summary", "model_top_by_volume", "model_top_by_revenue",
+            "corr_price_mileage", "model_bottom_by_volume",
+        ],
+        "charts": [],  # Executive Summary usually doesn't need additional charts
+        "input_images": []  # No image input needed
+    },
+    {
+        "name": "Sales Performance Over Time",
+        "instructions": """Write a **Sales Performance Over Time** section that:
+- Describes sales and revenue trends by year and by region
+- Highlights inflection points and years of acceleration/slowdown
+- Includes at least one Markdown-formatted table showing key year-over-year comparisons
+
+Use the heading "## 2. Sales Performance Over Time" and format as Markdown.
+""",
+        "summary_keys": ["yearly_sales", "region_summary"],
+        "charts": [
+            ("chart_01_year_volume_yoy.png", "Annual total BMW sales volume and year-over-year (YoY) growth from 2020 to 2024."),
+            ("chart_02_year_revenue_asp.png", "Annual total revenue and weighted average selling price (ASP) from 2020 to 2024."),
+            ("chart_09_year_region_heatmap.png", "Sales volume heatmap by year and region.")
+        ],
+        "input_images": []
+    },
+    {
+        "name": "Top & Underperforming Models / Markets",
+        "instructions": """Write a **Top & Underperforming Models / Markets** section that:
+- Names the best and worst performing models/regions
+- Explains plausible reasons based on the data
+- Includes at least one Markdown-formatted table highlighting rankings or performance gaps
+
+Use the heading "## 3. Top & Underperforming Models / Markets" and format as Markdown.
+""",
+        "summary_keys": ["model_top_by_volume", "model_bottom_by_volume", "model_top_by_revenue", "region_summary"],
+        "charts": [
+            ("chart_03_model_top10_volume.png", "Top 10 BMW models ranked by total sales volume over 2020–2024."),
+            ("chart_04_model_top10_revenue.png", "Top 10 BMW models ranked by total revenue over 2020–2024."),
+            ("chart_06_region_volume.png", "Total BMW sales volume by region."),
+            ("chart_07_region_revenue.png", "Total BMW revenue by region.")
+        ],
+        "input_images": []
+    },
+    {
+        "name": "Key Sales Drivers",
+        "instructions": """Please also refer to the attached charts showing:
+1. Engine size vs average price relationship
+2. Mileage vs price scatter plot
+
+Write a **Key Sales Drivers** section that:
+- Analyses key drivers such as price positioning, model mix, regional mix, engine size, etc.
+- References the patterns visible in the attached charts (engine size correlation, mileage depreciation)
+- Focuses on business reasoning supported by data (do not claim strict causality)
+- Includes at least one Markdown-formatted table that makes a key driver comparison explicit
+
+Use the heading "## 4. Key Sales Drivers" and format as Markdown.
+""",
+        "summary_keys": [
+            "engine_size_vs_price", "corr_price_mileage", "price_change_per_10k_km_by_model",
+            "price_change_per_10k_km_by_region", "region_summary", "model_top_by_revenue",
+        ],
+        "charts": [
+            ("chart_05_model_weighted_asp.png", "Weighted average selling price (ASP) by model."),
+            ("chart_08_region_weighted_asp.png", "Weighted ASP by region."),
+            ("chart_13_engine_size_vs_price.png", "Average price by engine size."),
+            ("chart_14_mileage_vs_price.png", "Mileage vs price scatter plot.")
+        ],
+        "input_images": [
+            "chart_13_engine_size_vs_price.png",
+            "chart_14_mileage_vs_price.png"
+        ]  # Chapter 4 requires these two charts as visual input
+    },
+    {
+        "name": "Strategic Insights & Recommendations",
+        "instructions": """Write a **Strategic Insights & Recommendations** section that MUST explicitly analyse the following two core insights:
+
+**Core Insight 1 – High-end models' functional depreciation and quasi-fleet behaviour:**
+- Data pattern: extreme price dispersion for similar luxury nameplates across regions and usage profiles.
+- Examples:
+  - 7 Series (2020, North America), automatic, low mileage (~27,000 km): USD 100,015
+  - 7 Series (2020, South America), manual, high mileage (~122,000 km): USD 49,898
+  - i8 (2022, Europe), manual diesel, very high mileage (~196,000 km): USD 55,064
+- Discuss how certain luxury configurations behave like fleet/utility assets with accelerated depreciation.
+
+**Core Insight 2 – The colour premium and emotional demand in M performance models:**
+- Data pattern: M3/M5 appear more frequently in vivid colours vs mainstream models (X1, 3 Series)
+- Examples:
+  - M5 (2022) in red maintains strong appeal even with manual transmission
+  - Grey 3 Series cluster in utilitarian contexts
+- Argue how colour acts as an emotional value driver beyond specs.
+
+Then provide 3–5 specific, actionable business recommendations (e.g. which regions/models/price bands to prioritise).
+Include a Markdown table or structured list.
+
+Use the heading "## 5. Strategic Insights & Recommendations" and format as Markdown.
+""",
+        "summary_keys": [
+            "region_summary", "model_top_by_volume", "model_bottom_by_volume",
+            "price_change_per_10k_km_by_model", "engine_size_vs_price", "model_top_by_revenue",
+        ],
+        "charts": [
+            ("chart_12_price_distribution.png", "Price distribution showing dispersion across models and configurations.")
+        ],
+        "input_images": []
+    }
+]
+
+
+class IncompleteStreamError(ConnectionError):
+    """
+    A streamed response ended without its completion (finish_reason / response.completed),
+    e.g. because the connection dropped; retried like other connection errors.
+    """
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling the API while the circuit breaker is open.
+    """
 
-    _openai_client = OpenAI()
-    logger.info("OpenAI client initialized successfully")
-except Exception as e:
-    _openai_client = None
-    logger.warning(f"OpenAI client initialization failed: {e}")
 
+class _TokenBucket:
+    """
+    Request pacing shared by concurrent callers: `rate` requests per second on average, bursts of
+    up to `capacity`. pause() holds every caller back, e.g. for a server's Retry-After.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Block until a request may be sent; returns the seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+class _CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures: calls are refused for `cooldown` seconds,
+    then a single trial call is let through (half-open), which closes it again on success and
+    re-opens it on failure. A trial that ends otherwise (rate limited, client error, cancelled)
+    must be handed back with release_trial(), so that the next call can be the trial.
+    """
 
-def _image_to_data_url(image_path: str) -> str:
+    def __init__(self, failure_threshold: int, cooldown: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def before_call(self, holds_trial: bool = False) -> bool:
+        """
+        Raise CircuitOpenError if the call must not be made. Returns True when the call is the
+        half-open trial; a retry of that same call passes holds_trial=True and is let through.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self._opened_at + self.cooldown - self._clock()
+            if remaining > 0:
+                raise CircuitOpenError(f"LLM API circuit open after {self._failures} failures, retry in {remaining:.0f} s")
+            if self._trial and not holds_trial:
+                raise CircuitOpenError("LLM API circuit half-open, trial call in flight")
+            self._trial = True
+            return True
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "open" if self._opened_at + self.cooldown > self._clock() else "half-open"
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("LLM API circuit closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self, trial: bool = False) -> None:
+        with self._lock:
+            self._failures += 1
+            if trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                logger.warning(f"LLM API circuit opened for {self.cooldown:.0f} s after {self._failures} consecutive failures")
+                self._opened_at = self._clock()
+            if trial:
+                self._trial = False
+
+    def release_trial(self) -> None:
+        # The trial call ended without a verdict on the server's health
+        with self._lock:
+            self._trial = False
+
+
+def _retry_after(error: Exception) -> Optional[float]:
     """
-    Convert local image to base64-encoded data URL
+    Seconds to wait requested by the server (retry-after-ms or Retry-After in seconds or as an
+    HTTP date), None without such a header.
     """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
     try:
-        with open(image_path, "rb") as f:
-            img_bytes = f.read()
-        img_b64 = base64.b64encode(img_bytes).decode("utf-8")
-        return f"data:image/png;base64,{img_b64}"
+        if headers.get("retry-after-ms") is not None:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, (email.utils.parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_transient(error: Exception) -> bool:
+    """
+    Failures worth retrying: connection errors and timeouts (also raised by the HTTP transport
+    while a response is streamed, or an incomplete stream), RETRY_STATUS_CODES and server errors.
+    """
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRY_STATUS_CODES or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    import openai
+
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    return any(cls.__name__ == "TransportError" for cls in type(error).__mro__)
+
+
+class LLMClient:
+    """
+    The shared OpenAI client (one connection pool for all sections, SDK retries disabled) behind
+    rate limiting, retries and a circuit breaker:
+
+        llm = LLMClient(OpenAI(base_url="http://127.0.0.1:8000/v1", max_retries=0))
+        text = llm.call(lambda client: client.chat.completions.create(...).choices[0].message.content)
+
+    `request` receives the SDK client and should include reading a streamed response, so that a
+    stream failing halfway is retried as a whole. Each attempt waits for the token bucket; a 429
+    with Retry-After pauses the bucket for all callers. Server-side failures (5xx, timeouts,
+    connection errors) count towards the circuit breaker, rate limiting and client errors do not.
+    Client errors (4xx other than RETRY_STATUS_CODES) are raised at once.
+    """
+
+    def __init__(
+        self,
+        client,
+        requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+        burst: int = RATE_LIMIT_BURST,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        cooldown: float = CIRCUIT_COOLDOWN,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.client = client
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        # No pacing without a rate (e.g. against a local stub server)
+        self.limiter = _TokenBucket(requests_per_minute / 60, burst, clock, sleep) if requests_per_minute else None
+        self.breaker = _CircuitBreaker(failure_threshold, cooldown, clock)
+
+    def call(self, request: Callable[[Any], Any], name: str = "LLM request") -> Any:
+        attempt = 0
+        trial = False
+        try:
+            while True:
+                trial = self.breaker.before_call(holds_trial=trial)
+                if self.limiter is not None:
+                    waited = self.limiter.acquire()
+                    if waited > 0:
+                        logger.debug(f"{name}: rate limiter held the request for {waited:.2f} s")
+                attempt += 1
+                try:
+                    result = request(self.client)
+                except Exception as e:
+                    status = getattr(e, "status_code", None)
+                    transient = _is_transient(e)
+                    if transient and status not in RETRY_STATUS_CODES:
+                        self.breaker.record_failure(trial)
+                        trial = False
+                    if not transient or attempt >= self.max_attempts:
+                        raise
+                    retry_after = _retry_after(e)
+                    if retry_after is not None:
+                        delay = min(retry_after, self.max_delay)
+                        if self.limiter is not None:
+                            self.limiter.pause(delay)
+                    else:
+                        # Full jitter: concurrent sections failing together do not retry in lockstep
+                        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                    logger.warning(
+                        f"{name}: attempt {attempt}/{self.max_attempts} failed "
+                        f"({type(e).__name__}{f' {status}' if status else ''}), retrying in {delay:.1f} s"
+                    )
+                    self._sleep(delay)
+                    continue
+                self.breaker.record_success()
+                trial = False
+                return result
+        finally:
+            # A trial that was rate limited, refused as a client error or cancelled leaves the
+            # breaker half-open for the next call instead of holding the trial slot forever
+            if trial:
+                self.breaker.release_trial()
+
+
+def _get_llm_client() -> Optional[LLMClient]:
+    """
+    Shared LLMClient, created (and the SDK imported) on the first call; None if that fails,
+    in which case the next call tries again.
+    """
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            try:
+                # First run `pip install openai` and set OPENAI_API_KEY in environment variables
+                from openai import OpenAI
+
+                # Retries are done by LLMClient; the SDK client keeps its connections alive between calls
+                _llm_client = LLMClient(OpenAI(max_retries=0))
+                logger.info("OpenAI client initialized successfully")
+            except Exception as e:
+                logger.warning(f"OpenAI client initialization failed: {e}")
+        return _llm_client
+
+
+@functools.lru_cache(maxsize=1)
+def _token_encoder():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(TOKEN_ENCODING)
     except Exception as e:
-        logger.error(f"Failed to read image ({image_path}): {e}")
-        raise
+        # The encoding is downloaded on first use, which fails offline
+        logger.debug(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Prompt tokens of text: exact with tiktoken, otherwise estimated from CHARS_PER_TOKEN.
+    """
+    encoder = _token_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _format_cell(value) -> str:
+    # Amounts of 1,000 and more to whole units, smaller numbers to 4 significant digits
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, float):
+        return f"{value:.0f}" if abs(value) >= 1000 else f"{value:.4g}"
+    return str(value)
+
+
+def _document_rows(key: str, value) -> tuple:
+    """
+    Header and rows of a table or mapping summary document.
+    """
+    spec = SUMMARY_DOCUMENTS[key]
+    if spec["kind"] == "mapping":
+        return list(spec["columns"]), [[label, number] for label, number in value.items()]
+    header = list(value[0]) if value else []
+    return header, [[record.get(column) for column in header] for record in value]
+
+
+def _trim_rows(rows: list, keep: int, how: str) -> list:
+    if keep >= len(rows):
+        return rows
+    if how == "even" and keep > 1:
+        # Evenly spaced, always including the first and the last row
+        return [rows[round(i * (len(rows) - 1) / (keep - 1))] for i in range(keep)]
+    if how == "ends":
+        return rows[:(keep + 1) // 2] + rows[len(rows) - keep // 2:]
+    return rows[:keep]
+
+
+def _encode_document(key: str, value, keep: Optional[int] = None) -> str:
+    """
+    Compact text of one summary document: a "[key] title" line, then a "|"-separated header and
+    rows (the first `keep` rows, see SUMMARY_DOCUMENTS "trim") or the value itself.
+    """
+    spec = SUMMARY_DOCUMENTS[key]
+    if spec["kind"] == "value":
+        return f"[{key}] {spec['title']}: {_format_cell(value)}"
+    header, rows = _document_rows(key, value)
+    shown = _trim_rows(rows, keep if keep is not None else len(rows), spec.get("trim", "head"))
+    lines = [f"[{key}] {spec['title']}", "|".join(header)]
+    lines += ["|".join(_format_cell(cell) for cell in row) for row in shown]
+    if len(shown) < len(rows):
+        lines.append(f"({len(shown)} of {len(rows)} rows shown)")
+    return "\n".join(lines)
+
+
+def _slice_summary(summary: dict, keys: Iterable[str], token_budget: int) -> tuple:
+    """
+    Compact text of the summary documents `keys` (in this order; keys missing from the summary
+    are skipped) within `token_budget` tokens. While over budget the longest table or mapping
+    is shortened by a quarter (down to MIN_DOCUMENT_ROWS rows), then the last document is
+    dropped. Returns (text, tokens, keys sent).
+    """
+    keys = [key for key in keys if key in summary]
+    keep = {
+        key: len(_document_rows(key, summary[key])[1])
+        for key in keys
+        if SUMMARY_DOCUMENTS[key]["kind"] != "value"
+    }
+
+    def encode() -> str:
+        return "\n\n".join(_encode_document(key, summary[key], keep.get(key)) for key in keys)
+
+    text = encode()
+    tokens = count_tokens(text)
+    while tokens > token_budget:
+        longest = max((key for key in keys if keep.get(key, 0) > MIN_DOCUMENT_ROWS), key=keep.get, default=None)
+        if longest is not None:
+            keep[longest] = max(MIN_DOCUMENT_ROWS, keep[longest] * 3 // 4)
+        elif len(keys) > 1:
+            logger.debug(f"Summary document {keys[-1]} dropped to fit {token_budget} tokens")
+            keys.pop()
+        else:
+            break
+        text = encode()
+        tokens = count_tokens(text)
+    return text, tokens, keys
+
+
+# Prepared image data URLs by (content hash, max dimension, format, quality), least recently used first
+_PREPARED_IMAGES: OrderedDict = OrderedDict()
+_prepared_images_lock = threading.Lock()
+
+
+def _encode_image(img_bytes: bytes, max_dimension: int) -> tuple:
+    """
+    Downscaled, re-encoded image as (bytes, MIME type). Transparent areas are flattened onto white.
+    """
+    with Image.open(io.BytesIO(img_bytes)) as img:
+        img = img.convert("RGBA")
+        flat = Image.new("RGB", img.size, "white")
+        flat.paste(img, mask=img.getchannel("A"))
+    flat.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    out = io.BytesIO()
+    flat.save(out, format=IMAGE_FORMAT, quality=IMAGE_QUALITY)
+    return out.getvalue(), Image.MIME[IMAGE_FORMAT]
+
+
+def _prepare_image(image_path: str, max_dimension: int = IMAGE_MAX_DIMENSION) -> tuple:
+    """
+    Data URL of a chart for the vision API, downscaled to `max_dimension` and re-encoded (see
+    IMAGE_FORMAT); the original PNG when Pillow is missing or the result would not be smaller.
+    Returns (data URL, length of the data URL of the original file).
+    """
+    with open(image_path, "rb") as f:
+        img_bytes = f.read()
+    original_size = len("data:image/png;base64,") + 4 * ((len(img_bytes) + 2) // 3)
+    key = (hashlib.sha256(img_bytes).hexdigest(), max_dimension, IMAGE_FORMAT, IMAGE_QUALITY)
+    with _prepared_images_lock:
+        if key in _PREPARED_IMAGES:
+            _PREPARED_IMAGES.move_to_end(key)
+            return _PREPARED_IMAGES[key], original_size
+
+    data_url = None
+    if Image is not None:
+        try:
+            encoded, mime_type = _encode_image(img_bytes, max_dimension)
+            if len(encoded) < len(img_bytes):
+                data_url = f"data:{mime_type};base64,{base64.b64encode(encoded).decode('utf-8')}"
+        except (OSError, ValueError, KeyError) as e:
+            # e.g. a Pillow build without WebP support
+            logger.warning(f"Could not re-encode image ({image_path}), sending it unchanged: {e}")
+    if data_url is None:
+        data_url = f"data:image/png;base64,{base64.b64encode(img_bytes).decode('utf-8')}"
+
+    with _prepared_images_lock:
+        _PREPARED_IMAGES[key] = data_url
+        while len(_PREPARED_IMAGES) > IMAGE_CACHE_MAX_ENTRIES:
+            _PREPARED_IMAGES.popitem(last=False)
+    return data_url, original_size
+
+
+def _response_cache_key(
+    system_prompt: str, user_prompt: str, input_images: list, image_max_dimension: int = IMAGE_MAX_DIMENSION
+) -> str:
+    """
+    SHA-256 over model name, prompts, the image preparation settings and the bytes of every input image.
+    """
+    digest = hashlib.sha256()
+    parts = [MODEL_NAME, system_prompt, user_prompt]
+    if input_images:
+        parts.append(f"{image_max_dimension}:{IMAGE_FORMAT}:{IMAGE_QUALITY}")
+    for part in parts:
+        encoded = part.encode("utf-8")
+        digest.update(len(encoded).to_bytes(8, "little"))
+        digest.update(encoded)
+    for img_path in input_images:
+        try:
+            with open(img_path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        except OSError:
+            digest.update(f"missing:{img_path}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _response_cache_get(key: str) -> Optional[str]:
+    """
+    Return the cached section text for key, or None if missing or expired.
+    """
+    path = LLM_CACHE_DIR / f"{key}.json"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - entry.get("created_at", 0) > LLM_CACHE_TTL:
+        logger.debug(f"Response cache entry expired: {key[:12]}")
+        path.unlink(missing_ok=True)
+        return None
+
+    # Refresh mtime so that size-based eviction drops least recently used entries first
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry.get("text")
+
+
+def _response_cache_put(key: str, text: str, section_name: str) -> None:
+    """
+    Store section text atomically, then enforce TTL and size limits.
+    """
+    try:
+        LLM_CACHE_DIR.mkdir(exist_ok=True)
+        path = LLM_CACHE_DIR / f"{key}.json"
+        tmp_path = LLM_CACHE_DIR / f"{key}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"section": section_name, "model": MODEL_NAME, "created_at": time.time(), "text": text},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, path)
+        _evict_response_cache()
+    except OSError as e:
+        logger.warning(f"Failed to write response cache ({section_name}): {e}")
+
+
+def _evict_response_cache() -> None:
+    """
+    Delete expired entries, then the least recently used ones until the cache fits LLM_CACHE_MAX_BYTES.
+    """
+    entries = []
+    now = time.time()
+    for path in LLM_CACHE_DIR.glob("*.json"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        if now - stat.st_mtime > LLM_CACHE_TTL:
+            path.unlink(missing_ok=True)
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= LLM_CACHE_MAX_BYTES:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        logger.debug(f"Evicted response cache entry: {path.name}")
+
+
+class _ReportWriter:
+    """
+    Report file written while its sections arrive (in any order): the header, every completed
+    section in order up to the first unfinished one, and the text streamed so far of that one.
+    Each write replaces the file atomically (temporary file + os.replace), so a reader never sees
+    a torn report, and a failing later section does not hold back the earlier ones.
+    """
+
+    def __init__(self, path: str, header: str, count: int, interval: float = REPORT_WRITE_INTERVAL):
+        self.path = path
+        self.header = header
+        self.interval = interval
+        self._done: list = [None] * count
+        self._partial = ""
+        self._written_at = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, index: int, text: str) -> None:
+        """
+        Streamed text so far of section `index`; written only while it is the first unfinished one.
+        """
+        with self._lock:
+            if index != self._next() or time.monotonic() - self._written_at < self.interval:
+                return
+            self._partial = text
+            self._write()
+
+    def complete(self, index: int, content: str) -> None:
+        with self._lock:
+            self._done[index] = content
+            self._partial = ""
+            self._write()
+
+    def _next(self) -> int:
+        return next((i for i, content in enumerate(self._done) if content is None), len(self._done))
+
+    def _write(self) -> None:
+        report = self.header + "".join(content + "\n\n" for content in self._done[:self._next()])
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(report + self._partial)
+        os.replace(tmp_path, self.path)
+        self._written_at = time.monotonic()
+
+
+def _consume_stream(events, started: float, on_text: Optional[Callable[[str], None]], stats: dict) -> str:
+    """
+    Collect the text of a streamed chat completion or Responses API call, passing the text so far
+    to on_text after every delta. Fills `stats` with ttfb_seconds (request start to first text),
+    seconds, tokens (reported usage, estimated without it) and tokens_per_second (after the first text).
+    """
+    parts = []
+    first = None
+    tokens = None
+    completed = False
+    for event in events:
+        delta = None
+        if getattr(event, "object", None) == "chat.completion.chunk":
+            if event.choices:
+                delta = event.choices[0].delta.content
+                completed = completed or event.choices[0].finish_reason is not None
+            if event.usage is not None:
+                tokens = event.usage.completion_tokens
+        elif event.type == "response.output_text.delta":
+            delta = event.delta
+        elif event.type == "response.completed":
+            completed = True
+            if event.response.usage is not None:
+                tokens = event.response.usage.output_tokens
+        if delta:
+            if first is None:
+                first = time.perf_counter()
+            parts.append(delta)
+            if on_text is not None:
+                on_text("".join(parts))
+
+    if not completed:
+        raise IncompleteStreamError(f"Stream ended after {len(parts)} deltas without completing")
+    text = "".join(parts)
+    finished = time.perf_counter()
+    tokens = tokens if tokens is not None else count_tokens(text)
+    generating = finished - first if first is not None else 0.0
+    stats.update(
+        ttfb_seconds=round(first - started, 3) if first is not None else None,
+        seconds=round(finished - started, 3),
+        tokens=tokens,
+        tokens_per_second=round(tokens / generating, 1) if generating > 0 else None,
+    )
+    return text
 
 
 def _call_api_for_section(
-    system_prompt: str, user_prompt: str, section_name: str, input_images: list = None
+    system_prompt: str,
+    user_prompt: str,
+    section_name: str,
+    input_images: list = None,
+    timeout: float = DEFAULT_REQUEST_TIMEOUT,
+    use_cache: bool = True,
+    force_refresh: bool = False,
+    stream: bool = False,
+    on_text: Optional[Callable[[str], None]] = None,
+    stats: Optional[dict] = None,
+    image_max_dimension: int = IMAGE_MAX_DIMENSION,
 ) -> str:
     """
     Call API to generate a single section content
@@ -46,7 +851,23 @@ def _call_api_for_section(
         user_prompt: User prompt
         section_name: Section name
         input_images: List of image file paths to be used as input
+        timeout: Timeout in seconds of each attempt
+        use_cache: Serve/store the text from the on-disk response cache
+        force_refresh: Ignore any cached text and regenerate (the new text is cached)
+        stream: Stream the response, passing the text so far to on_text as it arrives
+        on_text: Callback for the streamed text so far
+        stats: Filled with time to first byte and tokens/sec of a streamed response (see _consume_stream)
+        image_max_dimension: Longest side in pixels of the input images as sent (see _prepare_image)
     """
+    input_images = input_images or []
+    cache_key = _response_cache_key(system_prompt, user_prompt, input_images, image_max_dimension) if use_cache else None
+    if cache_key and not force_refresh:
+        cached_text = _response_cache_get(cache_key)
+        if cached_text is not None:
+            logger.info(f"✓ {section_name} served from response cache")
+            return cached_text
+
+    stats = stats if stats is not None else {}
     try:
         logger.info(f"Calling GPT-5 API to generate {section_name}...")
         
@@ -63,9 +884,12 @@ def _call_api_for_section(
             ]
             
             # Add images
+            original_bytes = payload_bytes = 0
             for img_path in input_images:
                 if os.path.exists(img_path):
-                    data_url = _image_to_data_url(img_path)
+                    data_url, original_size = _prepare_image(img_path, image_max_dimension)
+                    original_bytes += original_size
+                    payload_bytes += len(data_url)
                     content.append({
                         "type": "input_image",
                         "image_url": data_url
@@ -73,31 +897,61 @@ def _call_api_for_section(
                     logger.debug(f"Added image: {img_path}")
                 else:
                     logger.warning(f"Image does not exist, skipping: {img_path}")
+            if original_bytes:
+                logger.info(
+                    f"{section_name} image payload: {original_bytes / 1024:.1f} KiB -> {payload_bytes / 1024:.1f} KiB "
+                    f"({(original_bytes - payload_bytes) / 1024:.1f} KiB saved)"
+                )
             
             # Use responses.create API
-            response = _openai_client.responses.create(
-                model="gpt-5.1",
-                input=[
-                    {
-                        "role": "user",
-                        "content": content
-                    }
-                ]
-            )
-            content_text = response.output_text
+            def request(client) -> str:
+                started = time.perf_counter()
+                response = client.responses.create(
+                    model=MODEL_NAME,
+                    input=[
+                        {
+                            "role": "user",
+                            "content": content
+                        }
+                    ],
+                    timeout=timeout,
+                    stream=stream,
+                )
+                if stream:
+                    return _consume_stream(response, started, on_text, stats)
+                return response.output_text
         else:
             # Regular text API call
-            response = _openai_client.chat.completions.create(
-                model="gpt-5.1",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.2,
-            )
-            content_text = response.choices[0].message.content  # type: ignore[assignment]
+            def request(client) -> str:
+                started = time.perf_counter()
+                response = client.chat.completions.create(
+                    model=MODEL_NAME,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                    temperature=0.2,
+                    timeout=timeout,
+                    **({"stream": True, "stream_options": {"include_usage": True}} if stream else {}),
+                )
+                if stream:
+                    return _consume_stream(response, started, on_text, stats)
+                return response.choices[0].message.content  # type: ignore[return-value]
+
+        # Retried as a whole (including reading the stream) on transient failures, see LLMClient
+        content_text = _get_llm_client().call(request, section_name)
         
+        if stream:
+            ttfb = f"{stats['ttfb_seconds']:.2f} s" if stats["ttfb_seconds"] is not None else "-"
+            rate = f"{stats['tokens_per_second']:.1f}" if stats["tokens_per_second"] is not None else "-"
+            logger.info(
+                f"✓ {section_name} streamed: first byte after {ttfb}, {stats['tokens']} tokens "
+                f"in {stats['seconds']:.2f} s ({rate} tokens/s)"
+            )
         logger.info(f"✓ {section_name} API call successful")
+        # Only successful responses are cached, failures are retried on the next run
+        if cache_key and content_text:
+            _response_cache_put(cache_key, content_text, section_name)
         return content_text
     except Exception as e:
         logger.error(f"GPT-5 API call failed ({section_name}): {e}", exc_info=True)
@@ -116,15 +970,58 @@ def _insert_charts_after_text(text: str, chart_files: list) -> str:
     return result
 
 
-def generate_ai_report(
-    df: pd.DataFrame, output_file: str = "bmw_sales_ai_report.md"
-) -> None:
+def _generate_section(
+    section: dict,
+    system_prompt: str,
+    timeout: float,
+    use_cache: bool = True,
+    force_refresh: bool = False,
+    stream: bool = False,
+    writer: Optional[_ReportWriter] = None,
+    index: int = 0,
+    image_max_dimension: int = IMAGE_MAX_DIMENSION,
+) -> str:
     """
-    Call GPT-5 API in segments to generate report, each section called separately, and insert corresponding charts after text.
+    Generate one report section and insert its charts after the text. With a `writer` the
+    streamed text and the finished section are written to the report as section `index`;
+    the section's stream statistics are kept in section["stream_stats"].
     """
-    logger.info("Starting to generate AI report (segmented mode)...")
-    
-    if _openai_client is None:
+    logger.info(f"Starting to generate section: {section['name']}")
+
+    # Get images that this section needs as input (if any)
+    input_images = section.get("input_images", [])
+
+    # Call API to generate section content
+    with profile_stage(f"llm {section['name']}", "llm"):
+        section_content = _call_api_for_section(
+            system_prompt=system_prompt,
+            user_prompt=section["prompt"],
+            section_name=section["name"],
+            input_images=input_images,
+            timeout=timeout,
+            use_cache=use_cache,
+            force_refresh=force_refresh,
+            stream=stream,
+            on_text=(lambda text: writer.update(index, text)) if writer is not None else None,
+            stats=section["stream_stats"],
+            image_max_dimension=image_max_dimension,
+        )
+
+    # Insert corresponding charts after section content
+    if section["charts"]:
+        section_content = _insert_charts_after_text(
+            section_content,
+            section["charts"]
+        )
+    if writer is not None:
+        writer.complete(index, section_content)
+
+    logger.info(f"✓ Section {section['name']} completed and charts inserted")
+    return section_content
+
+
+def _client_ready() -> bool:
+    if _get_llm_client() is None:
         logger.error("OpenAI client not initialized, cannot generate report")
         print(
             "Failed to initialize OpenAI client, please confirm:\n"
@@ -132,183 +1029,221 @@ def generate_ai_report(
             "2) OPENAI_API_KEY environment variable is set\n"
             "GPT report generation will be skipped this time."
         )
-        return
+        return False
+    return True
 
-    logger.debug("Building data summary...")
-    summary = _build_summary_for_ai(df)
-    summary_json = json.dumps(summary, ensure_ascii=False)
-    logger.debug(f"Data summary size: {len(summary_json)} characters")
-
-    system_prompt = (
-        "You are a senior business analyst in the global automotive industry. "
-        "You are excellent at turning complex quantitative data into concise, executive-ready insights. "
-        "Write in clear, structured, business-oriented English suitable for non-technical senior leaders. "
-        "Format all output as GitHub-Flavored Markdown with appropriate headings, bullet points, and tables."
-    )
-
-    # 定义5个章节及其对应的图表
-    sections_config = [
-        {
-            "name": "Executive Summary",
-            "prompt": f"""
-Below is a JSON summary of BMW 2020–2024 sales data:
 
-{summary_json}
-
-Write an **Executive Summary** section with 3–6 bullet points that capture the overall performance and key messages.
-Include at least one Markdown-formatted table or chart from the JSON data.
-Use the heading "## 1. Executive Summary" and format as Markdown.
-""",
-            "charts": [],  # Executive Summary usually doesn't need additional charts
-            "input_images": []  # No image input needed
-        },
-        {
-            "name": "Sales Performance Over Time",
-            "prompt": f"""
-Below is a JSON summary of BMW 2020–2024 sales data:
+def _plan_report(
+    summary: dict,
+    output_file: str,
+    sections: Optional[Iterable[str]] = None,
+    summary_token_budget: int = DEFAULT_SUMMARY_TOKEN_BUDGET,
+    title: str = REPORT_TITLE,
+    scope: Optional[str] = None,
+    chart_dir: Optional[str] = None,
+) -> dict:
+    """
+    One report ready to be generated: its output file, the selected sections (prompts with their
+    summary documents, chart links relative to the report file, input image paths under
+    `chart_dir`) and the _ReportWriter of the file. Raises ValueError for unknown sections.
+    """
+    summary_json = json.dumps(summary, ensure_ascii=False)
+    full_tokens = count_tokens(summary_json)
+    logger.debug(f"Data summary size: {len(summary_json)} characters, {full_tokens} tokens")
 
-{summary_json}
+    selected = set(sections) if sections is not None else None
+    if selected is not None:
+        unknown = selected - {section["name"] for section in REPORT_SECTIONS}
+        if unknown:
+            raise ValueError(f"Unknown report sections: {sorted(unknown)}")
 
-Write a **Sales Performance Over Time** section that:
-- Describes sales and revenue trends by year and by region
-- Highlights inflection points and years of acceleration/slowdown
-- Includes at least one Markdown-formatted table showing key year-over-year comparisons
+    def chart_path(name: str) -> str:
+        return os.path.join(chart_dir, name) if chart_dir else name
 
-Use the heading "## 2. Sales Performance Over Time" and format as Markdown.
-""",
-            "charts": [
-                ("chart_01_year_volume_yoy.png", "Annual total BMW sales volume and year-over-year (YoY) growth from 2020 to 2024."),
-                ("chart_02_year_revenue_asp.png", "Annual total revenue and weighted average selling price (ASP) from 2020 to 2024."),
-                ("chart_09_year_region_heatmap.png", "Sales volume heatmap by year and region.")
+    report_dir = os.path.dirname(output_file)
+    if report_dir:
+        os.makedirs(report_dir, exist_ok=True)
+    prefix = SECTION_PROMPT_PREFIX + (SLICE_PROMPT_SCOPE.format(scope=scope) if scope else "")
+    sections_config = []
+    for section in REPORT_SECTIONS:
+        if selected is not None and section["name"] not in selected:
+            continue
+        data, tokens, keys = _slice_summary(summary, section["summary_keys"], summary_token_budget)
+        logger.info(
+            f"{section['name']}: summary {full_tokens} -> {tokens} tokens "
+            f"({len(keys)}/{len(section['summary_keys'])} documents, budget {summary_token_budget})"
+        )
+        sections_config.append(dict(
+            section,
+            prompt=f"{prefix}{data}\n\n{section['instructions']}",
+            charts=[
+                (os.path.relpath(chart_path(name), report_dir or ".").replace(os.sep, "/"), description)
+                for name, description in section["charts"]
             ],
-            "input_images": []
-        },
-        {
-            "name": "Top & Underperforming Models / Markets",
-            "prompt": f"""
-Below is a JSON summary of BMW 2020–2024 sales data:
+            input_images=[chart_path(name) for name in section["input_images"]],
+            summary_tokens=tokens,
+            stream_stats={},
+        ))
+    logger.info(
+        f"Summary tokens over {len(sections_config)} sections: {full_tokens * len(sections_config)} -> "
+        f"{sum(section['summary_tokens'] for section in sections_config)}"
+    )
+    return {
+        "output_file": output_file,
+        "sections": sections_config,
+        "writer": _ReportWriter(output_file, f"# {title}\n\n", len(sections_config)),
+    }
 
-{summary_json}
 
-Write a **Top & Underperforming Models / Markets** section that:
-- Names the best and worst performing models/regions
-- Explains plausible reasons based on the data
-- Includes at least one Markdown-formatted table highlighting rankings or performance gaps
+def _section_args(
+    report: dict,
+    request_timeout: float,
+    use_cache: bool,
+    refresh: set,
+    stream: bool,
+    image_max_dimension: int,
+) -> list:
+    # Arguments of _generate_section for every section of a planned report
+    return [
+        (section, SYSTEM_PROMPT, request_timeout, use_cache, section["name"] in refresh, stream, report["writer"], i,
+         image_max_dimension)
+        for i, section in enumerate(report["sections"])
+    ]
 
-Use the heading "## 3. Top & Underperforming Models / Markets" and format as Markdown.
-""",
-            "charts": [
-                ("chart_03_model_top10_volume.png", "Top 10 BMW models ranked by total sales volume over 2020–2024."),
-                ("chart_04_model_top10_revenue.png", "Top 10 BMW models ranked by total revenue over 2020–2024."),
-                ("chart_06_region_volume.png", "Total BMW sales volume by region."),
-                ("chart_07_region_revenue.png", "Total BMW revenue by region.")
-            ],
-            "input_images": []
-        },
-        {
-            "name": "Key Sales Drivers",
-            "prompt": f"""
-Below is a JSON summary of BMW 2020–2024 sales data:
 
-{summary_json}
+def _log_report(report: dict) -> None:
+    streamed = [section for section in report["sections"] if section["stream_stats"]]
+    if streamed:
+        logger.info(f"  {'section':<40} {'TTFB s':>7} {'tokens':>7} {'tokens/s':>9}")
+        for section in streamed:
+            stats = section["stream_stats"]
+            ttfb = f"{stats['ttfb_seconds']:.2f}" if stats["ttfb_seconds"] is not None else "-"
+            rate = f"{stats['tokens_per_second']:.1f}" if stats["tokens_per_second"] is not None else "-"
+            logger.info(f"  {section['name']:<40} {ttfb:>7} {stats['tokens']:>7} {rate:>9}")
+    logger.info(f"AI-generated analysis report successfully saved to: {report['output_file']}")
+    print(f"AI-generated analysis report saved to: {report['output_file']}")
 
-Please also refer to the attached charts showing:
-1. Engine size vs average price relationship
-2. Mileage vs price scatter plot
 
-Write a **Key Sales Drivers** section that:
-- Analyses key drivers such as price positioning, model mix, regional mix, engine size, etc.
-- References the patterns visible in the attached charts (engine size correlation, mileage depreciation)
-- Focuses on business reasoning supported by data (do not claim strict causality)
-- Includes at least one Markdown-formatted table that makes a key driver comparison explicit
+def generate_ai_report(
+    df: pd.DataFrame,
+    output_file: str = "bmw_sales_ai_report.md",
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+    use_cache: bool = True,
+    force_refresh: Optional[Iterable[str]] = None,
+    sections: Optional[Iterable[str]] = None,
+    summary: Optional[dict] = None,
+    summary_token_budget: int = DEFAULT_SUMMARY_TOKEN_BUDGET,
+    stream: bool = DEFAULT_STREAM,
+    image_max_dimension: int = IMAGE_MAX_DIMENSION,
+) -> None:
+    """
+    Call GPT-5 API in segments to generate report, each section called separately, and insert corresponding charts after text.
 
-Use the heading "## 4. Key Sales Drivers" and format as Markdown.
-""",
-            "charts": [
-                ("chart_05_model_weighted_asp.png", "Weighted average selling price (ASP) by model."),
-                ("chart_08_region_weighted_asp.png", "Weighted ASP by region."),
-                ("chart_13_engine_size_vs_price.png", "Average price by engine size."),
-                ("chart_14_mileage_vs_price.png", "Mileage vs price scatter plot.")
-            ],
-            "input_images": [
-                "chart_13_engine_size_vs_price.png",
-                "chart_14_mileage_vs_price.png"
-            ]  # Chapter 4 requires these two charts as visual input
-        },
-        {
-            "name": "Strategic Insights & Recommendations",
-            "prompt": f"""
-Below is a JSON summary of BMW 2020–2024 sales data:
+    `sections` limits the report to the named REPORT_SECTIONS (still in their configured order);
+    `summary` is a summary already built by _build_summary_for_ai for this frame.
+    Each section prompt carries only the summary documents the section declares
+    ("summary_keys"), compacted to `summary_token_budget` tokens (see _slice_summary).
 
-{summary_json}
+    Sections are requested concurrently on a bounded thread pool (at most `max_concurrency`
+    requests in flight, 1 = one after another), each with a `request_timeout` in seconds.
+    The report is always assembled in the configured section order. It is written while the
+    sections arrive: every section completing in order is added to `output_file` right away and,
+    with `stream`, so is the text of the next section as it is generated (see _ReportWriter).
+    Time to first byte and tokens/sec are logged per streamed section.
 
-Write a **Strategic Insights & Recommendations** section that MUST explicitly analyse the following two core insights:
+    Chart images sent as vision input are downscaled to `image_max_dimension` pixels and
+    re-encoded (see _prepare_image); the payload bytes saved are logged per request.
 
-**Core Insight 1 – High-end models' functional depreciation and quasi-fleet behaviour:**
-- Data pattern: extreme price dispersion for similar luxury nameplates across regions and usage profiles.
-- Examples:
-  - 7 Series (2020, North America), automatic, low mileage (~27,000 km): USD 100,015
-  - 7 Series (2020, South America), manual, high mileage (~122,000 km): USD 49,898
-  - i8 (2022, Europe), manual diesel, very high mileage (~196,000 km): USD 55,064
-- Discuss how certain luxury configurations behave like fleet/utility assets with accelerated depreciation.
+    Section text is served from the on-disk response cache (LLM_CACHE_DIR) when model, prompts,
+    summary and input images are unchanged; pass use_cache=False to bypass it, or the names of
+    the sections to regenerate in `force_refresh`.
+    """
+    logger.info("Starting to generate AI report (segmented mode)...")
+    
+    if not _client_ready():
+        return
 
-**Core Insight 2 – The colour premium and emotional demand in M performance models:**
-- Data pattern: M3/M5 appear more frequently in vivid colours vs mainstream models (X1, 3 Series)
-- Examples:
-  - M5 (2022) in red maintains strong appeal even with manual transmission
-  - Grey 3 Series cluster in utilitarian contexts
-- Argue how colour acts as an emotional value driver beyond specs.
+    if summary is None:
+        logger.debug("Building data summary...")
+        summary = _build_summary_for_ai(df)
+    report = _plan_report(summary, output_file, sections, summary_token_budget)
+    sections_config = report["sections"]
 
-Then provide 3–5 specific, actionable business recommendations (e.g. which regions/models/price bands to prioritise).
-Include a Markdown table or structured list.
+    try:
+        refresh = set(force_refresh or [])
+        unknown = refresh - {section["name"] for section in sections_config}
+        if unknown:
+            logger.warning(f"Unknown sections in force_refresh, ignored: {sorted(unknown)}")
+        section_args = _section_args(report, request_timeout, use_cache, refresh, stream, image_max_dimension)
 
-Use the heading "## 5. Strategic Insights & Recommendations" and format as Markdown.
-""",
-            "charts": [
-                ("chart_12_price_distribution.png", "Price distribution showing dispersion across models and configurations.")
-            ],
-            "input_images": []
-        }
-    ]
+        workers = max(1, min(max_concurrency, len(sections_config)))
+        logger.info(f"Generating {len(sections_config)} sections with concurrency {workers}")
+        if workers == 1:
+            for args in section_args:
+                _generate_section(*args)
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-section") as pool:
+                futures = [pool.submit(_generate_section, *args) for args in section_args]
+                # The writer keeps the configured order, whatever order the responses arrive in
+                for future in futures:
+                    future.result()
 
-    # Generate complete report
-    full_report = "# BMW Sales Analysis Report (2020–2024)\n\n"
-    
-    try:
-        for section in sections_config:
-            logger.info(f"Starting to generate section: {section['name']}")
-            
-            # Get images that this section needs as input (if any)
-            input_images = section.get("input_images", [])
-            
-            # Call API to generate section content
-            section_content = _call_api_for_section(
-                system_prompt=system_prompt,
-                user_prompt=section["prompt"],
-                section_name=section["name"],
-                input_images=input_images
-            )
-            
-            # Insert corresponding charts after section content
-            if section["charts"]:
-                section_content = _insert_charts_after_text(
-                    section_content, 
-                    section["charts"]
-                )
-            
-            full_report += section_content + "\n\n"
-            logger.info(f"✓ Section {section['name']} completed and charts inserted")
-
-        # Write to file
-        logger.debug(f"Writing report file: {output_file}")
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(full_report)
-        logger.info(f"AI-generated analysis report successfully saved to: {output_file}")
-        print(f"AI-generated analysis report saved to: {output_file}")
+        _log_report(report)
         
     except Exception as e:
         logger.error(f"Report generation failed: {e}", exc_info=True)
         print(f"Report generation failed: {e}")
 
 
+def generate_ai_reports(
+    reports: Iterable[dict],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+    use_cache: bool = True,
+    summary_token_budget: int = DEFAULT_SUMMARY_TOKEN_BUDGET,
+    stream: bool = DEFAULT_STREAM,
+    image_max_dimension: int = IMAGE_MAX_DIMENSION,
+) -> list:
+    """
+    Generate several reports, e.g. one per data slice (see pipeline.run_batch). Each item of
+    `reports` is a dict with the report's output_file and summary and, optionally, sections,
+    title, scope (named in every prompt, e.g. "Region=Asia") and chart_dir (where its charts are).
+
+    The sections of all reports share one thread pool, so at most `max_concurrency` requests are
+    in flight overall (on top of the shared rate limit of LLMClient). Reports are taken from
+    `reports` one at a time and their sections queued right away, so a generator can prepare the
+    next report (e.g. render its charts) while earlier sections are generated. Each file is
+    written as its sections arrive, like generate_ai_report. Returns the written report files.
+    """
+    logger.info("Starting to generate AI reports (batch mode)...")
+    if not _client_ready():
+        return []
+
+    workers = max(1, max_concurrency)
+    planned = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-section") as pool:
+        futures = []
+        for item in reports:
+            report = _plan_report(
+                item["summary"],
+                item["output_file"],
+                item.get("sections"),
+                summary_token_budget,
+                item.get("title", REPORT_TITLE),
+                item.get("scope"),
+                item.get("chart_dir"),
+            )
+            planned.append(report)
+            section_args = _section_args(report, request_timeout, use_cache, set(), stream, image_max_dimension)
+            futures.extend(pool.submit(_generate_section, *args) for args in section_args)
+            logger.info(
+                f"Queued report {len(planned)} ({len(section_args)} sections, {len(futures)} in total, "
+                f"concurrency {workers}): {report['output_file']}"
+            )
+        for future in futures:
+            future.result()
 
+    for report in planned:
+        _log_report(report)
+    return [report["output_file"] for report in planned]
@@ -1,9 +1,25 @@
+import argparse
+import json
 import logging
 import sys
-from data_loader import load_data
-from analyzer import analyze_basic, analyze_trend, analyze_mix, analyze_revenue
-from visualizer import plot_all_charts
-from llm_client import generate_ai_report
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from paths import CACHE_FILE, CACHE_META_FILE, CUBE_CACHE_FILE, CUBE_CACHE_META_FILE, DATA_FILE, LLM_CACHE_DIR, STATE_FILE
+from profiler import DEFAULT_PROFILE_OUTPUT, disable_profiling, enable_profiling, profile_stage
+
+# Only the standard library, paths and profiler are imported at startup: pandas, matplotlib and
+# the OpenAI SDK are imported by the commands that need them, so `--help`, `status` and a `query`
+# against the cached cube start quickly (see benchmark.py --startup).
+
+# Outputs of `analyze`, in the order of a full run
+ANALYSES = ("basic", "trend", "mix", "revenue", "summary")
+
+# Written to the working directory by the charts and report steps
+REPORT_FILE = "bmw_sales_ai_report.md"
+
+# Written by `batch`: one sub-directory per slice (charts and report) and an index
+BATCH_OUTPUT_DIR = "slice_reports"
 
 
 def setup_logging() -> None:
@@ -18,43 +34,348 @@ def setup_logging() -> None:
     )
 
 
-def main() -> None:
+def parse_args(argv: Optional[list] = None) -> argparse.Namespace:
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="BMW sales data analysis workflow")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record wall/CPU time and peak RSS per stage, chart and LLM section",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Also record tracemalloc peaks per stage (implies --profile, slows the run down)",
+    )
+    parser.add_argument(
+        "--profile-output",
+        default=DEFAULT_PROFILE_OUTPUT,
+        help=f"Output prefix of the JSON/CSV profile (default: {DEFAULT_PROFILE_OUTPUT})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Aggregate the loaded frame over row shards in this many worker processes "
+             "(default: single process)",
+    )
+    parser.add_argument(
+        "--parallel-charts",
+        action="store_true",
+        help="Render the charts in a pool of worker processes (one per CPU)",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        metavar="TARGET",
+        help="Produce only these outputs and what they depend on, e.g. --only trend chart_14 report_4 "
+             "(see --list-targets; default: the full workflow)",
+    )
+    parser.add_argument(
+        "--list-targets",
+        action="store_true",
+        help="List the outputs accepted by --only and exit",
+    )
+    parser.add_argument(
+        "--append",
+        nargs="+",
+        metavar="FILE",
+        help="Incremental mode: fold new data files into the persisted aggregation state and "
+             "run the trend, mix and revenue analyses on the merged state only",
+    )
+    parser.add_argument(
+        "--state",
+        default=str(STATE_FILE),
+        help=f"Aggregation state file used by --append (default: {STATE_FILE.name})",
+    )
+
+    commands = parser.add_subparsers(
+        dest="command",
+        metavar="COMMAND",
+        help="Run one step of the workflow (default: the full workflow)",
+    )
+    commands.add_parser("load", help="Load the workbook, refresh the columnar and cube caches")
+    analyze = commands.add_parser("analyze", help="Print analyses (default: basic trend mix revenue)")
+    analyze.add_argument("analyses", nargs="*", metavar="ANALYSIS", help=f"Any of: {' '.join(ANALYSES)}")
+    charts = commands.add_parser("charts", help="Render charts (default: all)")
+    charts.add_argument("charts", nargs="*", type=int, metavar="N", help="Chart numbers, e.g. 5 14")
+    charts.add_argument("--force", action="store_true", help="Re-render charts whose inputs are unchanged")
+    report = commands.add_parser("report", help="Generate the AI report, with the charts it links (default: all sections)")
+    report.add_argument("sections", nargs="*", type=int, metavar="N", help="Report section numbers, e.g. 2 4")
+    report.add_argument("--force", action="store_true", help="Re-render the linked charts even if their inputs are unchanged")
+    report.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Regenerate the sections instead of serving them from the LLM response cache",
+    )
+    query = commands.add_parser(
+        "query",
+        help="Answer a slice/roll-up from the cached OLAP cube",
+        description="Roll the OLAP cube up to --by after applying the filters, e.g. "
+                    "query --by Year Region -f Model=X5 -f Year=2022..2023",
+    )
+    query.add_argument("--by", nargs="*", default=[], metavar="DIM", help="Dimensions to group by (default: grand total)")
+    query.add_argument(
+        "-f", "--filter",
+        action="append",
+        default=[],
+        metavar="DIM=VALUE",
+        help="Filter: Model=X5, Region=Asia,Europe or Year=2022..2023 (repeatable)",
+    )
+    query.add_argument("--valid-only", action="store_true", help="Only rows with positive Sales_Volume")
+    batch = commands.add_parser(
+        "batch",
+        help="Generate one AI report per data slice plus an index",
+        description="One report (with its charts) per slice in its own directory, e.g. "
+                    "batch --by Region -s \"Model=X5,X6 Year=2023..\". Default: every Region and every Model.",
+    )
+    batch.add_argument("--by", nargs="*", default=None, metavar="DIM", help="One slice per label of each dimension")
+    batch.add_argument(
+        "-s", "--slice",
+        action="append",
+        default=[],
+        metavar="FILTERS",
+        help="One slice from space-separated filters as in query, e.g. \"Region=Asia,Europe Year=2023..\" (repeatable)",
+    )
+    batch.add_argument("--sections", nargs="+", type=int, metavar="N", help="Report section numbers (default: all)")
+    batch.add_argument(
+        "--output-dir",
+        default=BATCH_OUTPUT_DIR,
+        help=f"Directory of the slice directories and index.md (default: {BATCH_OUTPUT_DIR})",
+    )
+    batch.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="LLM requests in flight over all reports (default: llm_client.DEFAULT_MAX_CONCURRENCY)",
+    )
+    commands.add_parser("status", help="Show data, cache, state and output files")
+
+    args = parser.parse_args(argv)
+    if args.command == "analyze":
+        unknown = [name for name in args.analyses if name not in ANALYSES]
+        if unknown:
+            parser.error(f"unknown analysis {unknown[0]!r} (choose from {', '.join(ANALYSES)})")
+    return args
+
+
+def _targets(args: argparse.Namespace) -> Optional[list]:
+    """
+    Pipeline targets of a workflow command (None = the full workflow).
+    """
+    if args.command == "analyze":
+        return args.analyses or ["basic", "trend", "mix", "revenue"]
+    if args.command == "charts":
+        return [f"chart_{n:02d}" for n in args.charts] or ["charts"]
+    if args.command == "report":
+        return [f"report_{n}" for n in args.sections] or ["report"]
+    return args.only
+
+
+def _describe_file(path: Path) -> str:
+    try:
+        stat = path.stat()
+    except OSError:
+        return "missing"
+    modified = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+    return f"{stat.st_size / 1024:,.1f} KiB, modified {modified}"
+
+
+def _read_json(path: Path) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def show_status() -> None:
+    """
+    Print the data file, cache freshness, persisted state and outputs. Only reads file metadata
+    and the JSON sidecars (no pandas), so it is cheap enough to run any time.
+    """
+    try:
+        stat = DATA_FILE.stat()
+    except OSError:
+        stat = None
+
+    def freshness(meta: dict, path: Path) -> str:
+        # Same size and mtime as the workbook; a touched but unchanged workbook is revalidated by
+        # content hash on the next load
+        if not path.exists() or not meta:
+            return "missing"
+        if stat is None:
+            return "present (workbook missing)"
+        if meta.get("size") == stat.st_size and meta.get("mtime_ns") == stat.st_mtime_ns:
+            return "fresh"
+        return "stale"
+
+    cube_meta = _read_json(CUBE_CACHE_META_FILE)
+    llm_entries = list(LLM_CACHE_DIR.glob("*.json")) if LLM_CACHE_DIR.is_dir() else []
+    rows = [
+        ("Data file", f"{DATA_FILE.name}: {_describe_file(DATA_FILE)}"),
+        ("Columnar cache", f"{CACHE_FILE.name}: {freshness(_read_json(CACHE_META_FILE), CACHE_FILE)}"),
+        ("Cube cache", f"{CUBE_CACHE_FILE.name}: {freshness(cube_meta.get('source') or {}, CUBE_CACHE_FILE)}"),
+        ("Aggregation state", f"{STATE_FILE.name}: {_describe_file(STATE_FILE)}"),
+        ("LLM cache", f"{len(llm_entries)} sections, {sum(p.stat().st_size for p in llm_entries) / 1024:,.1f} KiB"),
+        ("AI report", f"{REPORT_FILE}: {_describe_file(Path(REPORT_FILE))}"),
+        ("Charts", f"{len(list(Path('.').glob('chart_*.png')))} chart_*.png files"),
+        ("Slice reports", f"{len(list(Path(BATCH_OUTPUT_DIR).glob('*/report.md')))} in {BATCH_OUTPUT_DIR}/"),
+    ]
+    for name, value in rows:
+        print(f"{name:<18} {value}")
+
+
+def run_query(args: argparse.Namespace) -> None:
+    """
+    Print a cube query. The persisted cube is used while it matches the workbook; otherwise the
+    data is loaded and the cube rebuilt (and persisted for the next query).
+    """
+    from cube import get_cube, load_cube, parse_filters, save_cube
+
+    cube = load_cube(source=DATA_FILE)
+    if cube is None:
+        from data_loader import load_data
+
+        cube = get_cube(load_data())
+        try:
+            save_cube(cube, source=DATA_FILE)
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"Failed to write cube cache: {e}")
+    try:
+        filters = parse_filters(cube, args.filter)
+        table = cube.query(args.by, valid_only=args.valid_only, with_rows=True, **filters)
+    except (KeyError, ValueError) as e:
+        raise SystemExit(f"query: {e.args[0] if e.args else e}")
+    print(table.to_string(index=False))
+
+
+def run_load() -> None:
+    """
+    Load the workbook (refreshing the columnar cache) and persist its OLAP cube.
+    """
+    from cube import get_cube, save_cube
+    from data_loader import load_data
+
+    df = load_data()
+    save_cube(get_cube(df), source=DATA_FILE)
+    print(f"Loaded {len(df):,} rows x {df.shape[1]} columns from {DATA_FILE.name}")
+
+
+def run_batch_reports(args: argparse.Namespace) -> None:
+    """
+    Batch command: one report per slice (see pipeline.run_batch).
+    """
+    from pipeline import _report_sections, run_batch
+
+    sections = None
+    if args.sections:
+        available = _report_sections()
+        unknown = [n for n in args.sections if not 1 <= n <= len(available)]
+        if unknown:
+            raise SystemExit(f"batch: unknown report section {unknown[0]} (choose from 1-{len(available)})")
+        sections = [available[n - 1]["name"] for n in args.sections]
+    try:
+        run_batch(
+            args.output_dir,
+            by=args.by,
+            expressions=args.slice,
+            sections=sections,
+            max_concurrency=args.concurrency,
+            parallel_charts=args.parallel_charts,
+        )
+    except (KeyError, ValueError) as e:
+        raise SystemExit(f"batch: {e.args[0] if e.args else e}")
+
+
+def run_incremental(files: list, state_path: str) -> None:
+    """
+    Incremental workflow: only the new files are read, all results come from the merged state.
+    """
+    from analyzer import analyze_mix, analyze_revenue, analyze_trend
+    from incremental import append_file
+
+    logger = logging.getLogger(__name__)
+    agg = None
+    for i, path in enumerate(files, 1):
+        logger.info(f"Step {i}/{len(files)}: Appending {path} to the aggregation state...")
+        with profile_stage(f"append {path}", "load"):
+            agg = append_file(path, state_path=state_path)
+    if agg is None:
+        logger.warning("Aggregation state is empty, nothing to analyze")
+        return
+
+    with profile_stage("analyze_trend", "analyze"):
+        analyze_trend(agg)
+    with profile_stage("analyze_mix", "analyze"):
+        analyze_mix(agg)
+    with profile_stage("analyze_revenue", "analyze"):
+        analyze_revenue(agg)
+
+
+def main(argv: Optional[list] = None) -> None:
     """
     Orchestrate complete workflow:
     1. Load and clean data
     2. Print basic and structural analysis
     3. Generate all visualization charts
     4. Call LLM to generate Markdown report
+
+    With --profile every stage is timed and the profile is written at the end of the run
+    (also when the run fails). With --append only the given files are read and merged into the
+    persisted aggregation state (see incremental.py), charts and the AI report are skipped.
+    With --workers the shared aggregates are computed over row shards in a process pool
+    (see shards.py) before the analyses; --parallel-charts renders the charts in a process pool.
+    With --only just the given outputs and the shared
+    intermediates they need are produced (see pipeline.py).
+
+    Subcommands run single steps: load, analyze, charts, report, query (from the cached OLAP cube)
+    and status (data, caches, state and outputs); batch writes one report per data slice.
     """
+    args = parse_args(argv)
+    if args.list_targets:
+        from pipeline import list_targets
+
+        for name, description in list_targets():
+            print(f"{name:<12} {description}")
+        return
+    if args.command == "status":
+        show_status()
+        return
+    if args.command == "query":
+        run_query(args)
+        return
     logger = logging.getLogger(__name__)
     logger.info("=" * 50)
     logger.info("Starting BMW sales data analysis workflow")
     logger.info("=" * 50)
+
+    if args.profile or args.profile_memory:
+        enable_profiling(trace_memory=args.profile_memory)
     
     try:
-        logger.info("Step 1/5: Loading data...")
-        df = load_data()
-        logger.info(f"Data loaded successfully, total {len(df)} rows")
+        if args.append:
+            run_incremental(args.append, args.state)
+            logger.info("Incremental analysis completed successfully")
+            return
+        if args.command == "load":
+            with profile_stage("load", "load"):
+                run_load()
+            return
+        if args.command == "batch":
+            run_batch_reports(args)
+            return
 
-        logger.info("Step 2/5: Performing basic analysis...")
-        analyze_basic(df)
-        
-        logger.info("Step 3/5: Performing trend analysis...")
-        analyze_trend(df)
-        
-        logger.info("Step 4/5: Performing structural analysis...")
-        analyze_mix(df)
-        
-        logger.info("Step 5/5: Performing revenue analysis...")
-        analyze_revenue(df)
+        from pipeline import run_pipeline
 
-        logger.info("Generating visualization charts...")
-        plot_all_charts(df)
-        logger.info("Chart generation completed")
+        run_pipeline(
+            _targets(args),
+            workers=args.workers,
+            parallel_charts=args.parallel_charts,
+            force_charts=getattr(args, "force", False),
+            refresh_report=getattr(args, "refresh", False),
+        )
 
-        logger.info("Calling LLM to generate analysis report...")
-        generate_ai_report(df)
-        
         logger.info("=" * 50)
         logger.info("All analysis workflows completed successfully")
         logger.info("=" * 50)
@@ -63,6 +384,15 @@ def main() -> None:
         logger.error(f"Analysis workflow execution failed: {e}", exc_info=True)
         raise
 
+    finally:
+        profiler = disable_profiling()
+        if profiler is not None:
+            profiler.log_summary()
+            try:
+                profiler.write(args.profile_output)
+            except OSError as e:
+                logger.error(f"Failed to write profile: {e}")
+
 
 if __name__ == "__main__":
     setup_logging()
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+# File locations of the data, the caches and the persisted state. This module only uses the
+# standard library, so that lightweight commands (main.py status, --help) can read them without
+# importing pandas, matplotlib or the OpenAI SDK.
+
+# Raw Excel data file path
+DATA_FILE = Path(__file__).with_name("BMW sales data (2020-2024).xlsx")
+
+# Columnar (Arrow IPC / Feather v2) cache of the normalized workbook, kept next to the Excel file.
+# The sidecar JSON records the size/mtime/SHA-256 of the workbook the cache was built from.
+CACHE_FILE = DATA_FILE.with_name(DATA_FILE.stem + ".arrow")
+CACHE_META_FILE = DATA_FILE.with_name(DATA_FILE.stem + ".arrow.json")
+
+# Persisted OLAP cube of the workbook (cube.save_cube / cube.load_cube): the dense arrays, and a
+# sidecar JSON with dimensions, labels and the size/mtime of the workbook it was built from
+CUBE_CACHE_FILE = DATA_FILE.with_name(DATA_FILE.stem + ".cube.npz")
+CUBE_CACHE_META_FILE = DATA_FILE.with_name(DATA_FILE.stem + ".cube.json")
+
+# Persisted aggregation state (cube sums and counts, moments and quantile sketches of the full history)
+STATE_FILE = Path(__file__).with_name("bmw_aggregates.state.json")
+
+# Persistent, content-addressed cache of generated report section text (see llm_client.py)
+LLM_CACHE_DIR = Path(__file__).with_name(".llm_cache")
@@ -0,0 +1,413 @@
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import data_loader
+from aggregations import get_aggregates
+from analyzer import _build_summary_for_ai, analyze_basic, analyze_mix, analyze_revenue, analyze_trend
+from cube import get_cube, save_cube
+from profiler import profile_stage
+from sampling import get_sample
+from shards import seed_sharded
+from slices import aggregate_slices, get_slices, slice_metrics, slice_sample
+
+logger = logging.getLogger(__name__)
+
+# Threads computing the shared intermediates (load, cube scan, co-moments, sample, summary)
+DEFAULT_TASK_THREADS = 4
+
+# Outputs of a full run, in this order
+DEFAULT_TARGETS = ("basic", "trend", "mix", "revenue", "charts", "report")
+
+# Files of a batch run (run_batch): the report in each slice directory, the index in the output directory
+BATCH_REPORT_FILE = "report.md"
+BATCH_INDEX_FILE = "index.md"
+
+
+def _load(run: dict):
+    return data_loader.load_data()
+
+
+def _aggregates(run: dict):
+    df = run["results"]["frame"]
+    if run["workers"] and run["workers"] > 1:
+        logger.info(f"Aggregating over row shards with {run['workers']} workers...")
+        return seed_sharded(df, workers=run["workers"])
+    return get_aggregates(df)
+
+
+def _cubes(run: dict):
+    cube = get_cube(run["results"]["frame"])
+    if run["save_cube"]:
+        # Lets `main.py query` answer from the cube without loading the rows
+        try:
+            save_cube(cube, source=data_loader.DATA_FILE)
+        except OSError as e:
+            logger.warning(f"Failed to write cube cache: {e}")
+    return cube
+
+
+def _comoments(run: dict):
+    agg = run["results"]["aggregates"]
+    return agg.correlation(), agg.correlation(valid_only=True)
+
+
+def _sample(run: dict):
+    return get_sample(run["results"]["frame"])
+
+
+def _ai_summary(run: dict):
+    return _build_summary_for_ai(run["results"]["frame"])
+
+
+def _analyze_basic(run: dict):
+    analyze_basic(run["results"]["frame"])
+
+
+def _analyze_trend(run: dict):
+    analyze_trend(run["results"]["frame"])
+
+
+def _analyze_mix(run: dict):
+    analyze_mix(run["results"]["frame"])
+
+
+def _analyze_revenue(run: dict):
+    analyze_revenue(run["results"]["frame"])
+
+
+def _print_summary(run: dict):
+    print(json.dumps(run["results"]["ai_summary"], ensure_ascii=False, indent=2, default=str))
+
+
+def _charts(run: dict):
+    from visualizer import plot_all_charts
+
+    return plot_all_charts(
+        run["results"]["frame"], parallel=run["parallel_charts"], force=run["force_charts"], charts=run["charts"]
+    )
+
+
+def _report(run: dict):
+    from llm_client import generate_ai_report
+
+    # Refreshed sections are regenerated instead of served from the response cache (and re-cached)
+    refresh = [
+        section["name"] for section in _report_sections()
+        if run["refresh_report"] and (run["sections"] is None or section["name"] in run["sections"])
+    ]
+    return generate_ai_report(
+        run["results"]["frame"], sections=run["sections"], summary=run["results"]["ai_summary"], force_refresh=refresh
+    )
+
+
+def _chart_deps(run: dict) -> tuple:
+    from visualizer import CHART_JOBS
+
+    needs = {need for job in CHART_JOBS if run["charts"] is None or job["number"] in run["charts"] for need in job["needs"]}
+    return tuple(name for name in TASKS if name in needs)
+
+
+def _report_deps(run: dict) -> tuple:
+    return ("ai_summary", "charts") if _report_charts(run["sections"]) else ("ai_summary",)
+
+
+# Task graph in dependency order. Shared intermediates ("output": False) run on a thread pool as
+# soon as their dependencies are done; outputs (printed tables, chart PNGs, the report) run on the
+# calling thread in this order, so that the console output keeps its order. "deps" is a tuple of
+# task names or a function of the run (charts and report depend on the selected charts/sections).
+TASKS = {
+    "frame": {"deps": (), "output": False, "stage": "load", "category": "load",
+              "description": "Loading data", "run": _load},
+    "aggregates": {"deps": ("frame",), "output": False, "stage": "aggregates", "category": "analyze",
+                   "description": "Preparing shared aggregates", "run": _aggregates},
+    "cubes": {"deps": ("aggregates",), "output": False, "stage": "cubes", "category": "analyze",
+              "description": "Scanning base and OLAP cubes", "run": _cubes},
+    "comoments": {"deps": ("cubes",), "output": False, "stage": "comoments", "category": "analyze",
+                  "description": "Collecting co-moments", "run": _comoments},
+    "sample": {"deps": ("cubes",), "output": False, "stage": "sample", "category": "analyze",
+               "description": "Drawing the stratified sample", "run": _sample},
+    "ai_summary": {"deps": ("cubes", "comoments"), "output": False, "stage": "ai_summary", "category": "analyze",
+                   "description": "Building AI report data summary", "run": _ai_summary},
+    "basic": {"deps": ("aggregates",), "output": True, "stage": "analyze_basic", "category": "analyze",
+              "description": "Performing basic analysis", "run": _analyze_basic},
+    "trend": {"deps": ("cubes",), "output": True, "stage": "analyze_trend", "category": "analyze",
+              "description": "Performing trend analysis", "run": _analyze_trend},
+    "mix": {"deps": ("cubes",), "output": True, "stage": "analyze_mix", "category": "analyze",
+            "description": "Performing structural analysis", "run": _analyze_mix},
+    "revenue": {"deps": ("cubes", "comoments"), "output": True, "stage": "analyze_revenue", "category": "analyze",
+                "description": "Performing revenue analysis", "run": _analyze_revenue},
+    "summary": {"deps": ("ai_summary",), "output": True, "stage": "print_summary", "category": "analyze",
+                "description": "Printing AI report data summary", "run": _print_summary},
+    "charts": {"deps": _chart_deps, "output": True, "stage": "plot_all_charts", "category": "charts",
+               "description": "Generating visualization charts", "run": _charts},
+    "report": {"deps": _report_deps, "output": True, "stage": "generate_ai_report", "category": "llm",
+               "description": "Calling LLM to generate analysis report", "run": _report},
+}
+
+
+def _chart_numbers() -> set:
+    # The chart and report modules (matplotlib, the OpenAI SDK) are only imported once a run needs them
+    from visualizer import CHART_JOBS
+
+    return {job["number"] for job in CHART_JOBS}
+
+
+def _report_sections() -> list:
+    from llm_client import REPORT_SECTIONS
+
+    return REPORT_SECTIONS
+
+
+def _report_charts(sections: Optional[set]) -> set:
+    # Chart numbers linked or attached by the selected report sections
+    from llm_client import REPORT_SECTIONS
+    from visualizer import CHART_JOBS
+
+    numbers = {job["file"]: job["number"] for job in CHART_JOBS}
+    files = {
+        name
+        for section in REPORT_SECTIONS
+        if sections is None or section["name"] in sections
+        for name in [f for f, _ in section["charts"]] + list(section["input_images"])
+    }
+    return {numbers[f] for f in files if f in numbers}
+
+
+def list_targets() -> list:
+    """
+    Every target accepted by run_pipeline, with a description.
+    """
+    from llm_client import REPORT_SECTIONS
+    from visualizer import CHART_JOBS
+
+    targets = [(name, task["description"]) for name, task in TASKS.items() if task["output"]]
+    targets += [(f"chart_{job['number']:02d}", f"Chart {job['number']}: {job['description']}") for job in CHART_JOBS]
+    targets += [(f"report_{i}", f"Report section: {section['name']}") for i, section in enumerate(REPORT_SECTIONS, 1)]
+    return targets
+
+
+def plan_run(
+    targets: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None,
+    parallel_charts: bool = False,
+    force_charts: bool = False,
+    refresh_report: bool = False,
+) -> dict:
+    """
+    Resolve the requested targets (see list_targets; default DEFAULT_TARGETS) into a run: the
+    selected charts and report sections (None = all) and the tasks they need, in execution order.
+    `parallel_charts` renders the charts in a process pool (plot_all_charts(parallel=True)),
+    `force_charts` re-renders them even when their inputs are unchanged (force=True), and
+    `refresh_report` regenerates the selected report sections instead of using the LLM cache.
+    Raises ValueError for unknown targets.
+    """
+    outputs = set()
+    charts: Optional[set] = set()
+    sections: Optional[set] = set()
+    for target in targets or DEFAULT_TARGETS:
+        chart = re.fullmatch(r"chart_(\d+)", target)
+        section = re.fullmatch(r"report_(\d+)", target)
+        if chart and int(chart.group(1)) in _chart_numbers():
+            outputs.add("charts")
+            if charts is not None:
+                charts.add(int(chart.group(1)))
+        elif section and 1 <= int(section.group(1)) <= len(_report_sections()):
+            outputs.add("report")
+            if sections is not None:
+                sections.add(_report_sections()[int(section.group(1)) - 1]["name"])
+        elif target in TASKS and TASKS[target]["output"]:
+            outputs.add(target)
+            if target == "charts":
+                charts = None
+            elif target == "report":
+                sections = None
+        else:
+            raise ValueError(f"Unknown target {target!r}, available: {[name for name, _ in list_targets()]}")
+
+    if "report" in outputs:
+        # The report links (and sends) its charts, which must be rendered first
+        needed = _report_charts(sections)
+        if needed:
+            if "charts" not in outputs:
+                outputs.add("charts")
+                charts = needed
+            elif charts is not None:
+                charts |= needed
+
+    run = {
+        "workers": workers,
+        "charts": charts,
+        "sections": sections,
+        "parallel_charts": parallel_charts,
+        "force_charts": force_charts,
+        "refresh_report": refresh_report,
+        "save_cube": True,
+        "results": {},
+        "deps": {},
+    }
+    required = set()
+    pending = list(outputs)
+    while pending:
+        name = pending.pop()
+        if name in required:
+            continue
+        required.add(name)
+        deps = TASKS[name]["deps"]
+        run["deps"][name] = deps(run) if callable(deps) else deps
+        pending.extend(run["deps"][name])
+    run["order"] = [name for name in TASKS if name in required]
+    return run
+
+
+def _run_task(name: str, run: dict, futures: dict):
+    task = TASKS[name]
+    for dep in run["deps"][name]:
+        if dep in futures:
+            futures[dep].result()
+    logger.info(f"{task['description']}...")
+    with profile_stage(task["stage"], task["category"]):
+        result = task["run"](run)
+    run["results"][name] = result
+    return result
+
+
+def run_pipeline(
+    targets: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None,
+    threads: int = DEFAULT_TASK_THREADS,
+    parallel_charts: bool = False,
+    force_charts: bool = False,
+    refresh_report: bool = False,
+) -> dict:
+    """
+    Produce the requested outputs (e.g. ["trend", "chart_14", "report_4"], default DEFAULT_TARGETS)
+    and only the tasks they depend on. Every shared intermediate is computed once; independent
+    ones run concurrently on `threads` threads while the outputs are produced in order.
+    `workers` > 1 aggregates the frame over row shards first (see shards.py); `parallel_charts`
+    renders the charts in a process pool, `force_charts` re-renders unchanged ones and
+    `refresh_report` bypasses the LLM response cache.
+    Returns the results of all tasks that ran, by task name.
+    """
+    run = plan_run(targets, workers, parallel_charts, force_charts, refresh_report)
+    logger.info(f"Running tasks: {', '.join(run['order'])}")
+    futures: dict = {}
+    with ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="pipeline") as pool:
+        try:
+            # Submitted in dependency order: a task only ever waits for tasks dequeued before it
+            for name in run["order"]:
+                if not TASKS[name]["output"]:
+                    futures[name] = pool.submit(_run_task, name, run, futures)
+            for name in run["order"]:
+                if TASKS[name]["output"]:
+                    _run_task(name, run, futures)
+            for future in futures.values():
+                future.result()
+        except BaseException:
+            for future in futures.values():
+                future.cancel()
+            raise
+    return run["results"]
+
+
+def _write_batch_index(output_dir: str, slices: list, partials: dict) -> str:
+    """
+    Markdown index of a batch run: one row per slice with its headline metrics and report link.
+    """
+    lines = [
+        "# BMW Sales Analysis Reports by Slice (2020–2024)",
+        "",
+        "| Slice | Rows | Sales volume | Revenue (USD) | Weighted ASP (USD) | Report |",
+        "|---|---:|---:|---:|---:|---|",
+    ]
+    for s in slices:
+        metrics = slice_metrics(partials[s["name"]])
+        report = f"{s['directory']}/{BATCH_REPORT_FILE}"
+        link = f"[{report}]({report})" if os.path.exists(os.path.join(output_dir, report)) else "not generated"
+        cells = [
+            f"{metrics[name]:,.0f}" if name in metrics else "-"
+            for name in ("Row_Count", "Total_Sales_Volume", "Total_Revenue_USD", "Weighted_ASP_USD")
+        ]
+        lines.append(f"| {s['name']} | {' | '.join(cells)} | {link} |")
+    path = os.path.join(output_dir, BATCH_INDEX_FILE)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def run_batch(
+    output_dir: str,
+    by: Optional[Iterable[str]] = None,
+    expressions: Iterable[str] = (),
+    sections: Optional[Iterable[str]] = None,
+    max_concurrency: Optional[int] = None,
+    parallel_charts: bool = False,
+) -> dict:
+    """
+    One AI report per data slice plus an index (`output_dir`/BATCH_INDEX_FILE). Slices are one per
+    label of each dimension in `by` and one per filter expression (see slices.get_slices, default:
+    every Region and every Model).
+
+    The summaries of all slices come from one aggregation pass over the frame
+    (slices.aggregate_slices). Each slice gets its own directory with the charts its report links
+    and the report (BATCH_REPORT_FILE). The sections of all reports are generated on one pool
+    with at most `max_concurrency` requests in flight overall; the charts of the next slice are
+    rendered while earlier sections are generated (in a process pool with `parallel_charts`).
+    `sections` limits every report to the named sections. Returns the slices, with the report file of each one that was written.
+    """
+    from llm_client import DEFAULT_MAX_CONCURRENCY, REPORT_TITLE, generate_ai_reports
+    from visualizer import plot_all_charts
+
+    with profile_stage("load", "load"):
+        df = data_loader.load_data()
+    slices = get_slices(df, None if by is None else list(by), expressions)
+    if not slices:
+        raise ValueError("No slices to report on")
+    logger.info(f"Batch of {len(slices)} slices: {', '.join(s['name'] for s in slices)}")
+    with profile_stage("aggregate_slices", "analyze"):
+        partials = aggregate_slices(df, slices)
+    with profile_stage("slice_summaries", "analyze"):
+        summaries = {name: _build_summary_for_ai(agg) for name, agg in partials.items()}
+    sections = list(sections) if sections is not None else None
+    charts = _report_charts(set(sections) if sections is not None else None)
+
+    def reports():
+        # Charts of a slice are rendered when its report is taken, i.e. while earlier ones are generated
+        for i, s in enumerate(slices, 1):
+            directory = os.path.join(output_dir, s["directory"])
+            logger.info(f"Slice {i}/{len(slices)} {s['name']}: rendering {len(charts)} charts into {directory}")
+            with profile_stage(f"charts {s['name']}", "charts"):
+                plot_all_charts(
+                    partials[s["name"]],
+                    parallel=parallel_charts,
+                    charts=charts,
+                    output_dir=directory,
+                    sample=slice_sample(df, s["filters"]),
+                    title_suffix=s["name"],
+                )
+            yield {
+                "output_file": os.path.join(directory, BATCH_REPORT_FILE),
+                "summary": summaries[s["name"]],
+                "sections": sections,
+                "title": f"{REPORT_TITLE}: {s['name']}",
+                "scope": s["name"],
+                "chart_dir": directory,
+            }
+
+    pending = reports()
+    with profile_stage("generate_ai_reports", "llm"):
+        written = set(generate_ai_reports(pending, max_concurrency=max_concurrency or DEFAULT_MAX_CONCURRENCY))
+    # Without an LLM client no report was taken: the charts are still rendered
+    for _ in pending:
+        pass
+
+    for s in slices:
+        report = os.path.join(output_dir, s["directory"], BATCH_REPORT_FILE)
+        s["report"] = report if report in written else None
+    index = _write_batch_index(output_dir, slices, partials)
+    logger.info(f"Batch index with {len(slices)} slices written to: {index}")
+    print(f"Batch index saved to: {index}")
+    return {"slices": slices, "index": index}
@@ -0,0 +1,229 @@
+import csv
+import functools
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+try:
+    # Not available on Windows; peak RSS is then reported as empty
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Columns of the machine-readable profile (JSON "stages" records and CSV rows)
+PROFILE_FIELDS = (
+    "stage",
+    "category",
+    "status",
+    "wall_seconds",
+    "cpu_seconds",
+    "peak_rss_mb",
+    "rss_growth_mb",
+    "tracemalloc_peak_mb",
+    "pid",
+)
+
+# Default output prefix: <prefix>.json and <prefix>.csv
+DEFAULT_PROFILE_OUTPUT = "bmw_profile"
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """
+    Peak resident set size of this process so far (high-water mark), in MB.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+
+def _cpu_time() -> float:
+    """
+    CPU time of the current thread. Process-wide CPU time would let a stage on the main thread
+    count the pool threads running next to it (e.g. concurrent LLM sections), and stages in
+    worker threads count each other; work a stage hands to other threads or processes is not
+    included.
+    """
+    return time.thread_time()
+
+
+def _start_sample() -> dict:
+    sample = {
+        "wall": time.perf_counter(),
+        "cpu": _cpu_time(),
+        "rss": _peak_rss_mb(),
+        "traced": None,
+    }
+    if tracemalloc.is_tracing():
+        sample["traced"] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    return sample
+
+
+def _finish_sample(start: dict) -> dict:
+    rss = _peak_rss_mb()
+    traced_peak = None
+    if start["traced"] is not None and tracemalloc.is_tracing():
+        traced_peak = max(0, tracemalloc.get_traced_memory()[1] - start["traced"]) / 1e6
+    return {
+        "wall_seconds": round(time.perf_counter() - start["wall"], 4),
+        "cpu_seconds": round(_cpu_time() - start["cpu"], 4),
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        "rss_growth_mb": round(rss - start["rss"], 1) if rss is not None else None,
+        "tracemalloc_peak_mb": round(traced_peak, 3) if traced_peak is not None else None,
+        "pid": os.getpid(),
+    }
+
+
+@contextmanager
+def measure():
+    """
+    Measure the enclosed block regardless of whether profiling is enabled; the yielded dict is
+    filled with wall/CPU time and memory figures on exit. Used where the measurement has to be
+    shipped back from another process (chart rendering in a process pool).
+    """
+    metrics: dict = {}
+    start = _start_sample()
+    try:
+        yield metrics
+    finally:
+        metrics.update(_finish_sample(start))
+
+
+class Profiler:
+    """
+    Collects one record per pipeline stage (load, each analyze_* function, each chart, each
+    LLM section) and writes them as JSON/CSV plus a summary table at the end of the run.
+
+    tracemalloc figures (peak Python allocations during a stage, relative to its start) are only
+    collected with trace_memory=True because tracing slows allocation-heavy code down noticeably.
+    tracemalloc's peak is process-wide: for stages running concurrently in threads it covers all
+    of them, and an enclosing stage only sees allocations after its last nested stage started.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.records: list = []
+        self._lock = threading.Lock()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def record(self, stage: str, category: str, status: str, metrics: dict) -> None:
+        record = {"stage": stage, "category": category, "status": status}
+        record.update({field: metrics.get(field) for field in PROFILE_FIELDS[3:]})
+        with self._lock:
+            self.records.append(record)
+        logger.debug(f"Profiled {stage}: {record['wall_seconds']}s wall, {record['cpu_seconds']}s CPU")
+
+    def log_summary(self) -> None:
+        logger.info("Profile summary:")
+        logger.info(f"  {'stage':<44} {'status':<8} {'wall s':>9} {'cpu s':>9} {'peak RSS MB':>12} {'traced MB':>10}")
+        for r in self.records:
+            rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] is not None else "-"
+            traced = f"{r['tracemalloc_peak_mb']:.3f}" if r["tracemalloc_peak_mb"] is not None else "-"
+            logger.info(
+                f"  {r['stage']:<44} {r['status']:<8} {r['wall_seconds']:9.3f} {r['cpu_seconds']:9.3f} "
+                f"{rss:>12} {traced:>10}"
+            )
+
+    def write(self, output_prefix: str = DEFAULT_PROFILE_OUTPUT) -> tuple:
+        """
+        Write <output_prefix>.json (run metadata + stage records) and <output_prefix>.csv.
+        Returns the two paths.
+        """
+        json_path = f"{output_prefix}.json"
+        csv_path = f"{output_prefix}.csv"
+        profile = {
+            "started_at": self.started_at,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "argv": sys.argv,
+            "trace_memory": self.trace_memory,
+            "stages": self.records,
+        }
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, ensure_ascii=False, indent=2)
+        with open(csv_path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=PROFILE_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records)
+        logger.info(f"Profile written to: {json_path}, {csv_path}")
+        return json_path, csv_path
+
+
+# Profiler of the current run, None while profiling is disabled
+_ACTIVE_PROFILER: Optional[Profiler] = None
+
+
+def enable_profiling(trace_memory: bool = False) -> Profiler:
+    global _ACTIVE_PROFILER
+    _ACTIVE_PROFILER = Profiler(trace_memory=trace_memory)
+    return _ACTIVE_PROFILER
+
+
+def disable_profiling() -> Optional[Profiler]:
+    """
+    Stop profiling and return the profiler that was active (if any).
+    """
+    global _ACTIVE_PROFILER
+    profiler, _ACTIVE_PROFILER = _ACTIVE_PROFILER, None
+    if profiler is not None and profiler.trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return profiler
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _ACTIVE_PROFILER
+
+
+class profile_stage:
+    """
+    Record a pipeline stage in the active profiler; does nothing when profiling is disabled.
+
+        with profile_stage("load", "load"):
+            df = load_data()
+
+        @profile_stage("analyze_trend", "analyze")
+        def analyze_trend(df): ...
+
+    A stage that raises is recorded with status "error" and the exception propagates.
+    """
+
+    def __init__(self, stage: str, category: str = "stage"):
+        self.stage = stage
+        self.category = category
+        self._profiler: Optional[Profiler] = None
+        self._start: Optional[dict] = None
+
+    def __enter__(self) -> "profile_stage":
+        self._profiler = _ACTIVE_PROFILER
+        if self._profiler is not None:
+            self._start = _start_sample()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self._profiler is not None:
+            status = "error" if exc_type is not None else "ok"
+            self._profiler.record(self.stage, self.category, status, _finish_sample(self._start))
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # A fresh instance per call, so that recursive / concurrent calls do not share state
+            with profile_stage(self.stage, self.category):
+                return func(*args, **kwargs)
+
+        return wrapper
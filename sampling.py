@@ -0,0 +1,306 @@
+import logging
+import math
+import threading
+import weakref
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from aggregations import CUBE_BLOCK_ROWS
+from cube import get_cube
+
+logger = logging.getLogger(__name__)
+
+# Rows in the shared sample of a frame (chart 14, price/mileage correlation)
+SAMPLE_SIZE = 5000
+SAMPLE_SEED = 42
+
+# Strata of the shared sample; every stratum gets at least SAMPLE_MIN_PER_STRATUM rows (or all of
+# its rows if it has fewer), the rest of the sample is allocated proportionally to stratum size
+SAMPLE_STRATA = ("Model", "Region")
+SAMPLE_MIN_PER_STRATUM = 25
+
+# z value of the two-sided 95% confidence intervals
+Z_95 = 1.959963984540054
+
+
+def allocate_quotas(counts: dict, size: int, min_per_stratum: int = SAMPLE_MIN_PER_STRATUM) -> dict:
+    """
+    Per-stratum sample sizes summing to min(size, total rows): each stratum first gets
+    min(count, min_per_stratum) rows, the remainder is split proportionally to the stratum sizes
+    (largest remainders first) without exceeding any stratum's row count.
+    """
+    quotas = {label: min(count, min_per_stratum) for label, count in counts.items()}
+    remaining = min(size, sum(counts.values())) - sum(quotas.values())
+    while remaining > 0:
+        room = {label: counts[label] - quotas[label] for label in counts if counts[label] > quotas[label]}
+        total_room = sum(room.values())
+        if not room:
+            break
+        shares = {label: remaining * r / total_room for label, r in room.items()}
+        granted = 0
+        for label, share in shares.items():
+            extra = min(int(share), room[label])
+            quotas[label] += extra
+            granted += extra
+        if granted == 0:
+            # Hand out the last few rows one by one, largest fractional share first
+            for label in sorted(shares, key=lambda l: shares[l] - int(shares[l]), reverse=True)[:remaining]:
+                quotas[label] += 1
+                granted += 1
+        remaining -= granted
+    return quotas
+
+
+def _top_by_group(codes: np.ndarray, keys: np.ndarray, capacities: np.ndarray) -> np.ndarray:
+    """
+    Positions of the rows with the largest keys, at most capacities[code] per group, in row order.
+    """
+    order = np.lexsort((-keys, codes))
+    sorted_codes = codes[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_codes, sorted_codes, side="left")
+    keep = (rank < capacities[sorted_codes]) & np.isfinite(keys[order])
+    return np.sort(order[keep])
+
+
+class Reservoir:
+    """
+    Mergeable (stratified, optionally weighted) reservoir sample of a stream of row chunks.
+
+    Every row gets a random key log(u) / w (Efraimidis-Spirakis A-Res; w = 1 for uniform sampling,
+    the value of the `weight` column for weighted sampling, rows with w <= 0 are never drawn) and
+    the rows with the largest keys are kept: `capacity` rows overall, or per stratum of the `by`
+    columns (`quotas` gives per-stratum sizes, strata missing from it get `capacity`). Each chunk is
+    reduced to its candidates with NumPy before any row is copied, so memory stays bounded by the
+    sample size. Two reservoirs with the same settings (different seeds) merge into the reservoir
+    of their combined rows.
+
+    frame() adds a Sample_Weight column, the number of population rows each sampled row stands
+    for (stratum rows / stratum sample rows; for weighted sampling scaled by 1 / w), which makes
+    estimates from stratified and weighted samples comparable with the full frame.
+    """
+
+    def __init__(
+        self,
+        capacity: int = SAMPLE_SIZE,
+        by: Optional[Sequence[str]] = None,
+        quotas: Optional[dict] = None,
+        weight: Optional[str] = None,
+        seed: Optional[int] = SAMPLE_SEED,
+    ):
+        self.capacity = capacity
+        self.by = list(by) if by else []
+        self.quotas = quotas or {}
+        self.weight = weight
+        self._rng = np.random.default_rng(seed)
+        self.rows: Optional[pd.DataFrame] = None
+        # Rows (and sum of weights) seen per stratum
+        self.seen: dict = {}
+        self.seen_weight: dict = {}
+        # Smallest key kept per full stratum: lower keys can never enter the reservoir
+        self._thresholds: dict = {}
+
+    def _strata(self, frame: pd.DataFrame) -> tuple:
+        """
+        Stratum code of every row and the stratum labels (tuples of `by` values) of the codes.
+        """
+        if not self.by:
+            return np.zeros(len(frame), dtype="int64"), [()]
+        codes = []
+        uniques = []
+        for column in self.by:
+            column_codes, column_uniques = pd.factorize(frame[column], use_na_sentinel=False)
+            codes.append(column_codes)
+            uniques.append(column_uniques)
+        shape = tuple(max(len(u), 1) for u in uniques)
+        strata, flat_labels = pd.factorize(np.ravel_multi_index(codes, shape))
+        positions = np.unravel_index(flat_labels, shape)
+        labels = list(zip(*[list(u.take(p)) for u, p in zip(uniques, positions)]))
+        return strata.astype("int64"), labels
+
+    def _capacities(self, labels: list) -> np.ndarray:
+        return np.array([self.quotas.get(label, self.capacity) for label in labels], dtype="int64")
+
+    def add(self, chunk: pd.DataFrame) -> "Reservoir":
+        """
+        Offer the rows of one chunk to the reservoir. Returns self.
+        """
+        if len(chunk) == 0:
+            return self
+        codes, labels = self._strata(chunk)
+        weights = (
+            chunk[self.weight].to_numpy(dtype="float64") if self.weight else np.ones(len(chunk))
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            keys = np.log(self._rng.random(len(chunk))) / weights
+        keys[~(weights > 0)] = -np.inf
+
+        seen = np.bincount(codes, minlength=len(labels))
+        seen_weight = np.bincount(codes, weights=np.where(weights > 0, weights, 0), minlength=len(labels))
+        for i, label in enumerate(labels):
+            self.seen[label] = self.seen.get(label, 0) + int(seen[i])
+            self.seen_weight[label] = self.seen_weight.get(label, 0.0) + float(seen_weight[i])
+
+        if self._thresholds:
+            thresholds = np.array([self._thresholds.get(label, -np.inf) for label in labels])
+            candidates = np.flatnonzero(keys > thresholds[codes])
+        else:
+            candidates = np.arange(len(chunk))
+        positions = candidates[_top_by_group(codes[candidates], keys[candidates], self._capacities(labels))]
+        if len(positions):
+            self._keep(chunk.take(positions).assign(_key=keys[positions]))
+        return self
+
+    def _keep(self, candidates: pd.DataFrame) -> None:
+        rows = candidates if self.rows is None else pd.concat([self.rows, candidates])
+        codes, labels = self._strata(rows)
+        capacities = self._capacities(labels)
+        keys = rows["_key"].to_numpy()
+        kept = _top_by_group(codes, keys, capacities)
+        self.rows = rows.take(kept)
+
+        counts = np.bincount(codes[kept], minlength=len(labels))
+        lowest = np.full(len(labels), np.inf)
+        np.minimum.at(lowest, codes[kept], keys[kept])
+        self._thresholds = {label: lowest[i] for i, label in enumerate(labels) if counts[i] >= capacities[i]}
+
+    def merge(self, other: "Reservoir") -> "Reservoir":
+        """
+        Reservoir of the rows seen by both (e.g. of two shards). Returns self.
+        """
+        for label, count in other.seen.items():
+            self.seen[label] = self.seen.get(label, 0) + count
+        for label, total in other.seen_weight.items():
+            self.seen_weight[label] = self.seen_weight.get(label, 0.0) + total
+        if other.rows is not None:
+            self._keep(other.rows)
+        return self
+
+    def frame(self) -> pd.DataFrame:
+        """
+        The sampled rows in their original order, with a Sample_Weight column.
+        """
+        if self.rows is None:
+            return pd.DataFrame(columns=["Sample_Weight"])
+        rows = self.rows.sort_index(kind="stable")
+        codes, labels = self._strata(rows)
+        kept = np.bincount(codes, minlength=len(labels))
+        if self.weight:
+            # Inclusion probability ~ w × kept / stratum weight (exact for small sampling fractions)
+            totals = np.array([self.seen_weight[label] for label in labels])
+            sample_weight = totals[codes] / kept[codes] / rows[self.weight].to_numpy(dtype="float64")
+        else:
+            totals = np.array([self.seen[label] for label in labels], dtype="float64")
+            sample_weight = totals[codes] / kept[codes]
+        return rows.drop(columns="_key").assign(Sample_Weight=sample_weight)
+
+
+def reservoir_sample(
+    chunks: Iterable[pd.DataFrame],
+    size: int = SAMPLE_SIZE,
+    by: Optional[Sequence[str]] = None,
+    weight: Optional[str] = None,
+    seed: Optional[int] = SAMPLE_SEED,
+) -> pd.DataFrame:
+    """
+    Sample of a stream of chunks (e.g. data_loader.iter_data_chunks) in one pass: `size` rows
+    overall, or per stratum when `by` is given; weighted by the `weight` column if given.
+    """
+    reservoir = Reservoir(size, by=by, weight=weight, seed=seed)
+    for chunk in chunks:
+        reservoir.add(chunk)
+    return reservoir.frame()
+
+
+def sample_frame(
+    df: pd.DataFrame,
+    size: int = SAMPLE_SIZE,
+    by: Optional[Sequence[str]] = SAMPLE_STRATA,
+    weight: Optional[str] = None,
+    min_per_stratum: int = SAMPLE_MIN_PER_STRATUM,
+    seed: Optional[int] = SAMPLE_SEED,
+) -> pd.DataFrame:
+    """
+    Stratified sample of a loaded frame in one blockwise pass: per-stratum quotas from
+    allocate_quotas (stratum sizes are read from the OLAP cube when it covers `by`), then a
+    Reservoir over the blocks of the frame. Only the sampled rows are copied.
+    """
+    by = [d for d in (by or []) if d in df.columns]
+    quotas = None
+    if by:
+        cube = get_cube(df)
+        if set(by).issubset(cube.dimensions):
+            table = cube.query(by=by, with_rows=True, dropna=False)
+            counts = {tuple(row[:-1]): int(row[-1]) for row in table[by + ["Row_Count"]].itertuples(index=False)}
+        else:
+            counts = {
+                (label if isinstance(label, tuple) else (label,)): int(count)
+                for label, count in df.groupby(by, observed=True).size().items()
+            }
+        quotas = allocate_quotas(counts, size, min_per_stratum)
+
+    reservoir = Reservoir(size, by=by, quotas=quotas, weight=weight, seed=seed)
+    for start in range(0, len(df), CUBE_BLOCK_ROWS):
+        reservoir.add(df.iloc[start:start + CUBE_BLOCK_ROWS])
+    sample = reservoir.frame()
+    logger.debug(f"Sampled {len(sample)} of {len(df)} rows ({len(quotas or {}) or 1} strata, weight={weight})")
+    return sample
+
+
+def _weighted_moments(x: np.ndarray, y: np.ndarray, w: np.ndarray) -> tuple:
+    total = w.sum()
+    mx, my = (w * x).sum() / total, (w * y).sum() / total
+    dx, dy = x - mx, y - my
+    return (w * dx * dy).sum(), (w * dx * dx).sum(), (w * dy * dy).sum()
+
+
+def sample_correlation(sample: pd.DataFrame, x: str, y: str) -> dict:
+    """
+    Pearson correlation of two columns estimated from a sample (weighted by Sample_Weight if
+    present), with a 95% confidence interval from the Fisher z-transform. The interval uses
+    Kish's effective sample size, which accounts for the unequal weights of stratified and
+    weighted samples.
+    """
+    data = sample[[x, y] + (["Sample_Weight"] if "Sample_Weight" in sample else [])].dropna()
+    n = len(data)
+    result = {"r": None, "ci95_low": None, "ci95_high": None, "n": n, "n_effective": None}
+    if n < 2:
+        return result
+
+    w = data["Sample_Weight"].to_numpy(dtype="float64") if "Sample_Weight" in data else np.ones(n)
+    sxy, sxx, syy = _weighted_moments(
+        data[x].to_numpy(dtype="float64"), data[y].to_numpy(dtype="float64"), w
+    )
+    if sxx <= 0 or syy <= 0:
+        return result
+    r = float(np.clip(sxy / math.sqrt(sxx * syy), -1.0, 1.0))
+    n_effective = float(w.sum() ** 2 / (w ** 2).sum())
+    result.update(r=r, n_effective=round(n_effective, 1))
+    if n_effective > 3 and abs(r) < 1:
+        z = math.atanh(r)
+        half_width = Z_95 / math.sqrt(n_effective - 3)
+        result.update(ci95_low=math.tanh(z - half_width), ci95_high=math.tanh(z + half_width))
+    return result
+
+
+# Shared samples memoized per frame object for the lifetime of that frame
+_SAMPLES_BY_FRAME: dict[int, tuple] = {}
+_SAMPLES_LOCK = threading.Lock()
+
+
+def get_sample(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return the shared stratified sample of a frame (SAMPLE_SIZE rows over SAMPLE_STRATA),
+    building it on first use. Callers must not modify it.
+    """
+    key = id(df)
+    with _SAMPLES_LOCK:
+        entry: Optional[tuple] = _SAMPLES_BY_FRAME.get(key)
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+
+        sample = sample_frame(df)
+        _SAMPLES_BY_FRAME[key] = (weakref.ref(df), sample)
+        weakref.finalize(df, _SAMPLES_BY_FRAME.pop, key, None)
+    return sample
@@ -0,0 +1,209 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from aggregations import EXACT_QUANTILE_MAX_ROWS, SalesAggregates, get_aggregates
+from data_loader import DEFAULT_CHUNK_ROWS, iter_data_chunks
+
+logger = logging.getLogger(__name__)
+
+# Shards smaller than this are not worth a process hand-off; small frames run in-process
+MIN_SHARD_ROWS = 100_000
+
+
+def _create_block(array: np.ndarray) -> SharedMemory:
+    block = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block
+
+
+def _attach_block(name: str) -> SharedMemory:
+    """
+    Attach to a block created by the parent process, which owns (and unlinks) it. Pool workers
+    share the parent's resource tracker, so before Python 3.13 (no track argument) the block
+    is simply registered a second time.
+    """
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        return SharedMemory(name=name)
+
+
+def share_frame(df: pd.DataFrame) -> tuple:
+    """
+    Copy the columns of `df` into shared memory blocks once. Returns (blocks, spec): the parent
+    keeps the blocks (and must release them with release_blocks), the small spec is what workers
+    receive instead of the pickled rows. Categorical columns travel as their codes; other
+    non-numeric columns are turned into categoricals first.
+    """
+    blocks = []
+    spec = {"rows": len(df), "columns": []}
+    try:
+        for name in df.columns:
+            series = df[name]
+            if not isinstance(series.dtype, pd.CategoricalDtype) and not (
+                pd.api.types.is_numeric_dtype(series.dtype) and isinstance(series.dtype, np.dtype)
+            ):
+                series = series.astype("category")
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                array = series.cat.codes.to_numpy()
+                categorical = series.dtype
+            else:
+                array = series.to_numpy()
+                categorical = None
+            block = _create_block(array)
+            blocks.append(block)
+            spec["columns"].append((name, block.name, array.dtype.str, categorical))
+    except BaseException:
+        release_blocks(blocks)
+        raise
+    return blocks, spec
+
+
+def release_blocks(blocks: Iterable[SharedMemory]) -> None:
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+def _detach_shard(shard: pd.DataFrame, labels: Optional[dict], with_sketches: bool) -> SalesAggregates:
+    # SalesAggregates only holds a weak reference: `shard` keeps the rows alive until detached
+    return SalesAggregates(shard, labels=labels).detach(with_sketches)
+
+
+def _aggregate_shard(spec: dict, start: int, stop: int, labels: Optional[dict], with_sketches: bool) -> SalesAggregates:
+    """
+    Worker: view rows [start, stop) of a shared frame without copying them and return the
+    detached partial aggregates of that shard.
+    """
+    blocks = [_attach_block(block_name) for _, block_name, _, _ in spec["columns"]]
+    try:
+        columns = {}
+        for (name, _, dtype, categorical), block in zip(spec["columns"], blocks):
+            array = np.ndarray((spec["rows"],), dtype=dtype, buffer=block.buf)[start:stop]
+            if categorical is not None:
+                columns[name] = pd.Categorical.from_codes(array, dtype=categorical)
+            else:
+                columns[name] = array
+        shard = pd.DataFrame(columns, index=pd.RangeIndex(start, stop), copy=False)
+        partial = _detach_shard(shard, labels, with_sketches)
+        # Views into the blocks must be gone before they can be closed
+        del shard, columns, array
+        return partial
+    finally:
+        for block in blocks:
+            block.close()
+
+
+def _shard_bounds(rows: int, shards: int) -> list:
+    edges = np.linspace(0, rows, shards + 1).astype("int64")
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:])]
+
+
+def _merge_partials(partials: list) -> SalesAggregates:
+    result = partials[0]
+    for partial in partials[1:]:
+        result = result.merge(partial)
+    return result
+
+
+def aggregate_sharded(
+    df: pd.DataFrame,
+    workers: Optional[int] = None,
+    shards: Optional[int] = None,
+    with_sketches: bool = False,
+) -> SalesAggregates:
+    """
+    Partial aggregates of `df` computed over row shards in a process pool, merged in shard order.
+
+    The frame is copied into shared memory once and every worker only receives the block names
+    and its row range. Each shard builds its dense kernel cubes with the labels of the whole frame,
+    so the cubes merge by addition; the long base cubes, row counts, min/max and mean/variance
+    (Moments, Chan's pairwise update) merge exactly as well. Sketches are only needed for
+    frame-less describe() quartiles and are skipped unless with_sketches=True.
+
+    Returns a frame-less SalesAggregates; pass it to get_aggregates(df).seed(...) to serve the
+    analyses of `df` from it (see seed_sharded).
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers
+    shards = max(1, min(shards, len(df) // MIN_SHARD_ROWS))
+    labels = get_aggregates(df).labels()
+
+    if shards == 1 or workers == 1:
+        logger.info(f"Aggregating {len(df)} rows in-process ({shards} shard(s), {workers} worker(s))")
+        return _merge_partials([
+            _detach_shard(df.iloc[start:stop], labels, with_sketches)
+            for start, stop in _shard_bounds(len(df), shards)
+        ])
+
+    logger.info(f"Aggregating {len(df)} rows in {shards} shards with {workers} workers")
+    blocks, spec = share_frame(df)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_aggregate_shard, spec, start, stop, labels, with_sketches)
+                for start, stop in _shard_bounds(len(df), shards)
+            ]
+            partials = [future.result() for future in futures]
+    finally:
+        release_blocks(blocks)
+    return _merge_partials(partials)
+
+
+def seed_sharded(df: pd.DataFrame, workers: Optional[int] = None) -> SalesAggregates:
+    """
+    Compute the shared aggregates of `df` over row shards and seed them into get_aggregates(df),
+    so that every later analysis, chart and summary of this frame uses the merged results.
+    Frames whose quantiles come from sketches (above EXACT_QUANTILE_MAX_ROWS) get them sharded too.
+    """
+    agg = get_aggregates(df)
+    with_sketches = len(df) > EXACT_QUANTILE_MAX_ROWS
+    return agg.seed(aggregate_sharded(df, workers=workers, with_sketches=with_sketches))
+
+
+def aggregate_file_sharded(
+    path: Path,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_ROWS,
+) -> SalesAggregates:
+    """
+    Frame-less aggregates of a data file: chunks are read (and cast to the schema) in this process
+    and aggregated in a process pool, each handed over through shared memory. At most two chunks
+    per worker are in flight, so memory stays bounded by chunk_size.
+    """
+    workers = workers or os.cpu_count() or 1
+    partials = []
+    pending = []
+
+    def collect(limit: int) -> None:
+        while len(pending) > limit:
+            blocks, future = pending.pop(0)
+            try:
+                partials.append(future.result())
+            finally:
+                release_blocks(blocks)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            for chunk in iter_data_chunks(path, chunk_size):
+                blocks, spec = share_frame(chunk)
+                pending.append((blocks, pool.submit(_aggregate_shard, spec, 0, len(chunk), None, True)))
+                collect(2 * workers)
+            collect(0)
+        finally:
+            for blocks, future in pending:
+                future.cancel()
+                release_blocks(blocks)
+
+    if not partials:
+        raise ValueError(f"No rows to aggregate in {path}")
+    result = _merge_partials(partials)
+    logger.info(f"Aggregated {result.row_count()} rows from {len(partials)} chunk(s) with {workers} workers")
+    return result
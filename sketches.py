@@ -0,0 +1,272 @@
+import logging
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Default relative accuracy of QuantileSketch: every quantile is within ±1% of the exact value
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Distinct values counted exactly before a sketch relies on its buckets alone (years, engine sizes
+# and other low-cardinality columns then get exact quantiles and histograms)
+MAX_EXACT_VALUES = 1024
+
+
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch with a relative error bound (DDSketch-style).
+
+    Values are counted in logarithmic buckets: bucket i covers (gamma^(i-1), gamma^i] with
+    gamma = (1 + a) / (1 - a), so any reported quantile is within a relative error `a` of the
+    exact one. Memory depends only on the value range (e.g. ~70 buckets for prices between 30k
+    and 120k at 1%), never on the number of rows. Two sketches with the same accuracy merge
+    exactly by adding bucket counts, which is what makes them usable for chunked, sharded and
+    incremental runs. Negative values are kept in a mirrored set of buckets, zeros separately.
+
+    As long as no more than MAX_EXACT_VALUES distinct values were seen, their exact counts are
+    kept as well and quantiles/histograms are exact (e.g. Year, where all values would share one
+    bucket).
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be in (0, 1), got {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: dict = {}
+        self.negative: dict = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.nan
+        self.max = math.nan
+        self.exact: Optional[dict] = {}
+
+    def _bucket_index(self, magnitudes: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(magnitudes) / self._log_gamma).astype("int64")
+
+    def _add_buckets(self, store: dict, magnitudes: np.ndarray) -> None:
+        if len(magnitudes) == 0:
+            return
+        index = self._bucket_index(magnitudes)
+        low = int(index.min())
+        counts = np.bincount(index - low)
+        for offset in np.flatnonzero(counts):
+            key = low + int(offset)
+            store[key] = store.get(key, 0) + int(counts[offset])
+
+    def _add_exact(self, counts: Optional[dict]) -> None:
+        if self.exact is None or counts is None:
+            self.exact = None
+            return
+        for value, count in counts.items():
+            self.exact[value] = self.exact.get(value, 0) + count
+        if len(self.exact) > MAX_EXACT_VALUES:
+            self.exact = None
+
+    def add(self, values) -> "QuantileSketch":
+        """
+        Add an array of values (NaN are ignored). Returns self.
+        """
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        if self.exact is not None:
+            distinct, counts = np.unique(values, return_counts=True)
+            self._add_exact(dict(zip(distinct.tolist(), counts.tolist())))
+        self._add_buckets(self.positive, values[values > 0])
+        self._add_buckets(self.negative, -values[values < 0])
+        self.zero_count += int((values == 0).sum())
+        self.count += len(values)
+        low, high = float(values.min()), float(values.max())
+        self.min = low if math.isnan(self.min) else min(self.min, low)
+        self.max = high if math.isnan(self.max) else max(self.max, high)
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """
+        New sketch holding the values of both (accuracies must match).
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(
+                f"Cannot merge sketches with different accuracy: {self.relative_accuracy} vs {other.relative_accuracy}"
+            )
+        merged = QuantileSketch(self.relative_accuracy)
+        for name in ("positive", "negative"):
+            store = dict(getattr(self, name))
+            for key, count in getattr(other, name).items():
+                store[key] = store.get(key, 0) + count
+            setattr(merged, name, store)
+        merged.exact = dict(self.exact) if self.exact is not None else None
+        merged._add_exact(other.exact)
+        merged.zero_count = self.zero_count + other.zero_count
+        merged.count = self.count + other.count
+        merged.min = np.nanmin([self.min, other.min]) if merged.count else math.nan
+        merged.max = np.nanmax([self.max, other.max]) if merged.count else math.nan
+        return merged
+
+    def _bucket_value(self, index: int) -> float:
+        # Midpoint (in relative terms) of bucket `index`, within relative_accuracy of any value in it
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantiles(self, qs) -> list:
+        """
+        Approximate quantiles (q in [0, 1]) with rank q × (count - 1), as in pandas' describe().
+        """
+        if self.count == 0:
+            return [math.nan for _ in qs]
+        if self.exact is not None:
+            return self._exact_quantiles(qs)
+        # Buckets in ascending value order: negatives (largest magnitude first), zeros, positives
+        buckets = [(-self._bucket_value(k), c) for k, c in sorted(self.negative.items(), reverse=True)]
+        if self.zero_count:
+            buckets.append((0.0, self.zero_count))
+        buckets += [(self._bucket_value(k), c) for k, c in sorted(self.positive.items())]
+        values = np.array([v for v, _ in buckets])
+        cumulative = np.cumsum([c for _, c in buckets])
+
+        out = []
+        for q in qs:
+            rank = q * (self.count - 1)
+            position = int(np.searchsorted(cumulative, rank, side="right"))
+            value = float(values[min(position, len(values) - 1)])
+            out.append(min(max(value, self.min), self.max))
+        return out
+
+    def _exact_quantiles(self, qs) -> list:
+        # Linear interpolation between the neighbouring ranks, as pandas/NumPy do
+        values = np.array(sorted(self.exact))
+        cumulative = np.cumsum([self.exact[v] for v in values])
+        out = []
+        for q in qs:
+            rank = q * (self.count - 1)
+            low = values[np.searchsorted(cumulative, math.floor(rank), side="right")]
+            high = values[np.searchsorted(cumulative, math.ceil(rank), side="right")]
+            out.append(float(low + (high - low) * (rank - math.floor(rank))))
+        return out
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles([q])[0]
+
+    def _cdf_points(self) -> tuple:
+        """
+        Piecewise linear CDF of the sketch: bucket bounds (clipped to min/max) in ascending order
+        and the number of values at or below each of them, assuming values spread evenly inside a bucket.
+        """
+        bounds = []
+        for k, c in sorted(self.negative.items(), reverse=True):
+            bounds.append((-self.gamma ** k, -self.gamma ** (k - 1), c))
+        if self.zero_count:
+            bounds.append((0.0, 0.0, self.zero_count))
+        for k, c in sorted(self.positive.items()):
+            bounds.append((self.gamma ** (k - 1), self.gamma ** k, c))
+
+        xs = [self.min]
+        cumulative = [0]
+        for low, high, c in bounds:
+            low, high = min(max(low, self.min), self.max), min(max(high, self.min), self.max)
+            if low > xs[-1]:
+                xs.append(low)
+                cumulative.append(cumulative[-1])
+            xs.append(max(high, xs[-1]))
+            cumulative.append(cumulative[-1] + c)
+        return np.array(xs), np.array(cumulative, dtype="float64")
+
+    def histogram(self, bins: int = 10, range: Optional[tuple] = None) -> tuple:
+        """
+        Approximate np.histogram(values, bins, range): (counts, edges) with `bins` equal-width bins
+        between min and max (or `range`). Counts are exact up to the share of the buckets that
+        straddle a bin edge; they sum to the number of values inside the range.
+        """
+        if self.count == 0:
+            return np.zeros(bins), np.linspace(0.0, 1.0, bins + 1)
+        low, high = range if range is not None else (self.min, self.max)
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        edges = np.linspace(low, high, bins + 1)
+        if self.exact is not None:
+            values = np.array(list(self.exact), dtype="float64")
+            weights = np.array(list(self.exact.values()), dtype="float64")
+            return np.histogram(values, bins=edges, weights=weights)[0], edges
+        xs, cumulative = self._cdf_points()
+        return np.diff(np.interp(edges, xs, cumulative)), edges
+
+    def to_state(self) -> dict:
+        """
+        JSON-serializable state (see from_state).
+        """
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "positive": {str(k): c for k, c in self.positive.items()},
+            "negative": {str(k): c for k, c in self.negative.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "exact": None if self.exact is None else [[v, c] for v, c in self.exact.items()],
+            "min": None if math.isnan(self.min) else self.min,
+            "max": None if math.isnan(self.max) else self.max,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "QuantileSketch":
+        sketch = cls(state["relative_accuracy"])
+        sketch.positive = {int(k): int(c) for k, c in state["positive"].items()}
+        sketch.negative = {int(k): int(c) for k, c in state["negative"].items()}
+        sketch.zero_count = int(state["zero_count"])
+        sketch.count = int(state["count"])
+        sketch.exact = None if state["exact"] is None else {v: int(c) for v, c in state["exact"]}
+        sketch.min = math.nan if state["min"] is None else float(state["min"])
+        sketch.max = math.nan if state["max"] is None else float(state["max"])
+        return sketch
+
+
+def add_grouped(sketches: list, values, codes: np.ndarray) -> None:
+    """
+    Add values to one sketch per group in a single vectorized pass: `codes` holds the group
+    position (index into `sketches`, all with the same accuracy) of every value. Grouped sketches
+    keep their buckets only (no exact value counts).
+    """
+    values = np.asarray(values, dtype="float64")
+    codes = np.asarray(codes, dtype="int64")
+    present = ~np.isnan(values)
+    if not present.all():
+        values, codes = values[present], codes[present]
+    if len(values) == 0:
+        return
+    n_groups = len(sketches)
+    template = sketches[0]
+
+    for sign, store_name in ((1.0, "positive"), (-1.0, "negative")):
+        mask = values * sign > 0
+        if not mask.any():
+            continue
+        index = template._bucket_index(values[mask] * sign)
+        low = int(index.min())
+        span = int(index.max()) - low + 1
+        counts = np.bincount(codes[mask] * span + (index - low), minlength=n_groups * span).reshape(n_groups, span)
+        for group, offset in zip(*np.nonzero(counts)):
+            store = getattr(sketches[group], store_name)
+            key = low + int(offset)
+            store[key] = store.get(key, 0) + int(counts[group, offset])
+
+    zeros = np.bincount(codes[values == 0], minlength=n_groups)
+    totals = np.bincount(codes, minlength=n_groups)
+    extremes = pd.Series(values).groupby(codes).agg(["min", "max"])
+    for sketch in sketches:
+        sketch.exact = None
+    for group, row in extremes.iterrows():
+        sketch = sketches[group]
+        sketch.zero_count += int(zeros[group])
+        sketch.count += int(totals[group])
+        sketch.min = row["min"] if math.isnan(sketch.min) else min(sketch.min, row["min"])
+        sketch.max = row["max"] if math.isnan(sketch.max) else max(sketch.max, row["max"])
+
+
+def sketch_of(values, relative_accuracy: Optional[float] = None) -> QuantileSketch:
+    """
+    Sketch of an array of values.
+    """
+    return QuantileSketch(relative_accuracy or DEFAULT_RELATIVE_ACCURACY).add(values)
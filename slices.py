@@ -0,0 +1,138 @@
+import logging
+import re
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from aggregations import CUBE_BLOCK_ROWS, SalesAggregates, aggregate_selections
+from cube import get_cube, parse_filters
+from kernels import dimension_codes
+from sampling import get_sample
+
+logger = logging.getLogger(__name__)
+
+# Batch reports (pipeline.run_batch) without explicit slices: one slice per label of each of these
+DEFAULT_SLICE_DIMENSIONS = ("Region", "Model")
+
+
+def slice_name(filters: dict) -> str:
+    """
+    Display name of a slice in the filter syntax of `main.py query`, e.g. "Region=Asia",
+    "Model=X5,X6" or "Model=X5 Year=2022..2023".
+    """
+    parts = []
+    for dim, value in filters.items():
+        if isinstance(value, tuple):
+            low, high = value
+            text = f"{'' if low is None else low}..{'' if high is None else high}"
+        elif isinstance(value, (list, set, frozenset)):
+            text = ",".join(str(v) for v in value)
+        else:
+            text = str(value)
+        parts.append(f"{dim}={text}")
+    return " ".join(parts) or "All"
+
+
+def slice_directory(name: str) -> str:
+    """
+    Output directory name of a slice: its name in lower case with runs of other characters
+    replaced by "_", e.g. "Region=North America" -> "region_north_america".
+    """
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") or "all"
+
+
+def expand_slices(data, by: Sequence[str] = (), expressions: Iterable[str] = ()) -> list:
+    """
+    Slices of a batch run, each a dict with name, directory, filters (cube.query keyword
+    arguments) and rows: one per label of every dimension in `by`, then one per filter expression
+    (space-separated `main.py query` filters, e.g. "Region=Asia,Europe Year=2023.."). Slices
+    that match no rows are left out. Raises ValueError for unknown dimensions or labels.
+    """
+    cube = get_cube(data)
+    candidates = []
+    for dim in by:
+        if dim not in cube.labels:
+            raise ValueError(f"Unknown slice dimension {dim!r}, expected one of {cube.dimensions}")
+        candidates.extend({dim: label} for label in cube.label_values(dim) if not pd.isna(label))
+    for expression in expressions:
+        candidates.append(parse_filters(cube, expression.split()))
+
+    slices = []
+    seen = set()
+    for filters in candidates:
+        name = slice_name(filters)
+        if name in seen:
+            continue
+        seen.add(name)
+        rows = int(cube.total(**filters)["Row_Count"])
+        if not rows:
+            logger.warning(f"Slice {name} matches no rows, skipped")
+            continue
+        slices.append({"name": name, "directory": slice_directory(name), "filters": filters, "rows": rows})
+    directories = [s["directory"] for s in slices]
+    if len(set(directories)) != len(directories):
+        raise ValueError(f"Slice names map to the same output directory: {directories}")
+    return slices
+
+
+def _slice_mask(frame: pd.DataFrame, filters: dict, cube, codes: dict) -> np.ndarray:
+    # Rows of `frame` in the slice, with the same label semantics as cube.query (see SalesCube.selection)
+    mask = np.ones(len(frame), dtype=bool)
+    for dim, value in filters.items():
+        if dim not in codes:
+            codes[dim] = dimension_codes(frame[dim], cube.labels[dim])
+        mask &= np.isin(codes[dim], cube.selection(dim, value))
+    return mask
+
+
+def aggregate_slices(df: pd.DataFrame, slices: Sequence[dict], block_rows: int = CUBE_BLOCK_ROWS) -> dict:
+    """
+    Frame-less SalesAggregates of every slice, by slice name, in one blockwise pass over the
+    frame (aggregations.aggregate_selections): each block is coded and measured once, and every
+    slice accumulates its rows of it, with the labels of the whole frame so that all partials
+    line up. Each partial serves table(), correlation(), regression() and the sketch-based
+    histogram(), i.e. the AI summary and the cube charts.
+    """
+    cube = get_cube(df)
+    selections = {
+        s["name"]: {dim: cube.selection(dim, value) for dim, value in s["filters"].items()} for s in slices
+    }
+    partials = aggregate_selections(df, selections, block_rows=block_rows)
+    logger.info(f"Aggregated {len(partials)} slices in one pass over {len(df)} rows")
+    return partials
+
+
+def slice_sample(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
+    """
+    Rows of the shared stratified sample (sampling.get_sample) in a slice. The sample keeps every
+    Model × Region stratum, so each Model or Region slice keeps all of its strata.
+    """
+    sample = get_sample(df)
+    return sample[_slice_mask(sample, filters, get_cube(df), {})]
+
+
+def slice_metrics(agg: SalesAggregates) -> dict:
+    """
+    Row count and the headline metrics (volume, revenue, weighted ASP) of one slice.
+    """
+    metrics = {"Row_Count": agg.row_count()}
+    if agg.dimensions:
+        table = agg.table(agg.dimensions[:1])
+        for name in ("Total_Sales_Volume", "Total_Revenue_USD"):
+            if name in table:
+                metrics[name] = table[name].sum()
+        if {"Total_Sales_Volume", "Total_Revenue_USD"}.issubset(metrics):
+            metrics["Weighted_ASP_USD"] = metrics["Total_Revenue_USD"] / max(metrics["Total_Sales_Volume"], 1)
+    return metrics
+
+
+def get_slices(df: pd.DataFrame, by: Optional[Sequence[str]] = None, expressions: Iterable[str] = ()) -> list:
+    """
+    Slices of `df` (see expand_slices), one per label of DEFAULT_SLICE_DIMENSIONS when neither
+    `by` nor `expressions` is given.
+    """
+    expressions = list(expressions)
+    if by is None and not expressions:
+        by = [d for d in DEFAULT_SLICE_DIMENSIONS if d in df.columns]
+    return expand_slices(df, by or [], expressions)
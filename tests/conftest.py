@@ -0,0 +1,192 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The modules live at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubServer:
+    """
+    In-process stand-in for the OpenAI API (chat completions and responses, plain or streamed).
+    Each request takes the next scripted action, "ok" once the script is used up:
+
+        "ok"    answer with the heading the prompt asks for (or "## Stub section")
+        "429"   Too Many Requests with Retry-After: RETRY_AFTER
+        "500", "503", "400", ...   that status with an error body
+        "slow"  answer after SLOW_SECONDS, e.g. to trigger a client timeout
+
+    `delay(body)` may hold back individual answers (seconds). Served requests are recorded in
+    `requests` as (action, request body).
+    """
+
+    RETRY_AFTER = "2"
+    SLOW_SECONDS = 2.0
+
+    def __init__(self):
+        self.actions = deque()
+        self.requests = []
+        self.delay = lambda body: 0.0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def script(self, *actions: str) -> None:
+        with self._lock:
+            self.actions.extend(actions)
+
+    def next_action(self, body: dict) -> str:
+        with self._lock:
+            action = self.actions.popleft() if self.actions else "ok"
+            self.requests.append((action, body))
+        return action
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _prompt_text(body: dict) -> str:
+    if "messages" in body:
+        return "\n".join(str(m.get("content", "")) for m in body["messages"])
+    return "\n".join(
+        part.get("text", "") for item in body.get("input", []) for part in item.get("content", [])
+        if isinstance(part, dict)
+    )
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        action = stub.next_action(body)
+        if action.isdigit():
+            self._send_json(int(action), {"error": {"message": f"stub {action}", "type": "stub", "code": action}})
+            return
+        time.sleep(stub.SLOW_SECONDS if action == "slow" else stub.delay(body))
+
+        heading = re.search(r'Use the heading "([^"]+)"', _prompt_text(body))
+        text = f"{heading.group(1) if heading else '## Stub section'}\n\nGenerated by the stub."
+        chat = self.path.endswith("/chat/completions")
+        if not body.get("stream"):
+            if chat:
+                self._send_json(200, {
+                    "id": "stub", "object": "chat.completion", "created": 0, "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                })
+            else:
+                self._send_json(200, _response(body, text))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        tokens = [token + " " for token in text.split(" ")]
+        if chat:
+            for token in tokens:
+                self._send_event(None, _chunk({"content": token}, None))
+            self._send_event(None, _chunk({}, "stop"))
+            self.wfile.write(b"data: [DONE]\n\n")
+        else:
+            for seq, token in enumerate(tokens):
+                self._send_event("response.output_text.delta", {
+                    "type": "response.output_text.delta", "item_id": "m", "output_index": 0, "content_index": 0,
+                    "delta": token, "sequence_number": seq, "logprobs": [],
+                })
+            self._send_event("response.completed", {
+                "type": "response.completed", "response": _response(body, text), "sequence_number": len(tokens),
+            })
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if status == 429:
+            self.send_header("Retry-After", StubServer.RETRY_AFTER)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event(self, event, payload: dict) -> None:
+        prefix = f"event: {event}\n" if event else ""
+        self.wfile.write(f"{prefix}data: {json.dumps(payload)}\n\n".encode())
+        self.wfile.flush()
+
+
+def _chunk(delta: dict, finish_reason) -> dict:
+    return {
+        "id": "stub", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def _response(body: dict, text: str) -> dict:
+    return {
+        "id": "stub", "object": "response", "created_at": 0, "model": body.get("model"), "status": "completed",
+        "output": [{
+            "type": "message", "id": "m", "status": "completed", "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+    }
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def openai_client(stub_server):
+    openai = pytest.importorskip("openai")
+    client = openai.OpenAI(base_url=stub_server.url, api_key="stub", max_retries=0)
+    yield client
+    client.close()
+
+
+# Row counts of the synthetic frames in test_benchmarks.py. The benchmarks are opt-in: they only
+# run when --bench-rows is given, alone for these defaults or with the row counts to use
+DEFAULT_BENCH_ROWS = "10000,100000"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--bench-rows", nargs="?", const=DEFAULT_BENCH_ROWS, default=None,
+        help=f"Run the benchmarks on frames with these comma-separated row counts (default: {DEFAULT_BENCH_ROWS}, up to 50000000)",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "bench_rows" in metafunc.fixturenames:
+        option = metafunc.config.getoption("--bench-rows") or DEFAULT_BENCH_ROWS
+        rows = [int(value) for value in option.split(",") if value.strip()]
+        metafunc.parametrize("bench_rows", rows, ids=[f"{value}rows" for value in rows], scope="module")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--bench-rows"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks are opt-in, pass --bench-rows to run them")
+    for item in items:
+        if "bench_rows" in item.fixturenames:
+            item.add_marker(skip)
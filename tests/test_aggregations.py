@@ -0,0 +1,76 @@
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import aggregations
+import cube
+import sampling
+from aggregations import SalesAggregates
+from benchmark import make_synthetic_frame
+
+
+@pytest.fixture(scope="module")
+def sales_frame():
+    return make_synthetic_frame(20_000)
+
+
+def test_memos_are_built_once_under_concurrent_use(sales_frame, monkeypatch):
+    scans = []
+    scan_cubes = aggregations.scan_cubes
+
+    def slow_scan(*args, **kwargs):
+        # Widens the window in which a second thread would start its own scan
+        scans.append(1)
+        time.sleep(0.2)
+        return scan_cubes(*args, **kwargs)
+
+    monkeypatch.setattr(aggregations, "scan_cubes", slow_scan)
+    agg = SalesAggregates(sales_frame)
+    calls = [
+        lambda: agg.table(["Year"]),
+        lambda: agg.table(["Year"]),
+        lambda: agg.row_count(True),
+        lambda: agg.comoments(aggregations.CORRELATION_COLUMNS),
+        lambda: agg.comoments(aggregations.CORRELATION_COLUMNS),
+        lambda: agg.moments("Price_USD").count,
+    ]
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        results = [future.result() for future in [pool.submit(call) for call in calls]]
+
+    assert len(scans) == 1
+    pd.testing.assert_frame_equal(results[0], results[1])
+    assert results[3] is results[4]
+    assert results[5] == len(sales_frame)
+
+
+@pytest.mark.parametrize("module, builder, getter", [
+    (cube.SalesCube, "from_frame", cube.get_cube),
+    (sampling, "sample_frame", sampling.get_sample),
+])
+def test_shared_cube_and_sample_are_built_once_under_concurrent_use(module, builder, getter, monkeypatch):
+    frame = make_synthetic_frame(5_000)
+    builds = []
+    build = getattr(module, builder)
+
+    def slow_build(*args, **kwargs):
+        builds.append(1)
+        time.sleep(0.2)
+        return build(*args, **kwargs)
+
+    monkeypatch.setattr(module, builder, slow_build)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = [future.result() for future in [pool.submit(getter, frame) for _ in range(4)]]
+
+    assert len(builds) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_detached_partial_pickles(sales_frame):
+    part = SalesAggregates(sales_frame).detach()
+    copy = pickle.loads(pickle.dumps(part))
+    pd.testing.assert_frame_equal(copy.table(["Model"]), part.table(["Model"]))
+    # The copy has working locks of its own
+    assert copy.merge(part).row_count() == 2 * len(sales_frame)
@@ -0,0 +1,116 @@
+import contextlib
+import io
+from pathlib import Path
+
+import pytest
+
+import aggregations
+import cube
+import data_loader
+import sampling
+from analyzer import _build_summary_for_ai, analyze_basic, analyze_mix, analyze_revenue, analyze_trend
+from benchmark import make_synthetic_frame
+from visualizer import CHART_JOBS, plot_all_charts
+
+# Opt-in (see conftest.py). Save a baseline, then compare against it (fails when a stage's
+# minimum is 25% slower):
+#   python -m pytest tests/test_benchmarks.py --bench-rows --benchmark-autosave
+#   python -m pytest tests/test_benchmarks.py --bench-rows --benchmark-compare --benchmark-compare-fail=min:25%
+pytest.importorskip("pytest_benchmark")
+
+# Timed runs per stage; every run starts from fresh aggregates
+BENCHMARK_ROUNDS = 3
+
+# load_data parses an Excel workbook, which caps out at 1,048,576 rows and takes minutes to write
+# at that size; load_data is only benchmarked up to this many rows
+LOAD_MAX_ROWS = 100_000
+
+ANALYSIS_STAGES = {
+    "analyze_basic": analyze_basic,
+    "analyze_trend": analyze_trend,
+    "analyze_mix": analyze_mix,
+    "analyze_revenue": analyze_revenue,
+    "_build_summary_for_ai": _build_summary_for_ai,
+}
+
+
+def _clear_memos() -> None:
+    aggregations._AGGREGATES_BY_FRAME.clear()
+    cube._CUBES_BY_SOURCE.clear()
+    sampling._SAMPLES_BY_FRAME.clear()
+
+
+@contextlib.contextmanager
+def _data_file(path: Path):
+    """
+    Point data_loader (data file and columnar cache) at another workbook for the duration of the block.
+    """
+    saved = (data_loader.DATA_FILE, data_loader.CACHE_FILE, data_loader.CACHE_META_FILE)
+    data_loader.DATA_FILE = path
+    data_loader.CACHE_FILE = path.with_name(path.stem + ".arrow")
+    data_loader.CACHE_META_FILE = path.with_name(path.stem + ".arrow.json")
+    try:
+        yield
+    finally:
+        data_loader.DATA_FILE, data_loader.CACHE_FILE, data_loader.CACHE_META_FILE = saved
+
+
+@pytest.fixture(scope="module")
+def synthetic_frame(bench_rows):
+    frame = make_synthetic_frame(bench_rows)
+    yield frame
+    _clear_memos()
+
+
+@pytest.fixture(scope="module")
+def synthetic_workbook(synthetic_frame, bench_rows, tmp_path_factory):
+    if bench_rows > LOAD_MAX_ROWS:
+        pytest.skip(f"load_data is only benchmarked up to {LOAD_MAX_ROWS} rows")
+    workbook = tmp_path_factory.mktemp("workbook") / "synthetic.xlsx"
+    synthetic_frame.to_excel(workbook, index=False)
+    return workbook
+
+
+def _quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+@pytest.mark.parametrize("stage", list(ANALYSIS_STAGES))
+def test_analysis_stage(benchmark, synthetic_frame, bench_rows, stage):
+    # Each round includes building the cubes and samples the stage needs
+    def setup():
+        _clear_memos()
+        return (ANALYSIS_STAGES[stage], synthetic_frame), {}
+
+    benchmark.group = f"analysis {bench_rows} rows"
+    benchmark.pedantic(_quiet, setup=setup, rounds=BENCHMARK_ROUNDS, iterations=1)
+
+
+def test_load_excel(benchmark, synthetic_workbook, bench_rows):
+    benchmark.group = f"load_data {bench_rows} rows"
+    with _data_file(synthetic_workbook):
+        df = benchmark.pedantic(data_loader.load_data, kwargs={"use_cache": False}, rounds=BENCHMARK_ROUNDS)
+    assert len(df) == bench_rows
+
+
+def test_load_cache(benchmark, synthetic_workbook, bench_rows):
+    if data_loader.feather is None:
+        pytest.skip("pyarrow is not installed")
+    benchmark.group = f"load_data {bench_rows} rows"
+    with _data_file(synthetic_workbook):
+        # The first call builds the columnar cache, the timed calls read it
+        data_loader.load_data(use_cache=True)
+        df = benchmark.pedantic(data_loader.load_data, kwargs={"use_cache": True}, rounds=BENCHMARK_ROUNDS)
+    assert len(df) == bench_rows
+
+
+@pytest.mark.parametrize("chart", [job["number"] for job in CHART_JOBS])
+def test_chart(benchmark, synthetic_frame, bench_rows, chart, tmp_path):
+    benchmark.group = f"charts {bench_rows} rows"
+    results = benchmark.pedantic(
+        _quiet, args=(plot_all_charts, synthetic_frame),
+        kwargs={"force": True, "charts": [chart], "output_dir": str(tmp_path)},
+        rounds=BENCHMARK_ROUNDS,
+    )
+    assert [result["status"] for result in results] == ["ok"]
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from benchmark import make_synthetic_frame
+from correlations import CoMoments
+
+COLUMNS = ["Mileage_KM", "Price_USD", "Engine_Size_L"]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return make_synthetic_frame(3_000)
+
+
+def _merged(frame, bounds, by=None):
+    """
+    Merge the co-moments of the chunks frame[bounds[i]:bounds[i + 1]], each built over the group
+    labels of its own rows only.
+    """
+    merged = None
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        chunk = frame.iloc[start:end]
+        values = np.stack([chunk[col].to_numpy(dtype="float64") for col in COLUMNS])
+        if by is None:
+            part = CoMoments(COLUMNS).add(values)
+        else:
+            labels = sorted(chunk[by].astype(str).unique())
+            codes = np.searchsorted(labels, chunk[by].astype(str).to_numpy())
+            part = CoMoments(COLUMNS, labels).add(values, codes)
+        merged = part if merged is None else merged.merge(part)
+    return merged
+
+
+# Uneven splits, with empty and one-row chunks
+SPLITS = [
+    [0, 3_000],
+    [0, 0, 1, 2, 1_000, 1_000, 2_999, 3_000],
+    [0, 7, 8, 1_500, 1_501, 2_900, 3_000, 3_000],
+]
+
+
+@pytest.mark.parametrize("bounds", SPLITS)
+def test_merged_chunks_match_the_full_frame(frame, bounds):
+    comoments = _merged(frame, bounds)
+    values = np.stack([frame[col].to_numpy(dtype="float64") for col in COLUMNS])
+
+    assert comoments.count.tolist() == [len(frame)]
+    np.testing.assert_allclose(comoments.correlation().to_numpy(), np.corrcoef(values), rtol=1e-10)
+    slope, intercept = np.polyfit(values[0], values[1], 1)
+    fit = comoments.ols("Price_USD", "Mileage_KM").iloc[0]
+    assert fit["Slope"] == pytest.approx(slope, rel=1e-10)
+    assert fit["Intercept"] == pytest.approx(intercept, rel=1e-10)
+
+
+@pytest.mark.parametrize("bounds", SPLITS[1:])
+def test_merged_grouped_chunks_match_each_group(frame, bounds):
+    comoments = _merged(frame, bounds, by="Model")
+
+    models = frame["Model"].astype(str)
+    assert comoments.labels == sorted(models.unique())
+    fits = comoments.ols("Price_USD", "Mileage_KM")
+    for position, model in enumerate(comoments.labels):
+        rows = frame[models == model]
+        x, y = rows["Mileage_KM"].to_numpy(dtype="float64"), rows["Price_USD"].to_numpy(dtype="float64")
+        slope, intercept = np.polyfit(x, y, 1)
+        assert fits["Rows"][position] == len(rows)
+        assert fits["Slope"][position] == pytest.approx(slope, rel=1e-9)
+        assert fits["Intercept"][position] == pytest.approx(intercept, rel=1e-9)
+        assert fits["Correlation"][position] == pytest.approx(np.corrcoef(x, y)[0, 1], rel=1e-9)
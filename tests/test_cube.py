@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregations import get_aggregates
+from analyzer import analyze_mix, analyze_trend
+from benchmark import make_synthetic_frame
+from cube import get_cube, load_cube, parse_filters, save_cube
+
+
+@pytest.fixture(scope="module")
+def frame_with_missing_keys():
+    df = make_synthetic_frame(5_000)
+    # As data_loader._apply_schema stores an integer column with schema violations
+    df["Year"] = df["Year"].astype("Int16")
+    df.loc[3, "Year"] = pd.NA
+    df.loc[7, "Region"] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("dim", ["Year", "Region"])
+def test_query_leaves_out_missing_labels_like_the_tables(frame_with_missing_keys, dim):
+    cube = get_cube(frame_with_missing_keys)
+    table = get_aggregates(frame_with_missing_keys).table([dim])
+    queried = cube.query(by=[dim])
+
+    assert not queried[dim].isna().any()
+    assert queried[dim].tolist() == table[dim].tolist()
+    np.testing.assert_array_equal(queried["Total_Sales_Volume"], table["Total_Sales_Volume"])
+
+    with_missing = cube.query(by=[dim], dropna=False, with_rows=True)
+    assert with_missing[dim].isna().sum() == 1
+    assert with_missing["Row_Count"].sum() == cube.total()["Row_Count"] == len(frame_with_missing_keys)
+
+
+def test_printed_analyses_have_no_missing_label_rows(frame_with_missing_keys, capsys):
+    analyze_trend(frame_with_missing_keys)
+    analyze_mix(frame_with_missing_keys)
+    out = capsys.readouterr().out
+    assert "NaN " not in out and "\nNaN" not in out and "<NA>" not in out
+    # Years stay integral
+    assert "2020 " in out and "2020.0" not in out
+    assert "-99.75" not in out
+
+
+@pytest.fixture(scope="module")
+def sales_frame():
+    return make_synthetic_frame(5_000)
+
+
+@pytest.fixture(scope="module")
+def sales_cube(sales_frame):
+    return get_cube(sales_frame)
+
+
+def test_parse_filters_reads_scalars_lists_and_ranges(sales_frame, sales_cube):
+    filters = parse_filters(sales_cube, ["Model=X5", "Region=Asia, Europe", "Year=2021..2023", "Fuel_Type=..Hybrid"])
+    assert filters == {
+        "Model": "X5",
+        "Region": ["Asia", "Europe"],
+        "Year": (2021, 2023),
+        "Fuel_Type": (None, "Hybrid"),
+    }
+    # Numeric bounds need not be labels themselves
+    assert parse_filters(sales_cube, ["Year=2022.."]) == {"Year": (2022, None)}
+    assert parse_filters(sales_cube, ["Year=..2019"]) == {"Year": (None, 2019)}
+
+    df = sales_frame
+    selected = (
+        (df["Model"] == "X5") & df["Region"].isin(["Asia", "Europe"]) & df["Year"].between(2021, 2023)
+        & (df["Fuel_Type"].astype(str) <= "Hybrid")
+    )
+    assert sales_cube.total(**filters)["Total_Sales_Volume"] == df.loc[selected, "Sales_Volume"].sum()
+
+
+@pytest.mark.parametrize("expression, message", [
+    ("Colour=Red", "Invalid filter"),
+    ("Model", "Invalid filter"),
+    ("Model=Z4", "Unknown Model 'Z4'"),
+    ("Region=Asia,Atlantis", "Unknown Region 'Atlantis'"),
+    ("Year=2021..next", "Unknown Year 'next'"),
+])
+def test_parse_filters_rejects_unknown_dimensions_and_labels(sales_cube, expression, message):
+    with pytest.raises(ValueError, match=message):
+        parse_filters(sales_cube, [expression])
+
+
+def test_saved_cube_answers_like_the_original(sales_cube, frame_with_missing_keys, tmp_path):
+    for cube in (sales_cube, get_cube(frame_with_missing_keys)):
+        save_cube(cube, path=tmp_path / "cube.npz", meta_path=tmp_path / "cube.json")
+        loaded = load_cube(path=tmp_path / "cube.npz", meta_path=tmp_path / "cube.json")
+
+        for by in (["Year"], ["Region", "Model"]):
+            pd.testing.assert_frame_equal(loaded.query(by=by), cube.query(by=by))
+            pd.testing.assert_frame_equal(loaded.query(by=by, dropna=False), cube.query(by=by, dropna=False))
+        filters = parse_filters(loaded, ["Year=2021..2022", "Model=X5,X3"])
+        assert loaded.total(**filters) == cube.total(**filters)
+
+
+def test_load_cube_rejects_a_stale_source(sales_cube, tmp_path):
+    source = tmp_path / "sales.xlsx"
+    source.write_bytes(b"first version")
+    paths = {"path": tmp_path / "cube.npz", "meta_path": tmp_path / "cube.json"}
+    save_cube(sales_cube, source, **paths)
+
+    assert load_cube(source, **paths) is not None
+    source.write_bytes(b"second, longer version")
+    assert load_cube(source, **paths) is None
+    assert load_cube(tmp_path / "missing.xlsx", **paths) is None
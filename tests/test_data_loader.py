@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_loader
+from aggregations import SalesAggregates, aggregate_chunks
+from benchmark import make_synthetic_frame
+from data_loader import (
+    COLUMN_SCHEMA,
+    NULLABLE_INT_DTYPES,
+    SCHEMA_FALLBACK_DTYPE,
+    _apply_schema,
+    _normalize_column_names,
+    iter_data_chunks,
+)
+
+
+def raw_frame(**overrides) -> pd.DataFrame:
+    columns = {
+        "Model": ["X5", "X3", "M5", "i8"],
+        "Year": [2020, 2021, 2022, 2023],
+        "Region": ["Asia", "Europe", "Asia", "Africa"],
+        "Engine_Size_L": [2.0, 3.0, 4.4, 1.5],
+        "Price_USD": [50_000, 60_000, 70_000, 80_000],
+        "Sales_Volume": [10, 20, 30, 40],
+    }
+    columns.update(overrides)
+    return pd.DataFrame(columns)
+
+
+def test_valid_frame_gets_the_declared_dtypes():
+    df, violations = _apply_schema(raw_frame())
+    assert violations.empty
+    for col in df.columns:
+        assert str(df[col].dtype) == COLUMN_SCHEMA[col]
+
+
+def test_rows_with_violations_are_kept_and_reported():
+    df, violations = _apply_schema(raw_frame(
+        Year=[2020, None, 2300, 2023],
+        Price_USD=[50_000, "n/a", 70_000.5, 80_000],
+        Engine_Size_L=[2.0, 3.0, -1.0, 1.5],
+    ))
+    assert len(df) == 4
+    assert str(df["Year"].dtype) == NULLABLE_INT_DTYPES[COLUMN_SCHEMA["Year"]]
+    assert str(df["Price_USD"].dtype) == SCHEMA_FALLBACK_DTYPE
+    assert str(df["Engine_Size_L"].dtype) == "float32"
+    assert str(df["Sales_Volume"].dtype) == COLUMN_SCHEMA["Sales_Volume"]
+    # Missing, non-numeric and out-of-range values become <NA> (NaN next to non-integral values,
+    # which are kept), the valid years stay integral
+    assert df["Year"].isna().tolist() == [False, True, True, False]
+    assert df["Year"].dropna().tolist() == [2020, 2023]
+    assert all(isinstance(year, int) for year in df["Year"].dropna().tolist())
+    assert df["Price_USD"].tolist()[2] == 70_000.5 and pd.isna(df["Price_USD"].tolist()[1])
+    assert pd.isna(df["Engine_Size_L"].tolist()[2])
+
+    issues = {(r["row"], r["column"]): r["issue"] for r in violations.to_dict(orient="records")}
+    assert issues == {
+        (1, "Year"): "missing",
+        (2, "Year"): "out of range",
+        (1, "Price_USD"): "non-numeric",
+        (2, "Price_USD"): "non-integral",
+        (2, "Engine_Size_L"): "out of range",
+    }
+
+
+@pytest.fixture(scope="module")
+def raw_sales():
+    """
+    Raw sales rows sorted by Model, so that chunks see different Model labels, with a missing Year
+    and a missing Sales_Volume in different chunks.
+    """
+    raw = make_synthetic_frame(4_000).sort_values("Model", kind="stable").reset_index(drop=True)
+    raw = raw.astype({col: "object" for col in raw.columns if isinstance(raw[col].dtype, pd.CategoricalDtype)})
+    raw = raw.astype({"Year": "float64", "Sales_Volume": "float64"})
+    raw.loc[5, "Year"] = np.nan
+    raw.loc[3_500, "Sales_Volume"] = np.nan
+    return raw
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".arrow"])
+def test_streamed_chunks_aggregate_like_the_whole_file(raw_sales, tmp_path, suffix):
+    path = tmp_path / f"sales{suffix}"
+    if suffix == ".csv":
+        raw_sales.to_csv(path, index=False)
+    else:
+        pytest.importorskip("pyarrow")
+        raw_sales.to_feather(path)
+    frame, _ = _apply_schema(_normalize_column_names(raw_sales.copy()))
+    whole = SalesAggregates(frame)
+
+    chunks = list(iter_data_chunks(path, chunk_size=700))
+    assert [len(chunk) for chunk in chunks] == [700] * 5 + [500]
+    assert len({tuple(chunk["Model"].dropna().unique()) for chunk in chunks}) > 1
+    streamed = aggregate_chunks(chunks)
+
+    assert streamed.row_count() == whole.row_count() == len(frame)
+    for dims in (["Year"], ["Model"], ["Region", "Model"], ["Year", "Engine_Size_L"]):
+        for valid_only in (False, True):
+            pd.testing.assert_frame_equal(
+                streamed.table(dims, valid_only), whole.table(dims, valid_only), check_exact=False, rtol=1e-12
+            )
+    for name in ("Price_USD", "Mileage_KM", "Sales_Volume"):
+        moments = ["count", "mean", "std", "min", "max"]
+        pd.testing.assert_series_equal(
+            streamed.describe(name)[moments], whole.describe(name)[moments], check_exact=False, rtol=1e-12
+        )
+    pd.testing.assert_frame_equal(streamed.correlation(), whole.correlation(), check_exact=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(
+        streamed.regression("Price_USD", "Mileage_KM", "Model"),
+        whole.regression("Price_USD", "Mileage_KM", "Model"),
+        check_exact=False, rtol=1e-9,
+    )
+
+
+@pytest.fixture
+def workbook(tmp_path, monkeypatch):
+    """
+    A small workbook with its columnar cache next to it, in place of the real data file.
+    """
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "sales.xlsx"
+    raw_frame().to_excel(path, index=False)
+    monkeypatch.setattr(data_loader, "DATA_FILE", path)
+    monkeypatch.setattr(data_loader, "CACHE_FILE", tmp_path / "sales.arrow")
+    monkeypatch.setattr(data_loader, "CACHE_META_FILE", tmp_path / "sales.arrow.json")
+    return path
+
+
+def _loaded_from(caplog) -> str:
+    caplog.clear()
+    with caplog.at_level("INFO", logger="data_loader"):
+        df = data_loader.load_data()
+    assert len(df) == len(raw_frame())
+    return "cache" if "Data loaded from columnar cache" in caplog.text else "workbook"
+
+
+def test_cache_is_rebuilt_only_when_the_workbook_changes(workbook, caplog):
+    assert _loaded_from(caplog) == "workbook"
+    assert _loaded_from(caplog) == "cache"
+
+    # Touched but unchanged: the content hash matches, and the new mtime is remembered
+    stat = workbook.stat()
+    os.utime(workbook, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert _loaded_from(caplog) == "cache"
+    assert data_loader._read_cache_meta()["mtime_ns"] == workbook.stat().st_mtime_ns
+
+    # Same size, new mtime and other content (the recorded hash no longer matches)
+    meta = data_loader._read_cache_meta()
+    data_loader._write_cache_meta({**meta, "sha256": "0" * 64})
+    os.utime(workbook, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+    assert _loaded_from(caplog) == "workbook"
+    assert _loaded_from(caplog) == "cache"
+
+    # Other size
+    raw_frame(Model=["X5", "X3", "M5", "3 Series"]).to_excel(workbook, index=False)
+    assert workbook.stat().st_size != stat.st_size
+    assert _loaded_from(caplog) == "workbook"
+    assert _loaded_from(caplog) == "cache"
@@ -0,0 +1,81 @@
+import json
+
+import pandas as pd
+import pytest
+
+from aggregations import SalesAggregates
+from benchmark import make_synthetic_frame
+from data_loader import _apply_schema, _normalize_column_names
+from incremental import STATE_FORMAT_VERSION, append_file, load_state
+
+TABLES = [["Year"], ["Model"], ["Year", "Model"], ["Region", "Engine_Size_L"]]
+
+
+@pytest.fixture
+def sales_files(tmp_path):
+    """
+    Two CSV files of raw sales rows; only the second one has rows of Model i8 and of Year 2024.
+    """
+    raw = make_synthetic_frame(3_000)
+    raw = raw.astype({col: "object" for col in raw.columns if isinstance(raw[col].dtype, pd.CategoricalDtype)})
+    new = (raw["Model"] == "i8") | (raw["Year"] == 2024)
+    first, second = tmp_path / "sales_2020_2023.csv", tmp_path / "sales_2024.csv"
+    raw[~new].to_csv(first, index=False)
+    raw[new].to_csv(second, index=False)
+    return first, second
+
+
+def _load_whole(paths) -> pd.DataFrame:
+    frame = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+    frame, _ = _apply_schema(_normalize_column_names(frame))
+    return frame
+
+
+def test_appended_files_merge_into_the_full_frame(sales_files, tmp_path):
+    state_path = tmp_path / "state.json"
+    append_file(sales_files[0], state_path)
+    append_file(sales_files[1], state_path)
+    state, meta = load_state(state_path)
+    frame = _load_whole(sales_files)
+    whole = SalesAggregates(frame)
+
+    assert meta["rows"] == state.row_count() == whole.row_count() == 3_000
+    assert [source["source"] for source in meta["sources"]] == [str(path) for path in sales_files]
+    assert "i8" in state.table(["Model"])["Model"].tolist()
+    assert 2024 in state.table(["Year"])["Year"].tolist()
+    # Keys persisted as JSON come back in wider dtypes (Year as int64 rather than int16)
+    for dims in TABLES:
+        for valid_only in (False, True):
+            pd.testing.assert_frame_equal(
+                state.table(dims, valid_only), whole.table(dims, valid_only),
+                check_dtype=False, check_exact=False, rtol=1e-12,
+            )
+    pd.testing.assert_frame_equal(state.correlation(), whole.correlation(), check_exact=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(
+        state.regression("Price_USD", "Mileage_KM", "Model"),
+        whole.regression("Price_USD", "Mileage_KM", "Model"),
+        check_exact=False, rtol=1e-9,
+    )
+
+
+def test_a_file_is_appended_only_once(sales_files, tmp_path, caplog):
+    state_path = tmp_path / "state.json"
+    append_file(sales_files[0], state_path)
+    with caplog.at_level("WARNING", logger="incremental"):
+        agg = append_file(sales_files[0], state_path)
+
+    assert "already appended" in caplog.text
+    _, meta = load_state(state_path)
+    assert agg.row_count() == meta["rows"] == len(_load_whole(sales_files[:1]))
+    assert len(meta["sources"]) == 1
+
+
+def test_a_state_of_another_format_version_is_refused(sales_files, tmp_path):
+    state_path = tmp_path / "state.json"
+    append_file(sales_files[0], state_path)
+    state = json.loads(state_path.read_text(encoding="utf-8"))
+    state["version"] = STATE_FORMAT_VERSION - 1
+    state_path.write_text(json.dumps(state), encoding="utf-8")
+
+    with pytest.raises(ValueError, match="format version"):
+        append_file(sales_files[1], state_path)
@@ -0,0 +1,13 @@
+import numpy as np
+
+from kernels import FLOAT64_EXACT_MAX, CubeAccumulator
+
+
+def test_integer_sums_stay_exact_beyond_float64_precision():
+    # Each value is exact in float64, their sum is not (2^53 + 3 would round to 2^53 + 4)
+    values = np.array([FLOAT64_EXACT_MAX // 2, FLOAT64_EXACT_MAX // 2, 1, 1, 1], dtype="int64")
+    acc = CubeAccumulator(2)
+    acc.add(np.zeros(len(values), dtype="int64"), {"Revenue_USD": values})
+    acc.add(np.array([1, 1]), {"Revenue_USD": np.array([2, 3], dtype="int64")})
+    assert acc.sums["Revenue_USD"].tolist() == [FLOAT64_EXACT_MAX + 3, 5]
+    assert float(FLOAT64_EXACT_MAX + 3) != FLOAT64_EXACT_MAX + 3
@@ -0,0 +1,248 @@
+import contextlib
+import io
+import re
+
+import pytest
+
+from analyzer import _build_summary_for_ai
+from benchmark import make_synthetic_frame
+from llm_client import (
+    MIN_DOCUMENT_ROWS,
+    REPORT_SECTIONS,
+    SUMMARY_DOCUMENTS,
+    CircuitOpenError,
+    LLMClient,
+    _encode_document,
+    _slice_summary,
+    count_tokens,
+)
+
+openai = pytest.importorskip("openai")
+
+
+class FakeClock:
+    """
+    Clock and sleep of an LLMClient: sleeping only advances the clock and is recorded.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def chat(client, timeout=None) -> str:
+    response = client.chat.completions.create(
+        model="stub", messages=[{"role": "user", "content": "Hello"}], timeout=timeout,
+    )
+    return response.choices[0].message.content
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def make_llm(openai_client, clock):
+    def make(**kwargs) -> LLMClient:
+        kwargs.setdefault("requests_per_minute", None)
+        return LLMClient(openai_client, sleep=clock.sleep, clock=clock, **kwargs)
+    return make
+
+
+def open_breaker(llm, clock):
+    for _ in range(llm.breaker.failure_threshold):
+        llm.breaker.record_failure()
+    assert llm.breaker.state == "open"
+    clock.now += llm.breaker.cooldown
+    assert llm.breaker.state == "half-open"
+
+
+def test_429_waits_for_retry_after(make_llm, stub_server, clock):
+    stub_server.script("429")
+    llm = make_llm()
+    assert llm.call(chat).startswith("## Stub section")
+    assert clock.sleeps == [float(stub_server.RETRY_AFTER)]
+    assert [action for action, _ in stub_server.requests] == ["429", "ok"]
+
+
+def test_429_pauses_the_rate_limiter(make_llm, stub_server, clock):
+    stub_server.script("429")
+    llm = make_llm(requests_per_minute=60, burst=5)
+    llm.call(chat)
+    # The bucket still had tokens: the only wait is the Retry-After itself
+    assert clock.sleeps == [float(stub_server.RETRY_AFTER)]
+    assert llm.limiter._paused_until == float(stub_server.RETRY_AFTER)
+
+
+def test_rate_limiting_does_not_count_towards_the_breaker(make_llm, stub_server):
+    stub_server.script("429", "429")
+    llm = make_llm(failure_threshold=1)
+    llm.call(chat)
+    assert llm.breaker.state == "closed"
+
+
+def test_5xx_is_retried_with_backoff(make_llm, stub_server, clock):
+    stub_server.script("500", "503")
+    llm = make_llm(base_delay=1.0)
+    assert llm.call(chat).startswith("## Stub section")
+    assert len(clock.sleeps) == 2
+    assert 0 <= clock.sleeps[0] <= 1.0 and 0 <= clock.sleeps[1] <= 2.0
+    assert llm.breaker.state == "closed" and llm.breaker._failures == 0
+
+
+def test_5xx_gives_up_after_max_attempts(make_llm, stub_server, clock):
+    stub_server.script("500", "500", "500")
+    llm = make_llm(max_attempts=3)
+    with pytest.raises(openai.InternalServerError):
+        llm.call(chat)
+    assert len(stub_server.requests) == 3
+    assert len(clock.sleeps) == 2
+
+
+def test_4xx_is_raised_at_once(make_llm, stub_server, clock):
+    stub_server.script("400")
+    llm = make_llm()
+    with pytest.raises(openai.BadRequestError):
+        llm.call(chat)
+    assert len(stub_server.requests) == 1
+    assert clock.sleeps == []
+    assert llm.breaker._failures == 0
+
+
+def test_breaker_opens_half_opens_and_closes(make_llm, stub_server, clock):
+    stub_server.script("500", "500")
+    llm = make_llm(max_attempts=1, failure_threshold=2, cooldown=10.0)
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            llm.call(chat)
+    assert llm.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        llm.call(chat)
+    assert len(stub_server.requests) == 2  # refused without a request
+
+    clock.now += 10.0
+    assert llm.breaker.state == "half-open"
+    assert llm.call(chat).startswith("## Stub section")
+    assert llm.breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_breaker(make_llm, stub_server, clock):
+    llm = make_llm(max_attempts=3, failure_threshold=2, cooldown=10.0)
+    open_breaker(llm, clock)
+    stub_server.script("503")
+    with pytest.raises(CircuitOpenError):
+        llm.call(chat)
+    assert [action for action, _ in stub_server.requests][-1] == "503"
+    assert llm.breaker.state == "open"
+
+
+def test_only_one_trial_call_while_half_open(make_llm, stub_server, clock):
+    llm = make_llm(max_attempts=1, failure_threshold=1, cooldown=10.0)
+    open_breaker(llm, clock)
+
+    def trial(client):
+        with pytest.raises(CircuitOpenError, match="trial call in flight"):
+            llm.call(chat)
+        return chat(client)
+
+    llm.call(trial)
+    assert llm.breaker.state == "closed"
+
+
+def test_rate_limited_trial_is_retried_by_its_own_call(make_llm, stub_server, clock):
+    # Regression: the retry of the trial used to be refused as "trial call in flight"
+    llm = make_llm(max_attempts=3, failure_threshold=1, cooldown=10.0)
+    open_breaker(llm, clock)
+    stub_server.script("429")
+    assert llm.call(chat).startswith("## Stub section")
+    assert llm.breaker.state == "closed"
+
+
+@pytest.mark.parametrize("actions, error", [
+    (["429", "429"], openai.RateLimitError),
+    (["400"], openai.BadRequestError),
+])
+def test_trial_without_verdict_is_released(make_llm, stub_server, clock, actions, error):
+    # Regression: a trial ending in rate limiting or a client error used to wedge the breaker
+    llm = make_llm(max_attempts=2, failure_threshold=1, cooldown=10.0)
+    open_breaker(llm, clock)
+    stub_server.script(*actions)
+    with pytest.raises(error):
+        llm.call(chat)
+    assert llm.breaker.state == "half-open"
+    assert llm.call(chat).startswith("## Stub section")
+    assert llm.breaker.state == "closed"
+
+
+def test_cancelled_call_is_not_retried_and_releases_the_trial(make_llm, stub_server, clock):
+    llm = make_llm(failure_threshold=1, cooldown=10.0)
+    open_breaker(llm, clock)
+    served = len(stub_server.requests)
+
+    def cancelled(client):
+        chat(client)
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        llm.call(cancelled)
+    assert len(stub_server.requests) == served + 1
+    assert clock.sleeps == []
+    assert llm.breaker.state == "half-open"
+    assert llm.call(chat).startswith("## Stub section")
+    assert llm.breaker.state == "closed"
+
+
+def test_timed_out_request_is_retried(make_llm, stub_server, clock):
+    stub_server.script("slow")
+    llm = make_llm()
+    assert llm.call(lambda client: chat(client, timeout=0.5)).startswith("## Stub section")
+    assert [action for action, _ in stub_server.requests] == ["slow", "ok"]
+    assert llm.breaker.state == "closed"
+
+
+@pytest.fixture(scope="module")
+def summary():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _build_summary_for_ai(make_synthetic_frame(5_000))
+
+
+def _minimal_tokens(summary, keys) -> int:
+    # Every table and mapping shortened to MIN_DOCUMENT_ROWS rows
+    keep = {key: None if SUMMARY_DOCUMENTS[key]["kind"] == "value" else MIN_DOCUMENT_ROWS for key in keys}
+    return count_tokens("\n\n".join(_encode_document(key, summary[key], keep[key]) for key in keys))
+
+
+@pytest.mark.parametrize("section", REPORT_SECTIONS, ids=[section["name"] for section in REPORT_SECTIONS])
+@pytest.mark.parametrize("token_budget", [5_000, 800, 300, 100])
+def test_slice_summary_fits_the_budget_in_summary_keys_order(summary, section, token_budget):
+    wanted = [key for key in section["summary_keys"] if key in summary]
+    text, tokens, keys = _slice_summary(summary, section["summary_keys"] + ["not_a_document"], token_budget)
+
+    assert tokens == count_tokens(text)
+    # Documents are only dropped from the end, and sent in summary_keys order
+    assert keys == wanted[:len(keys)]
+    assert re.findall(r"^\[(\w+)\]", text, flags=re.MULTILINE) == keys
+    # Over budget only when even the first document at its minimum does not fit
+    assert tokens <= max(token_budget, _minimal_tokens(summary, keys[:1]))
+
+
+def test_slice_summary_shortens_tables_before_dropping_documents(summary):
+    keys = REPORT_SECTIONS[0]["summary_keys"]
+    full, full_tokens, sent = _slice_summary(summary, keys, 10**6)
+    assert sent == keys and "rows shown)" not in full
+
+    minimal = _minimal_tokens(summary, keys)
+    assert minimal < full_tokens
+    text, tokens, sent = _slice_summary(summary, keys, minimal)
+    assert sent == keys and tokens <= minimal and "rows shown)" in text
+
+    text, tokens, sent = _slice_summary(summary, keys, minimal - 1)
+    assert sent == keys[:-1] and tokens < minimal
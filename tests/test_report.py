@@ -0,0 +1,112 @@
+import re
+
+import pytest
+
+import llm_client
+from benchmark import make_synthetic_frame
+from llm_client import REPORT_SECTIONS, LLMClient, generate_ai_report
+
+HEADINGS = [re.search(r'Use the heading "([^"]+)"', s["instructions"]).group(1) for s in REPORT_SECTIONS]
+
+
+@pytest.fixture(scope="module")
+def sales_frame():
+    return make_synthetic_frame(2_000)
+
+
+@pytest.fixture
+def llm(openai_client, monkeypatch, tmp_path):
+    # Shared client against the stub, response cache in the test's directory
+    client = LLMClient(openai_client, requests_per_minute=None, sleep=lambda seconds: None)
+    monkeypatch.setattr(llm_client, "_llm_client", client)
+    monkeypatch.setattr(llm_client, "LLM_CACHE_DIR", tmp_path / "llm_cache")
+    monkeypatch.chdir(tmp_path)
+    return client
+
+
+def headings_in(report: str) -> list:
+    return [line for line in report.splitlines() if line in HEADINGS]
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_sections_are_written_in_configured_order(llm, stub_server, sales_frame, tmp_path, stream):
+    # The first section is answered last, the report keeps the configured order regardless
+    stub_server.delay = lambda body: 0.5 if HEADINGS[0] in str(body) else 0.0
+    output = tmp_path / "report.md"
+    generate_ai_report(sales_frame, output_file=str(output), max_concurrency=len(REPORT_SECTIONS), stream=stream)
+
+    report = output.read_text(encoding="utf-8")
+    assert report.startswith(f"# {llm_client.REPORT_TITLE}")
+    assert headings_in(report) == HEADINGS
+    assert len(stub_server.requests) == len(REPORT_SECTIONS)
+    # The section with input images goes through the Responses API, all others through chat
+    assert sum("input" in body for _, body in stub_server.requests) == sum(
+        bool(s["input_images"]) for s in REPORT_SECTIONS
+    )
+    assert "chart_01_year_volume_yoy.png" in report
+
+
+def test_second_run_is_served_from_the_cache(llm, stub_server, sales_frame, tmp_path):
+    output = tmp_path / "report.md"
+    generate_ai_report(sales_frame, output_file=str(output))
+    first = output.read_text(encoding="utf-8")
+    assert len(stub_server.requests) == len(REPORT_SECTIONS)
+
+    generate_ai_report(sales_frame, output_file=str(output))
+    assert len(stub_server.requests) == len(REPORT_SECTIONS)
+    assert output.read_text(encoding="utf-8") == first
+
+    generate_ai_report(sales_frame, output_file=str(output), force_refresh=[REPORT_SECTIONS[0]["name"]])
+    assert len(stub_server.requests) == len(REPORT_SECTIONS) + 1
+
+    generate_ai_report(sales_frame, output_file=str(output), use_cache=False)
+    assert len(stub_server.requests) == 2 * len(REPORT_SECTIONS) + 1
+
+
+def test_failed_section_is_reported_and_not_cached(llm, stub_server, sales_frame, tmp_path):
+    # One after another, so the client error hits the first section
+    stub_server.script("400")
+    output = tmp_path / "report.md"
+    generate_ai_report(sales_frame, output_file=str(output), max_concurrency=1)
+
+    report = output.read_text(encoding="utf-8")
+    assert f"## {REPORT_SECTIONS[0]['name']}\n\n_Generation failed: " in report
+    assert headings_in(report) == HEADINGS[1:]
+    assert len(stub_server.requests) == len(REPORT_SECTIONS)
+
+    # Only the failed section is requested again
+    generate_ai_report(sales_frame, output_file=str(output), max_concurrency=1)
+    assert len(stub_server.requests) == len(REPORT_SECTIONS) + 1
+    assert headings_in(output.read_text(encoding="utf-8")) == HEADINGS
+
+
+def test_transient_failure_of_one_section_is_retried(llm, stub_server, sales_frame, tmp_path):
+    stub_server.script("503", "429")
+    output = tmp_path / "report.md"
+    generate_ai_report(sales_frame, output_file=str(output))
+
+    assert headings_in(output.read_text(encoding="utf-8")) == HEADINGS
+    assert len(stub_server.requests) == len(REPORT_SECTIONS) + 2
+    assert llm.breaker.state == "closed"
+
+
+def test_refreshed_report_bypasses_the_cache(llm, stub_server, sales_frame, tmp_path):
+    from analyzer import _build_summary_for_ai
+    from pipeline import _report
+
+    section = REPORT_SECTIONS[1]["name"]
+    run = {
+        "results": {"frame": sales_frame, "ai_summary": _build_summary_for_ai(sales_frame)},
+        "sections": {section},
+        "refresh_report": False,
+    }
+    _report(run)
+    _report(run)
+    assert len(stub_server.requests) == 1
+    run["refresh_report"] = True
+    _report(run)
+    assert len(stub_server.requests) == 2
+    # The regenerated text is cached again
+    run["refresh_report"] = False
+    _report(run)
+    assert len(stub_server.requests) == 2
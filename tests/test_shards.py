@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+import shards
+from aggregations import get_aggregates
+from benchmark import make_synthetic_frame
+
+TABLES = [["Year"], ["Model"], ["Region"], ["Year", "Region"], ["Model", "Engine_Size_L"]]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    df = make_synthetic_frame(5_000)
+    # As data_loader._apply_schema stores an integer column with schema violations
+    df["Year"] = df["Year"].astype("Int16")
+    df.loc[11, "Year"] = pd.NA
+    return df
+
+
+def test_seed_sharded_matches_a_single_process_run(frame, monkeypatch, caplog):
+    monkeypatch.setattr(shards, "MIN_SHARD_ROWS", 1_000)
+    single = get_aggregates(frame)
+    sharded_frame = frame.copy()
+    with caplog.at_level("INFO", logger="shards"):
+        sharded = shards.seed_sharded(sharded_frame, workers=2)
+
+    assert "in 2 shards with 2 workers" in caplog.text
+    assert sharded is get_aggregates(sharded_frame)
+    assert sharded.row_count() == single.row_count() == len(frame)
+    for dims in TABLES:
+        for valid_only in (False, True):
+            pd.testing.assert_frame_equal(
+                sharded.table(dims, valid_only), single.table(dims, valid_only), check_exact=False, rtol=1e-12
+            )
+    pd.testing.assert_frame_equal(sharded.correlation(), single.correlation(), check_exact=False, rtol=1e-9)
+    for by in ("Model", "Region"):
+        pd.testing.assert_frame_equal(
+            sharded.regression("Price_USD", "Mileage_KM", by),
+            single.regression("Price_USD", "Mileage_KM", by),
+            check_exact=False, rtol=1e-9,
+        )
+    pd.testing.assert_series_equal(
+        sharded.describe("Price_USD"), single.describe("Price_USD"), check_exact=False, rtol=1e-12
+    )
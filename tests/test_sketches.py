@@ -0,0 +1,70 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from sketches import MAX_EXACT_VALUES, QuantileSketch
+
+QUANTILES = [0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0]
+
+
+@pytest.fixture(scope="module")
+def skewed_sample():
+    # Long right tail (prices, mileages), a few zeros and negative values (mirrored buckets)
+    rng = np.random.default_rng(7)
+    values = np.concatenate([rng.lognormal(10, 1.2, 20_000), np.zeros(300), -rng.lognormal(3, 1, 500)])
+    return rng.permutation(values)
+
+
+def _assert_within(sketch: QuantileSketch, values: np.ndarray) -> None:
+    # A bucket sketch reports the value at rank floor(q × (n - 1)), i.e. NumPy's "lower" quantile
+    exact = np.quantile(values, QUANTILES, method="lower")
+    approx = np.array(sketch.quantiles(QUANTILES))
+    assert np.all(np.abs(approx - exact) <= sketch.relative_accuracy * np.abs(exact) * (1 + 1e-9))
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.01, 0.05])
+def test_quantiles_are_within_the_relative_accuracy(skewed_sample, relative_accuracy):
+    sketch = QuantileSketch(relative_accuracy).add(skewed_sample)
+    assert sketch.exact is None
+    assert sketch.count == len(skewed_sample)
+    _assert_within(sketch, skewed_sample)
+
+
+def test_merged_sketches_are_within_the_relative_accuracy(skewed_sample):
+    # Uneven parts, one of them empty
+    parts = np.split(skewed_sample, [0, 10, 5_000, 5_001, 17_000])
+    merged = QuantileSketch()
+    for part in parts:
+        merged = merged.merge(QuantileSketch().add(part))
+
+    whole = QuantileSketch().add(skewed_sample)
+    assert merged.quantiles(QUANTILES) == whole.quantiles(QUANTILES)
+    assert (merged.count, merged.min, merged.max) == (whole.count, whole.min, whole.max)
+    _assert_within(merged, skewed_sample)
+
+
+def test_merge_is_order_independent(skewed_sample):
+    sketches = [QuantileSketch().add(part) for part in np.array_split(skewed_sample, 4)]
+    results = set()
+    for order in itertools.permutations(sketches):
+        merged = order[0]
+        for sketch in order[1:]:
+            merged = merged.merge(sketch)
+        results.add((
+            tuple(sorted(merged.positive.items())), tuple(sorted(merged.negative.items())),
+            merged.zero_count, merged.count, merged.min, merged.max, tuple(merged.quantiles(QUANTILES)),
+        ))
+    assert len(results) == 1
+
+
+def test_low_cardinality_quantiles_are_exact():
+    years = np.random.default_rng(3).integers(2020, 2025, 10_000).astype("float64")
+    assert len(np.unique(years)) <= MAX_EXACT_VALUES
+    halves = QuantileSketch().add(years[:3_000]).merge(QuantileSketch().add(years[3_000:]))
+    np.testing.assert_array_equal(halves.quantiles(QUANTILES), np.quantile(years, QUANTILES))
+
+
+def test_sketches_of_different_accuracy_do_not_merge():
+    with pytest.raises(ValueError, match="different accuracy"):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregations import SalesAggregates, get_aggregates
+from benchmark import make_synthetic_frame
+from slices import aggregate_slices, get_slices
+
+
+@pytest.fixture(scope="module")
+def sales_frame():
+    df = make_synthetic_frame(20_000)
+    # Missing and zero volumes, so that all rows and valid rows differ
+    df["Sales_Volume"] = df["Sales_Volume"].astype("float64")
+    df.loc[df.index[::97], "Sales_Volume"] = np.nan
+    df.loc[df.index[::89], "Sales_Volume"] = 0
+    return df
+
+
+def test_single_scan_matches_aggregates_of_each_slice(sales_frame):
+    slices = get_slices(sales_frame, ["Region"], ["Model=X5,X6 Year=2022.."])
+    partials = aggregate_slices(sales_frame, slices, block_rows=4_096)
+    labels = get_aggregates(sales_frame).labels()
+
+    assert list(partials) == [s["name"] for s in slices]
+    for s in slices:
+        mask = np.ones(len(sales_frame), dtype=bool)
+        for dim, value in s["filters"].items():
+            column = sales_frame[dim]
+            if isinstance(value, tuple):
+                mask &= (column >= value[0]).to_numpy()
+            else:
+                mask &= column.isin(value if isinstance(value, list) else [value]).to_numpy()
+        rows = sales_frame[mask]
+        expected = SalesAggregates(rows, labels=labels).detach()
+        partial = partials[s["name"]]
+
+        assert partial.row_count() == len(rows) == s["rows"]
+        for valid_only in (False, True):
+            pd.testing.assert_frame_equal(
+                partial.table(["Year", "Model"], valid_only), expected.table(["Year", "Model"], valid_only)
+            )
+            pd.testing.assert_frame_equal(partial.correlation(valid_only), expected.correlation(valid_only))
+            pd.testing.assert_frame_equal(
+                partial.regression("Price_USD", "Mileage_KM", "Region", valid_only),
+                expected.regression("Price_USD", "Mileage_KM", "Region", valid_only),
+            )
+            pd.testing.assert_series_equal(
+                partial.describe("Revenue_USD", valid_only), expected.describe("Revenue_USD", valid_only)
+            )
+            pd.testing.assert_frame_equal(
+                partial.distribution("Price_USD", "Model", valid_only),
+                expected.distribution("Price_USD", "Model", valid_only),
+            )
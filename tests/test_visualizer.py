@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from benchmark import make_synthetic_frame
+import visualizer
+from visualizer import plot_all_charts
+
+
+@pytest.fixture(scope="module")
+def sales_frame():
+    return make_synthetic_frame(2_000)
+
+
+def test_charts_render_in_spawned_process_pool(sales_frame, tmp_path):
+    results = plot_all_charts(sales_frame, parallel=True, max_workers=2, charts=[1, 6], output_dir=str(tmp_path))
+    assert [(r["chart"], r["status"]) for r in results] == [(1, "ok"), (6, "ok")]
+    # Rendered in the workers, not in this process
+    assert all(r["metrics"]["pid"] != os.getpid() for r in results)
+    assert all(os.path.getsize(r["file"]) > 0 for r in results)
+
+
+def test_unchanged_charts_are_skipped_unless_forced(sales_frame, tmp_path):
+    first = plot_all_charts(sales_frame, charts=[6], output_dir=str(tmp_path))
+    again = plot_all_charts(sales_frame, charts=[6], output_dir=str(tmp_path))
+    forced = plot_all_charts(sales_frame, charts=[6], output_dir=str(tmp_path), force=True)
+    assert [r["status"] for r in first + again + forced] == ["ok", "skipped", "ok"]
+
+
+def test_slice_charts_carry_the_slice_in_their_title(sales_frame, tmp_path, monkeypatch):
+    titles = []
+    title = visualizer.plt.title
+    monkeypatch.setattr(visualizer.plt, "title", lambda text, *args, **kwargs: titles.append(text) or title(text))
+    rows = sales_frame[sales_frame["Year"] >= 2022]
+
+    plot_all_charts(rows, charts=[1, 3], output_dir=str(tmp_path / "all"))
+    plot_all_charts(rows, charts=[1, 3], output_dir=str(tmp_path / "slice"), title_suffix="Year=2022..")
+    assert titles == [
+        "BMW Global Sales Volume & YoY Growth (2022–2024)",
+        "Top 10 Models by Sales Volume",
+        "BMW Sales Volume & YoY Growth (2022–2024) — Year=2022..",
+        "Top 10 Models by Sales Volume — Year=2022..",
+    ]
+    # The suffix is part of the fingerprint, a renamed slice is rendered again
+    again = plot_all_charts(rows, charts=[3], output_dir=str(tmp_path / "slice"), title_suffix="Recent years")
+    assert [r["status"] for r in again] == ["ok"]
+
+
+def test_changed_chart_style_renders_charts_again(sales_frame, tmp_path, monkeypatch):
+    plot_all_charts(sales_frame, charts=[3], output_dir=str(tmp_path))
+
+    def _title(text, title_suffix):
+        return f"{text} | {title_suffix}" if title_suffix else text
+
+    helpers = (visualizer._apply_chart_style, _title, visualizer._year_range)
+    monkeypatch.setattr(visualizer, "CHART_STYLE_HELPERS", helpers)
+    restyled = plot_all_charts(sales_frame, charts=[3], output_dir=str(tmp_path))
+    monkeypatch.setattr(visualizer, "CHART_STYLE_VERSION", visualizer.CHART_STYLE_VERSION + 1)
+    bumped = plot_all_charts(sales_frame, charts=[3], output_dir=str(tmp_path))
+    again = plot_all_charts(sales_frame, charts=[3], output_dir=str(tmp_path))
+    assert [r["status"] for r in restyled + bumped + again] == ["ok", "ok", "skipped"]
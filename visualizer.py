@@ -1,14 +1,534 @@
+import hashlib
 import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional
+
+import matplotlib
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 
+from aggregations import get_aggregates
+from profiler import get_profiler, measure
+from sampling import get_sample
+
 logger = logging.getLogger(__name__)
 
 
-def plot_all_charts(df: pd.DataFrame) -> None:
+def _apply_chart_style() -> None:
+    sns.set(style="whitegrid", font_scale=1.1)
+
+
+# ---------------------------------------------------------------------------
+# Data preparation: each function receives the shared aggregates (and, for the row-level chart,
+# the shared stratified sample) and returns the small, pre-aggregated data its chart needs.
+# They run in the parent process; only their result is sent to a render worker.
+# ---------------------------------------------------------------------------
+
+
+def _prepare_year_volume(agg, sample: Optional[pd.DataFrame]) -> pd.DataFrame:
+    yearly = (
+        agg.table(["Year"])[["Year", "Total_Sales_Volume"]]
+        .rename(columns={"Total_Sales_Volume": "Sales_Volume"})
+    )
+    yearly["YoY_growth_%"] = yearly["Sales_Volume"].pct_change() * 100
+    return yearly
+
+
+def _prepare_year_revenue(agg, sample: Optional[pd.DataFrame]) -> pd.DataFrame:
+    return agg.table(["Year"])
+
+
+def _prepare_model_table(agg, sample: Optional[pd.DataFrame]) -> pd.DataFrame:
+    return agg.table(["Model"])
+
+
+def _prepare_region_table(agg, sample: Optional[pd.DataFrame]) -> pd.DataFrame:
+    return agg.table(["Region"])
+
+
+def _prepare_year_region_pivot(agg, sample: Optional[pd.DataFrame]) -> pd.DataFrame:
+    return agg.table(["Year", "Region"]).pivot(
+        index="Region", columns="Year", values="Total_Sales_Volume"
+    )
+
+
+def _prepare_price_histogram(agg, sample: Optional[pd.DataFrame]) -> pd.DataFrame:
+    return agg.histogram("Price_USD", bins=40)
+
+
+def _prepare_engine_price(agg, sample: Optional[pd.DataFrame]) -> pd.DataFrame:
+    return (
+        agg.table(["Engine_Size_L"])[["Engine_Size_L", "Avg_Price_USD"]]
+        .rename(columns={"Avg_Price_USD": "Price_USD"})
+    )
+
+
+def _prepare_mileage_sample(agg, sample: Optional[pd.DataFrame]) -> pd.DataFrame:
+    # Shared stratified sample (every Model × Region combination is represented)
+    return sample[["Mileage_KM", "Price_USD"]]
+
+
+# ---------------------------------------------------------------------------
+# Rendering: each function draws one chart from its prepared data and saves it.
+# They only use module-level state, so they can run in a worker process.
+# `title_suffix` names the data a chart covers when it is not the whole frame (e.g. a slice).
+# ---------------------------------------------------------------------------
+
+
+def _title(text: str, title_suffix: Optional[str]) -> str:
+    return f"{text} — {title_suffix}" if title_suffix else text
+
+
+def _year_range(years: pd.Series) -> str:
+    return f"{years.min()}–{years.max()}"
+
+
+def _render_year_volume_yoy(yearly: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    fig, ax1 = plt.subplots(figsize=(8, 4))
+    ax1.bar(yearly["Year"], yearly["Sales_Volume"], color="#4C72B0", alpha=0.7)
+    ax1.set_ylabel("Total Sales Volume")
+
+    ax2 = ax1.twinx()
+    ax2.plot(
+        yearly["Year"],
+        yearly["YoY_growth_%"],
+        color="#DD8452",
+        marker="o",
+    )
+    ax2.set_ylabel("YoY Growth (%)")
+    scope = "BMW Global" if not title_suffix else "BMW"
+    plt.title(_title(f"{scope} Sales Volume & YoY Growth ({_year_range(yearly['Year'])})", title_suffix))
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close(fig)
+
+
+def _render_year_revenue_asp(yearly_rev: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    fig, ax1 = plt.subplots(figsize=(8, 4))
+    ax1.bar(
+        yearly_rev["Year"],
+        yearly_rev["Total_Revenue_USD"] / 1e9,
+        color="#55A868",
+        alpha=0.7,
+    )
+    ax1.set_ylabel("Total Revenue (billion USD)")
+
+    ax2 = ax1.twinx()
+    ax2.plot(
+        yearly_rev["Year"],
+        yearly_rev["Weighted_ASP_USD"],
+        color="#C44E52",
+        marker="o",
+    )
+    ax2.set_ylabel("Weighted ASP (USD)")
+    plt.title(_title(f"BMW Revenue & Weighted ASP ({_year_range(yearly_rev['Year'])})", title_suffix))
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close(fig)
+
+
+def _render_model_top10_volume(model_agg: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    top_models_by_vol = model_agg.sort_values(
+        "Total_Sales_Volume", ascending=False
+    ).head(10)
+    plt.figure(figsize=(8, 4))
+    sns.barplot(
+        data=top_models_by_vol,
+        x="Total_Sales_Volume",
+        y="Model",
+        palette="Blues_r",
+    )
+    plt.title(_title("Top 10 Models by Sales Volume", title_suffix))
+    plt.xlabel("Total Sales Volume")
+    plt.ylabel("Model")
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def _render_model_top10_revenue(model_agg: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    top_models_by_rev = model_agg.sort_values(
+        "Total_Revenue_USD", ascending=False
+    ).head(10)
+    plt.figure(figsize=(8, 4))
+    sns.barplot(
+        data=top_models_by_rev,
+        x="Total_Revenue_USD",
+        y="Model",
+        palette="Greens_r",
+    )
+    plt.title(_title("Top 10 Models by Revenue", title_suffix))
+    plt.xlabel("Total Revenue (USD)")
+    plt.ylabel("Model")
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def _render_model_weighted_asp(model_agg: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    plt.figure(figsize=(8, 4))
+    sns.barplot(
+        data=model_agg.sort_values("Weighted_ASP_USD", ascending=False),
+        x="Weighted_ASP_USD",
+        y="Model",
+        palette="Purples_r",
+    )
+    plt.title(_title("Weighted ASP by Model", title_suffix))
+    plt.xlabel("Weighted ASP (USD)")
+    plt.ylabel("Model")
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def _render_region_volume(region_agg: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    plt.figure(figsize=(7, 4))
+    sns.barplot(
+        data=region_agg.sort_values("Total_Sales_Volume", ascending=False),
+        x="Region",
+        y="Total_Sales_Volume",
+        palette="Blues",
+    )
+    plt.title(_title("Total Sales Volume by Region", title_suffix))
+    plt.xlabel("Region")
+    plt.ylabel("Total Sales Volume")
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def _render_region_revenue(region_agg: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    plt.figure(figsize=(7, 4))
+    sns.barplot(
+        data=region_agg.sort_values("Total_Revenue_USD", ascending=False),
+        x="Region",
+        y="Total_Revenue_USD",
+        palette="Greens",
+    )
+    plt.title(_title("Total Revenue by Region", title_suffix))
+    plt.xlabel("Region")
+    plt.ylabel("Total Revenue (USD)")
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def _render_region_weighted_asp(region_agg: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    plt.figure(figsize=(7, 4))
+    sns.barplot(
+        data=region_agg.sort_values("Weighted_ASP_USD", ascending=False),
+        x="Region",
+        y="Weighted_ASP_USD",
+        palette="Oranges",
+    )
+    plt.title(_title("Weighted ASP by Region", title_suffix))
+    plt.xlabel("Region")
+    plt.ylabel("Weighted ASP (USD)")
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def _render_year_region_heatmap(pivot: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    plt.figure(figsize=(8, 4))
+    sns.heatmap(
+        pivot,
+        annot=False,
+        cmap="YlGnBu",
+        fmt=".0f",
+    )
+    plt.title(_title("Sales Volume Heatmap by Year & Region", title_suffix))
+    plt.xlabel("Year")
+    plt.ylabel("Region")
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def _render_price_distribution(histogram: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    # Drawn from the pre-binned counts (one weighted point per bin centre); the KDE is weighted too
+    plt.figure(figsize=(7, 4))
+    sns.histplot(
+        x=(histogram["bin_left"] + histogram["bin_right"]).to_numpy() / 2,
+        weights=histogram["Count"].to_numpy(),
+        bins=len(histogram),
+        binrange=(histogram["bin_left"].iloc[0], histogram["bin_right"].iloc[-1]),
+        kde=True,
+        color="#4C72B0",
+    )
+    plt.title(_title("Price Distribution (USD)", title_suffix))
+    plt.xlabel("Price (USD)")
+    plt.ylabel("Count")
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def _render_engine_size_vs_price(engine_price: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    plt.figure(figsize=(8, 4))
+    sns.lineplot(
+        data=engine_price,
+        x="Engine_Size_L",
+        y="Price_USD",
+        marker="o",
+        color="#DD8452",
+    )
+    plt.title(_title("Average Price by Engine Size", title_suffix))
+    plt.xlabel("Engine Size (L)")
+    plt.ylabel("Average Price (USD)")
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def _render_mileage_vs_price(sample: pd.DataFrame, output_path: str, title_suffix: Optional[str] = None) -> None:
+    plt.figure(figsize=(8, 4))
+    sns.scatterplot(
+        data=sample,
+        x="Mileage_KM",
+        y="Price_USD",
+        alpha=0.3,
+    )
+    plt.title(_title("Mileage vs Price (Sampled)", title_suffix))
+    plt.xlabel("Mileage (KM)")
+    plt.ylabel("Price (USD)")
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+# Chart jobs in output order: number, output file, required columns, description, shared
+# aggregates the data preparation reads (pipeline.py tasks), data preparation (parent process)
+# and rendering (parent or worker process)
+CHART_JOBS = [
+    {
+        "number": 1,
+        "file": "chart_01_year_volume_yoy.png",
+        "requires": {"Year", "Sales_Volume"},
+        "description": "Annual total sales + YoY growth",
+        "needs": ("cubes",),
+        "prepare": _prepare_year_volume,
+        "render": _render_year_volume_yoy,
+    },
+    {
+        "number": 2,
+        "file": "chart_02_year_revenue_asp.png",
+        "requires": {"Year", "Sales_Volume", "Price_USD"},
+        "description": "Annual total revenue + weighted ASP",
+        "needs": ("cubes",),
+        "prepare": _prepare_year_revenue,
+        "render": _render_year_revenue_asp,
+    },
+    {
+        "number": 3,
+        "file": "chart_03_model_top10_volume.png",
+        "requires": {"Model", "Sales_Volume", "Price_USD"},
+        "description": "Top 10 models by sales volume",
+        "needs": ("cubes",),
+        "prepare": _prepare_model_table,
+        "render": _render_model_top10_volume,
+    },
+    {
+        "number": 4,
+        "file": "chart_04_model_top10_revenue.png",
+        "requires": {"Model", "Sales_Volume", "Price_USD"},
+        "description": "Top 10 models by revenue",
+        "needs": ("cubes",),
+        "prepare": _prepare_model_table,
+        "render": _render_model_top10_revenue,
+    },
+    {
+        "number": 5,
+        "file": "chart_05_model_weighted_asp.png",
+        "requires": {"Model", "Sales_Volume", "Price_USD"},
+        "description": "Weighted ASP by model",
+        "needs": ("cubes",),
+        "prepare": _prepare_model_table,
+        "render": _render_model_weighted_asp,
+    },
+    {
+        "number": 6,
+        "file": "chart_06_region_volume.png",
+        "requires": {"Region", "Sales_Volume", "Price_USD"},
+        "description": "Sales volume by region",
+        "needs": ("cubes",),
+        "prepare": _prepare_region_table,
+        "render": _render_region_volume,
+    },
+    {
+        "number": 7,
+        "file": "chart_07_region_revenue.png",
+        "requires": {"Region", "Sales_Volume", "Price_USD"},
+        "description": "Revenue by region",
+        "needs": ("cubes",),
+        "prepare": _prepare_region_table,
+        "render": _render_region_revenue,
+    },
+    {
+        "number": 8,
+        "file": "chart_08_region_weighted_asp.png",
+        "requires": {"Region", "Sales_Volume", "Price_USD"},
+        "description": "Weighted ASP by region",
+        "needs": ("cubes",),
+        "prepare": _prepare_region_table,
+        "render": _render_region_weighted_asp,
+    },
+    {
+        "number": 9,
+        "file": "chart_09_year_region_heatmap.png",
+        "requires": {"Year", "Region", "Sales_Volume"},
+        "description": "Year × Region sales volume heatmap",
+        "needs": ("cubes",),
+        "prepare": _prepare_year_region_pivot,
+        "render": _render_year_region_heatmap,
+    },
+    {
+        "number": 12,
+        "file": "chart_12_price_distribution.png",
+        "requires": {"Price_USD"},
+        "description": "Price distribution histogram + KDE",
+        "needs": ("aggregates",),
+        "prepare": _prepare_price_histogram,
+        "render": _render_price_distribution,
+    },
+    {
+        "number": 13,
+        "file": "chart_13_engine_size_vs_price.png",
+        "requires": {"Engine_Size_L", "Price_USD"},
+        "description": "Engine size vs average price",
+        "needs": ("cubes",),
+        "prepare": _prepare_engine_price,
+        "render": _render_engine_size_vs_price,
+    },
+    {
+        "number": 14,
+        "file": "chart_14_mileage_vs_price.png",
+        "requires": {"Mileage_KM", "Price_USD"},
+        "description": "Mileage vs price scatter plot",
+        "needs": ("sample",),
+        "prepare": _prepare_mileage_sample,
+        "render": _render_mileage_vs_price,
+    },
+]
+
+
+# Sidecar written next to each chart: `<chart file>` + FINGERPRINT_SUFFIX
+FINGERPRINT_SUFFIX = ".fingerprint"
+
+# Bump when the look of the charts changes outside the render functions and CHART_STYLE_HELPERS
+# (e.g. matplotlib rc settings made elsewhere), so that every chart is redrawn
+CHART_STYLE_VERSION = 1
+
+# Shared plotting helpers the render functions call; their code is part of every fingerprint
+CHART_STYLE_HELPERS = (_apply_chart_style, _title, _year_range)
+
+
+def _update_with_code(digest, func) -> None:
+    digest.update(func.__qualname__.encode("utf-8"))
+    digest.update(func.__code__.co_code)
+    digest.update(repr(func.__code__.co_consts).encode("utf-8"))
+
+
+def _chart_fingerprint(job: dict, data, title_suffix: Optional[str] = None) -> str:
+    """
+    Hash of everything that determines a chart's pixels: the exact pre-aggregated data
+    (values, index, column names and dtypes), the title suffix, the code of the render function
+    and of the shared CHART_STYLE_HELPERS (title, year range, seaborn style), CHART_STYLE_VERSION
+    and the plotting library versions.
+    """
+    digest = hashlib.sha256()
+    _update_with_code(digest, job["render"])
+    for helper in CHART_STYLE_HELPERS:
+        _update_with_code(digest, helper)
+    digest.update(f"title_suffix={title_suffix or ''}".encode("utf-8"))
+    digest.update(f"style_version={CHART_STYLE_VERSION}".encode("utf-8"))
+    digest.update(f"matplotlib={matplotlib.__version__};seaborn={sns.__version__}".encode("utf-8"))
+    if isinstance(data, pd.DataFrame):
+        digest.update(repr([(str(c), str(t)) for c, t in data.dtypes.items()]).encode("utf-8"))
+        digest.update(repr(list(data.columns.names) + list(data.index.names)).encode("utf-8"))
+    else:
+        digest.update(f"{getattr(data, 'name', None)}:{getattr(data, 'dtype', None)}".encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _read_fingerprint(output_path: str) -> Optional[str]:
+    try:
+        with open(output_path + FINGERPRINT_SUFFIX, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _write_fingerprint(output_path: str, fingerprint: str) -> None:
+    try:
+        with open(output_path + FINGERPRINT_SUFFIX, "w", encoding="utf-8") as f:
+            f.write(fingerprint + "\n")
+    except OSError as e:
+        logger.warning(f"Failed to write chart fingerprint ({output_path}): {e}")
+
+
+# Start method of the render processes (plot_all_charts(parallel=True)). Charts are rendered from
+# the pipeline's worker threads; a process forked from a multi-threaded parent can inherit a lock
+# held by another thread and deadlock, so the workers are spawned (at the cost of their imports).
+RENDER_START_METHOD = "spawn"
+
+
+def _init_render_worker() -> None:
+    """
+    Process pool initializer: non-interactive backend and the shared chart style.
+    """
+    matplotlib.use("Agg")
+    _apply_chart_style()
+
+
+def _run_chart_job(number: int, render, data, output_path: str, title_suffix: Optional[str] = None) -> dict:
+    """
+    Render one chart and report its outcome. Never raises, so that one failing chart
+    does not affect the others (in-process or in a worker). The timing/memory metrics
+    are measured where the chart is rendered and returned with the result.
+    """
+    with measure() as metrics:
+        try:
+            render(data, output_path, title_suffix)
+            status, error = "ok", None
+        except Exception as e:
+            plt.close("all")
+            status, error = "failed", f"{type(e).__name__}: {e}"
+    return {
+        "chart": number,
+        "file": output_path,
+        "status": status,
+        "seconds": metrics["wall_seconds"],
+        "error": error,
+        "metrics": metrics,
+    }
+
+
+def _log_chart_summary(results: list) -> None:
+    logger.info("Chart rendering summary:")
+    for result in results:
+        if result["status"] in ("ok", "skipped"):
+            logger.info(f"  chart {result['chart']:>2}  {result['seconds']:8.3f}s  {result['status']:<7} {result['file']}")
+        else:
+            logger.info(f"  chart {result['chart']:>2}  {result['seconds']:8.3f}s  {result['status']:<7} {result['error']}")
+
+
+def plot_all_charts(
+    df,
+    parallel: bool = False,
+    max_workers: Optional[int] = None,
+    force: bool = False,
+    charts: Optional[Iterable[int]] = None,
+    output_dir: Optional[str] = None,
+    sample: Optional[pd.DataFrame] = None,
+    title_suffix: Optional[str] = None,
+) -> list:
     """
-    Generate charts and save to current directory:
+    Generate charts and save to the current directory (or `output_dir`):
       1. Annual total sales + YoY growth (dual axis)
       2. Annual total revenue + weighted ASP
       3. Top 10 models by sales volume
@@ -21,368 +541,106 @@ def plot_all_charts(df: pd.DataFrame) -> None:
      12. Price distribution histogram + KDE
      13. Engine size vs average price
      14. Mileage vs price scatter plot
-    """
-    logger.info("Starting to generate all charts...")
-    sns.set(style="whitegrid", font_scale=1.1)
-    
-    chart_count = 0
-
-    # Chart 1: Annual total sales + YoY growth
-    if {"Year", "Sales_Volume"}.issubset(df.columns):
-        logger.debug("Generating chart 1: Annual total sales + YoY growth")
-        try:
-            yearly = (
-                df.groupby("Year")["Sales_Volume"]
-                .sum()
-                .reset_index()
-                .sort_values("Year")
-            )
-            yearly["YoY_growth_%"] = yearly["Sales_Volume"].pct_change() * 100
-
-            fig, ax1 = plt.subplots(figsize=(8, 4))
-            ax1.bar(yearly["Year"], yearly["Sales_Volume"], color="#4C72B0", alpha=0.7)
-            ax1.set_ylabel("Total Sales Volume")
-
-            ax2 = ax1.twinx()
-            ax2.plot(
-                yearly["Year"],
-                yearly["YoY_growth_%"],
-                color="#DD8452",
-                marker="o",
-            )
-            ax2.set_ylabel("YoY Growth (%)")
-            plt.title("BMW Global Sales Volume & YoY Growth (2020–2024)")
-            plt.tight_layout()
-            plt.savefig("chart_01_year_volume_yoy.png")
-            plt.close(fig)
-            chart_count += 1
-            logger.info("✓ Chart 1 generated successfully: chart_01_year_volume_yoy.png")
-        except Exception as e:
-            logger.error(f"Failed to generate chart 1: {e}", exc_info=True)
-
-    # Pre-calculate Revenue for subsequent revenue/ASP analysis
-    df_rev = df.copy()
-    if {"Price_USD", "Sales_Volume"}.issubset(df_rev.columns):
-        df_rev["Revenue_USD"] = df_rev["Price_USD"] * df_rev["Sales_Volume"]
 
-    # Chart 2: Annual total revenue + weighted ASP
-    if {"Year", "Sales_Volume", "Price_USD"}.issubset(df.columns):
-        logger.debug("Generating chart 2: Annual total revenue + weighted ASP")
-        try:
-            yearly_rev = (
-                df_rev.groupby("Year")
-                .agg(
-                    Total_Sales_Volume=("Sales_Volume", "sum"),
-                    Total_Revenue_USD=("Revenue_USD", "sum"),
-                )
-                .reset_index()
-                .sort_values("Year")
-            )
-            yearly_rev["Weighted_ASP_USD"] = (
-                yearly_rev["Total_Revenue_USD"]
-                / yearly_rev["Total_Sales_Volume"].clip(lower=1)
-            )
+    Each chart is an independent job (see CHART_JOBS): its data is pre-aggregated here from the
+    shared aggregates, then rendered either in this process or, with parallel=True, in a pool of
+    spawned processes (RENDER_START_METHOD) using the non-interactive Agg backend. Returns one result per chart (chart, file, status,
+    seconds, error, metrics); a failing chart is logged and does not stop the others.
 
-            fig, ax1 = plt.subplots(figsize=(8, 4))
-            ax1.bar(
-                yearly_rev["Year"],
-                yearly_rev["Total_Revenue_USD"] / 1e9,
-                color="#55A868",
-                alpha=0.7,
-            )
-            ax1.set_ylabel("Total Revenue (billion USD)")
-
-            ax2 = ax1.twinx()
-            ax2.plot(
-                yearly_rev["Year"],
-                yearly_rev["Weighted_ASP_USD"],
-                color="#C44E52",
-                marker="o",
-            )
-            ax2.set_ylabel("Weighted ASP (USD)")
-            plt.title("BMW Revenue & Weighted ASP (2020–2024)")
-            plt.tight_layout()
-            plt.savefig("chart_02_year_revenue_asp.png")
-            plt.close(fig)
-            chart_count += 1
-            logger.info("✓ Chart 2 generated successfully: chart_02_year_revenue_asp.png")
-        except Exception as e:
-            logger.error(f"Failed to generate chart 2: {e}", exc_info=True)
-
-    # Model aggregation: prepare for charts 3–5
-    model_agg = None
-    if {"Model", "Sales_Volume", "Price_USD"}.issubset(df.columns):
-        model_agg = (
-            df_rev.groupby("Model")
-            .agg(
-                Total_Sales_Volume=("Sales_Volume", "sum"),
-                Total_Revenue_USD=("Revenue_USD", "sum"),
-                Avg_Price_USD=("Price_USD", "mean"),
-            )
-            .reset_index()
-        )
-        model_agg["Weighted_ASP_USD"] = (
-            model_agg["Total_Revenue_USD"]
-            / model_agg["Total_Sales_Volume"].clip(lower=1)
-        )
-
-    # Chart 3: Top 10 models by sales volume
-    if model_agg is not None:
-        logger.debug("Generating chart 3: Top 10 models by sales volume")
-        try:
-            top_models_by_vol = model_agg.sort_values(
-                "Total_Sales_Volume", ascending=False
-            ).head(10)
-            plt.figure(figsize=(8, 4))
-            sns.barplot(
-                data=top_models_by_vol,
-                x="Total_Sales_Volume",
-                y="Model",
-                palette="Blues_r",
-            )
-            plt.title("Top 10 Models by Sales Volume")
-            plt.xlabel("Total Sales Volume")
-            plt.ylabel("Model")
-            plt.tight_layout()
-            plt.savefig("chart_03_model_top10_volume.png")
-            plt.close()
-            chart_count += 1
-            logger.info("✓ Chart 3 generated successfully: chart_03_model_top10_volume.png")
-        except Exception as e:
-            logger.error(f"Failed to generate chart 3: {e}", exc_info=True)
-
-    # Chart 4: Top 10 models by revenue
-    if model_agg is not None:
-        logger.debug("Generating chart 4: Top 10 models by revenue")
-        try:
-            top_models_by_rev = model_agg.sort_values(
-                "Total_Revenue_USD", ascending=False
-            ).head(10)
-            plt.figure(figsize=(8, 4))
-            sns.barplot(
-                data=top_models_by_rev,
-                x="Total_Revenue_USD",
-                y="Model",
-                palette="Greens_r",
-            )
-            plt.title("Top 10 Models by Revenue")
-            plt.xlabel("Total Revenue (USD)")
-            plt.ylabel("Model")
-            plt.tight_layout()
-            plt.savefig("chart_04_model_top10_revenue.png")
-            plt.close()
-            chart_count += 1
-            logger.info("✓ Chart 4 generated successfully: chart_04_model_top10_revenue.png")
-        except Exception as e:
-            logger.error(f"Failed to generate chart 4: {e}", exc_info=True)
+    A fingerprint of each chart's input data and plotting code is stored next to the PNG; charts
+    whose fingerprint is unchanged are skipped (status "skipped") unless force=True.
+    `charts` limits the run to the given chart numbers.
 
-    # Chart 5: Weighted ASP by model
-    if model_agg is not None:
-        logger.debug("Generating chart 5: Weighted ASP by model")
-        try:
-            plt.figure(figsize=(8, 4))
-            sns.barplot(
-                data=model_agg.sort_values("Weighted_ASP_USD", ascending=False),
-                x="Weighted_ASP_USD",
-                y="Model",
-                palette="Purples_r",
-            )
-            plt.title("Weighted ASP by Model")
-            plt.xlabel("Weighted ASP (USD)")
-            plt.ylabel("Model")
-            plt.tight_layout()
-            plt.savefig("chart_05_model_weighted_asp.png")
-            plt.close()
-            chart_count += 1
-            logger.info("✓ Chart 5 generated successfully: chart_05_model_weighted_asp.png")
-        except Exception as e:
-            logger.error(f"Failed to generate chart 5: {e}", exc_info=True)
-
-    # Regional aggregation: prepare for charts 6–8 and chart 9
-    region_agg = None
-    if {"Region", "Sales_Volume", "Price_USD"}.issubset(df.columns):
-        region_agg = (
-            df_rev.groupby("Region")
-            .agg(
-                Total_Sales_Volume=("Sales_Volume", "sum"),
-                Total_Revenue_USD=("Revenue_USD", "sum"),
-                Avg_Price_USD=("Price_USD", "mean"),
-            )
-            .reset_index()
-        )
-        region_agg["Weighted_ASP_USD"] = (
-            region_agg["Total_Revenue_USD"]
-            / region_agg["Total_Sales_Volume"].clip(lower=1)
-        )
-
-    # Chart 6: Sales volume by region
-    if region_agg is not None:
-        logger.debug("Generating chart 6: Sales volume by region")
-        try:
-            plt.figure(figsize=(7, 4))
-            sns.barplot(
-                data=region_agg.sort_values("Total_Sales_Volume", ascending=False),
-                x="Region",
-                y="Total_Sales_Volume",
-                palette="Blues",
-            )
-            plt.title("Total Sales Volume by Region")
-            plt.xlabel("Region")
-            plt.ylabel("Total Sales Volume")
-            plt.tight_layout()
-            plt.savefig("chart_06_region_volume.png")
-            plt.close()
-            chart_count += 1
-            logger.info("✓ Chart 6 generated successfully: chart_06_region_volume.png")
-        except Exception as e:
-            logger.error(f"Failed to generate chart 6: {e}", exc_info=True)
+    `df` may also be (frame-less) SalesAggregates, e.g. of one slice (see slices.py); the
+    row-level chart then needs the rows in `sample` (default: the shared sample of the frame)
+    and is left out without them. `output_dir` (created if missing) receives the chart files
+    instead of the current directory. `title_suffix` (e.g. the slice name) is appended to every
+    chart title; the year range of charts 1 and 2 always follows the data.
+    """
+    logger.info("Starting to generate all charts...")
+    _apply_chart_style()
+    agg = get_aggregates(df)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
 
-    # Chart 7: Revenue by region
-    if region_agg is not None:
-        logger.debug("Generating chart 7: Revenue by region")
+    results = []
+    tasks = []
+    fingerprints = {}
+    selected = set(charts) if charts is not None else None
+    for job in CHART_JOBS:
+        if selected is not None and job["number"] not in selected:
+            continue
+        if not job["requires"].issubset(agg.columns):
+            continue
+        rows = sample
+        if "sample" in job["needs"] and rows is None:
+            if not agg.has_frame:
+                logger.debug(f"Chart {job['number']} needs row-level data, skipped for frame-less aggregates")
+                continue
+            rows = get_sample(agg.df)
+        output_path = os.path.join(output_dir, job["file"]) if output_dir else job["file"]
+        logger.debug(f"Generating chart {job['number']}: {job['description']}")
         try:
-            plt.figure(figsize=(7, 4))
-            sns.barplot(
-                data=region_agg.sort_values("Total_Revenue_USD", ascending=False),
-                x="Region",
-                y="Total_Revenue_USD",
-                palette="Greens",
-            )
-            plt.title("Total Revenue by Region")
-            plt.xlabel("Region")
-            plt.ylabel("Total Revenue (USD)")
-            plt.tight_layout()
-            plt.savefig("chart_07_region_revenue.png")
-            plt.close()
-            chart_count += 1
-            logger.info("✓ Chart 7 generated successfully: chart_07_region_revenue.png")
+            data = job["prepare"](agg, rows)
         except Exception as e:
-            logger.error(f"Failed to generate chart 7: {e}", exc_info=True)
-
-    # Chart 8: Weighted ASP by region
-    if region_agg is not None:
-        logger.debug("Generating chart 8: Weighted ASP by region")
-        try:
-            plt.figure(figsize=(7, 4))
-            sns.barplot(
-                data=region_agg.sort_values("Weighted_ASP_USD", ascending=False),
-                x="Region",
-                y="Weighted_ASP_USD",
-                palette="Oranges",
+            logger.error(f"Failed to generate chart {job['number']}: {e}", exc_info=True)
+            results.append(
+                {"chart": job["number"], "file": output_path, "status": "failed", "seconds": 0.0, "error": str(e)}
             )
-            plt.title("Weighted ASP by Region")
-            plt.xlabel("Region")
-            plt.ylabel("Weighted ASP (USD)")
-            plt.tight_layout()
-            plt.savefig("chart_08_region_weighted_asp.png")
-            plt.close()
-            chart_count += 1
-            logger.info("✓ Chart 8 generated successfully: chart_08_region_weighted_asp.png")
-        except Exception as e:
-            logger.error(f"Failed to generate chart 8: {e}", exc_info=True)
-
-    # Chart 9: Year × Region sales volume heatmap
-    if {"Year", "Region", "Sales_Volume"}.issubset(df.columns):
-        logger.debug("Generating chart 9: Year × Region sales volume heatmap")
-        try:
-            pivot = (
-                df.groupby(["Year", "Region"])["Sales_Volume"]
-                .sum()
-                .reset_index()
-                .pivot(index="Region", columns="Year", values="Sales_Volume")
+            continue
+        fingerprint = _chart_fingerprint(job, data, title_suffix)
+        fingerprints[output_path] = fingerprint
+        if not force and os.path.exists(output_path) and _read_fingerprint(output_path) == fingerprint:
+            logger.debug(f"Chart {job['number']} inputs unchanged, skipping: {output_path}")
+            results.append(
+                {"chart": job["number"], "file": output_path, "status": "skipped", "seconds": 0.0, "error": None}
             )
-            plt.figure(figsize=(8, 4))
-            sns.heatmap(
-                pivot,
-                annot=False,
-                cmap="YlGnBu",
-                fmt=".0f",
-            )
-            plt.title("Sales Volume Heatmap by Year & Region")
-            plt.xlabel("Year")
-            plt.ylabel("Region")
-            plt.tight_layout()
-            plt.savefig("chart_09_year_region_heatmap.png")
-            plt.close()
-            chart_count += 1
-            logger.info("✓ Chart 9 generated successfully: chart_09_year_region_heatmap.png")
-        except Exception as e:
-            logger.error(f"Failed to generate chart 9: {e}", exc_info=True)
+            continue
+        tasks.append((job["number"], job["render"], data, output_path, title_suffix))
 
-    # Chart 12: Price distribution histogram + KDE
-    if "Price_USD" in df.columns:
-        logger.debug("Generating chart 12: Price distribution histogram + KDE")
-        try:
-            plt.figure(figsize=(7, 4))
-            sns.histplot(
-                df["Price_USD"],
-                bins=40,
-                kde=True,
-                color="#4C72B0",
-            )
-            plt.title("Price Distribution (USD)")
-            plt.xlabel("Price (USD)")
-            plt.ylabel("Count")
-            plt.tight_layout()
-            plt.savefig("chart_12_price_distribution.png")
-            plt.close()
-            chart_count += 1
-            logger.info("✓ Chart 12 generated successfully: chart_12_price_distribution.png")
-        except Exception as e:
-            logger.error(f"Failed to generate chart 12: {e}", exc_info=True)
-
-    # Chart 13: Engine size vs average price
-    if {"Engine_Size_L", "Price_USD"}.issubset(df.columns):
-        logger.debug("Generating chart 13: Engine size vs average price")
-        try:
-            engine_price = (
-                df.groupby("Engine_Size_L")["Price_USD"]
-                .mean()
-                .reset_index()
-                .sort_values("Engine_Size_L")
-            )
-            plt.figure(figsize=(8, 4))
-            sns.lineplot(
-                data=engine_price,
-                x="Engine_Size_L",
-                y="Price_USD",
-                marker="o",
-                color="#DD8452",
-            )
-            plt.title("Average Price by Engine Size")
-            plt.xlabel("Engine Size (L)")
-            plt.ylabel("Average Price (USD)")
-            plt.tight_layout()
-            plt.savefig("chart_13_engine_size_vs_price.png")
-            plt.close()
-            chart_count += 1
-            logger.info("✓ Chart 13 generated successfully: chart_13_engine_size_vs_price.png")
-        except Exception as e:
-            logger.error(f"Failed to generate chart 13: {e}", exc_info=True)
+    if parallel and tasks:
+        logger.info(f"Rendering {len(tasks)} charts in a process pool (max_workers={max_workers or 'auto'})")
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context(RENDER_START_METHOD),
+            initializer=_init_render_worker,
+        ) as pool:
+            futures = [(task, pool.submit(_run_chart_job, *task)) for task in tasks]
+            for (number, _, _, output_path, _), future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # The worker itself died (e.g. BrokenProcessPool); isolate it to this chart
+                    results.append(
+                        {"chart": number, "file": output_path, "status": "failed", "seconds": 0.0, "error": str(e)}
+                    )
+    else:
+        results.extend(_run_chart_job(*task) for task in tasks)
 
-    # Chart 14: Mileage vs price scatter plot
-    if {"Mileage_KM", "Price_USD"}.issubset(df.columns):
-        logger.debug("Generating chart 14: Mileage vs price scatter plot")
-        try:
-            plt.figure(figsize=(8, 4))
-            sns.scatterplot(
-                data=df.sample(min(len(df), 5000), random_state=42),
-                x="Mileage_KM",
-                y="Price_USD",
-                alpha=0.3,
+    results.sort(key=lambda r: r["chart"])
+    profiler = get_profiler()
+    chart_count = 0
+    skipped_count = 0
+    for result in results:
+        if profiler is not None:
+            profiler.record(
+                f"chart {result['chart']:02d}",
+                "chart",
+                result["status"],
+                result.get("metrics") or {"wall_seconds": result["seconds"], "cpu_seconds": 0.0},
             )
-            plt.title("Mileage vs Price (Sampled)")
-            plt.xlabel("Mileage (KM)")
-            plt.ylabel("Price (USD)")
-            plt.tight_layout()
-            plt.savefig("chart_14_mileage_vs_price.png")
-            plt.close()
+        if result["status"] == "ok":
             chart_count += 1
-            logger.info("✓ Chart 14 generated successfully: chart_14_mileage_vs_price.png")
-        except Exception as e:
-            logger.error(f"Failed to generate chart 14: {e}", exc_info=True)
-    
-    logger.info(f"All charts generated successfully, total {chart_count} charts created")
-
-
+            _write_fingerprint(result["file"], fingerprints[result["file"]])
+            logger.info(f"✓ Chart {result['chart']} generated successfully: {result['file']}")
+        elif result["status"] == "skipped":
+            skipped_count += 1
+        else:
+            logger.error(f"Failed to generate chart {result['chart']}: {result['error']}")
 
+    _log_chart_summary(results)
+    logger.info(
+        f"All charts generated successfully, total {chart_count} charts created, "
+        f"{skipped_count} unchanged charts skipped"
+    )
+    return results